@@ -0,0 +1,551 @@
+# asyncio versions of the gluster commands.
+#
+# These mirror the blocking functions in gluster.volume and gluster.peer but
+# run the CLI with asyncio subprocesses so many queries can be in flight at
+# once from a single thread.  The XML parsers are shared with the blocking
+# versions.
+#
+# Example:
+#   results = aio.run(aio.gather_bounded(
+#       [aio.volume_status(v) for v in volumes], limit=8))
+
+import asyncio
+from result import Err, Ok, Result
+import sys
+import time
+from typing import Awaitable, Dict, Iterable, List, Optional
+import warnings
+
+from gluster.lib import begin_read, build_command, command_timeout, \
+    CommandTimeout, finish_read, GlusterOption, is_read_only, \
+    kill_process_group, read_cache_generation, read_cache_lookup, \
+    read_cache_update, run_scheduled
+from gluster.peer import parse_peer_list, parse_peer_status, \
+    peer_list_from_store, PeerRegistry
+from gluster.volume import Brick, parse_quota_list, parse_volume_info, \
+    parse_volume_info_all, parse_volume_list, parse_volume_status, \
+    parse_volume_status_all, plan_batched_set, record_batch_fallback, \
+    Transport, vol_set_many_args, VolumeTranslator, volume_create_args, \
+    volume_info_all_from_store, volume_info_from_store, volume_list_from_store
+
+
+async def run_command_async(command: str, arg_list: List[str], as_root: bool,
+                            script_mode: bool,
+                            timeout: Optional[float] = None) -> Result:
+    """
+    The asyncio equivalent of gluster.lib.run_command
+    command: String.  The command to run
+    arg_list: list. A list of arguments to add to the command
+    as_root: bool.  Should the command be run as root
+    script_mode: bool.  Should the command be run in script mode
+    timeout: float.  Seconds to wait before killing the command.  The same
+      defaults and deadlines as run_command apply.
+    :returns: Result.  Ok(stdout) or Err(stderr).  A command that timed out
+      returns Err(CommandTimeout).  If the calling task is cancelled a
+      read only command is killed before the cancellation propagates.  The
+      read cache is shared with run_command, and so are in flight reads:
+      identical queries running at the same time in any thread or
+      coroutine start one process.
+    Commands that change cluster state take the same node lock and lock
+      contention retries as run_command.  They run on the default executor
+      so the loop isn't blocked while they wait, and once started they
+      finish even if the calling task is cancelled.
+    """
+    cmd = build_command(command, arg_list, as_root, script_mode)
+    timeout = command_timeout(timeout)
+    if not is_read_only(command, arg_list):
+        result = Err("Command was cancelled")
+        try:
+            result = await asyncio.get_event_loop().run_in_executor(
+                None, run_scheduled, cmd, as_root, timeout)
+            return result
+        finally:
+            read_cache_update(command, arg_list, cmd, result)
+    if command != "gluster":
+        return await _run_command_async(cmd, as_root, timeout)
+    cached = read_cache_lookup(cmd)
+    if cached is not None:
+        return cached
+    flight, leader = begin_read(cmd)
+    if not leader:
+        # Another thread or coroutine is already running it
+        start = time.monotonic()
+        done = await asyncio.get_event_loop().run_in_executor(
+            None, flight.done.wait, timeout)
+        if not done:
+            return Err(CommandTimeout(cmd, time.monotonic() - start))
+        if flight.result is not None:
+            return flight.result
+        # The leader was interrupted before it got a result
+        return await _run_command_async(cmd, as_root, timeout)
+    result = None
+    try:
+        generation = read_cache_generation()
+        result = await _run_command_async(cmd, as_root, timeout)
+        read_cache_update(command, arg_list, cmd, result, generation)
+        return result
+    finally:
+        finish_read(cmd, flight, result)
+
+
+async def _run_command_async(cmd: List[str], as_root: bool,
+                             timeout: Optional[float]) -> Result:
+    if timeout is not None and timeout <= 0:
+        return Err(CommandTimeout(cmd, 0.0))
+
+    start = time.monotonic()
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, start_new_session=True)
+    except OSError as e:
+        return Err("Unable to run {}: {}".format(" ".join(cmd), e))
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(),
+                                                timeout)
+    except asyncio.TimeoutError:
+        kill_process_group(process.pid, as_root)
+        await process.wait()
+        return Err(CommandTimeout(cmd, time.monotonic() - start))
+    except asyncio.CancelledError:
+        kill_process_group(process.pid, as_root)
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        if stdout:
+            return Err(stdout)
+        return Err(stderr)
+    return Ok(stdout)
+
+
+async def gather_bounded(aws: Iterable[Awaitable], limit: int = 8) -> List:
+    """
+    Await many coroutines with at most limit of them running at once
+    :param aws: list.  Coroutines to run
+    :param limit: int.  Maximum number running at the same time
+    :return: list.  The results in the same order as aws
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*[bounded(aw) for aw in aws])
+
+
+def _current_loop() -> Optional[asyncio.AbstractEventLoop]:
+    # The loop set for this thread, without creating one or warning that
+    # there isn't one
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        try:
+            return asyncio.get_event_loop_policy().get_event_loop()
+        except RuntimeError:
+            return None
+
+
+def _attach_child_watcher(loop: Optional[asyncio.AbstractEventLoop]):
+    # Before Python 3.8 subprocesses are reaped by a child watcher that has
+    # to be attached to the loop running them
+    if loop is not None and sys.platform != "win32" and \
+            sys.version_info < (3, 8):
+        asyncio.get_child_watcher().attach_loop(loop)
+
+
+def run(aw: Awaitable):
+    """
+    Run a coroutine to completion on a new event loop.  This is a helper for
+    callers that aren't already inside an event loop.  The new loop is the
+    thread's event loop while it runs and the previous one is put back
+    after.
+    :param aw: The coroutine to run
+    :return: Whatever the coroutine returns
+    """
+    previous = _current_loop()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        _attach_child_watcher(loop)
+        return loop.run_until_complete(aw)
+    finally:
+        loop.close()
+        asyncio.set_event_loop(previous)
+        if previous is not None and not previous.is_closed():
+            _attach_child_watcher(previous)
+
+
+async def peer_status() -> Result:
+    """
+    Runs gluster peer status
+    :return: Result.  List of Peers or Err
+    """
+    arg_list = ["peer", "status", "--xml"]
+    output = await run_command_async("gluster", arg_list, True, False)
+    if output.is_err():
+        return Err(output.value)
+    return parse_peer_status(output.value)
+
+
+async def peer_list() -> Result:
+    """
+    List all peers including localhost.  Read from glusterd's store on a
+    server node.
+    :return: Result.  List of Peers or Err
+    """
+    from_store = peer_list_from_store()
+    if from_store.is_ok():
+        return from_store
+    arg_list = ["pool", "list", "--xml"]
+    output = await run_command_async("gluster", arg_list, True, False)
+    if output.is_err():
+        return Err(output.value)
+    return parse_peer_list(output.value)
+
+
+async def peer_probe(hostname: str) -> Result:
+    """
+    Probe a peer and prevent double probing
+    :param hostname: String.  Add a host to the cluster
+    :return: Result
+    """
+    current_peers = await peer_list()
+    if current_peers.is_err():
+        return Err(current_peers.value)
+    if hostname in PeerRegistry(current_peers.value):
+        # Bail instead of double probing
+        return Ok(0)
+
+    arg_list = ["peer", "probe", hostname]
+    return await run_command_async("gluster", arg_list, True, False)
+
+
+async def peer_remove(hostname: str, force: bool) -> Result:
+    """
+    Removes a peer from the cluster by hostname or ip address
+    :param hostname: String.  Hostname to remove from the cluster
+    :param force: bool.  Should the command be forced
+    :return: Result
+    """
+    arg_list = ["peer", "detach", hostname]
+    if force:
+        arg_list.append("force")
+    return await run_command_async("gluster", arg_list, True, False)
+
+
+async def volume_list() -> Result:
+    """
+    Lists all available volume names.  Read from glusterd's store on a
+    server node.
+    :return: Result.  List of volume names or Err
+    """
+    from_store = volume_list_from_store()
+    if from_store.is_ok():
+        return from_store
+    arg_list = ["volume", "list", "--xml"]
+    output = await run_command_async("gluster", arg_list, True, False)
+    if output.is_err():
+        return Err(output.value)
+    return parse_volume_list(output.value)
+
+
+async def volume_info(volume: str) -> Result:
+    """
+    Returns a Volume with all available information on the volume.  The pool
+    listing needed to resolve brick peers runs at the same time as the
+    volume info query.  On a server node both are read from glusterd's
+    store instead.
+    :param volume: String.  The volume to gather info about
+    :return: Result.  List of Volume or Err
+    """
+    from_store = volume_info_from_store(volume)
+    if from_store.is_ok():
+        return from_store
+    arg_list = ["volume", "info", volume, '--xml']
+    output, peers = await asyncio.gather(
+        run_command_async("gluster", arg_list, True, False),
+        peer_list())
+    if output.is_err():
+        return Err("Volume info get cmd failed: {}".format(output.value))
+    if peers.is_err():
+        return Err(peers.value)
+    return parse_volume_info(output.value, peers=peers.value)
+
+
+async def volume_status(volume: str) -> Result:
+    """
+    Query the status of the volume given.
+    :param volume: String.  The volume to query
+    :return: Result.  List of BrickStatus or Err
+    """
+    arg_list = ["vol", "status", volume, "--xml"]
+    output = await run_command_async("gluster", arg_list, True, False)
+    if output.is_err():
+        return Err(output.value)
+    return parse_volume_status(output.value)
+
+
+async def volume_info_all() -> Result:
+    """
+    Returns every Volume in the cluster from a single volume info all,
+    listing the pool at the same time.  On a server node both are read from
+    glusterd's store instead.
+    :return: Result.  Dict of volume name -> Volume or Err
+    """
+    from_store = volume_info_all_from_store()
+    if from_store.is_ok():
+        return from_store
+    arg_list = ["volume", "info", "all", "--xml"]
+    output, peers = await asyncio.gather(
+        run_command_async("gluster", arg_list, True, False),
+        peer_list())
+    if output.is_err():
+        return Err("Volume info get cmd failed: {}".format(output.value))
+    if peers.is_err():
+        return Err(peers.value)
+    return parse_volume_info_all(output.value, peers=peers.value)
+
+
+async def volume_status_all(detail: bool = False) -> Result:
+    """
+    Query the status of every started volume with a single command
+    :param detail: bool.  Also ask for the filesystem details of each brick
+    :return: Result.  Dict of volume name -> list of BrickStatus or Err
+    """
+    arg_list = ["vol", "status", "all"]
+    if detail:
+        arg_list.append("detail")
+    arg_list.append("--xml")
+    output = await run_command_async("gluster", arg_list, True, False)
+    if output.is_err():
+        return Err(output.value)
+    return parse_volume_status_all(output.value)
+
+
+async def quota_list(volume: str) -> Result:
+    """
+    Return a list of quotas on the volume if any
+    :param volume: String.  The volume to operate on.
+    :return: Result.  List of Quota or Err
+    """
+    args_list = ["volume", "quota", volume, "list", "--xml"]
+    output = await run_command_async("gluster", args_list, True, False)
+    if output.is_err():
+        return Err(
+            "Volume quota list command failed with error: {}".format(
+                output.value))
+    return parse_quota_list(output.value)
+
+
+async def volume_enable_quotas(volume: str) -> Result:
+    """
+    Enable quotas on the volume
+    :return: Result
+    """
+    arg_list = ["volume", "quota", volume, "enable"]
+    return await run_command_async("gluster", arg_list, True, False)
+
+
+async def volume_disable_quotas(volume: str) -> Result:
+    """
+    Disable quotas on the volume
+    :return: Result
+    """
+    arg_list = ["volume", "quota", volume, "disable"]
+    return await run_command_async("gluster", arg_list, True, False)
+
+
+async def volume_add_quota(volume: str, path: str, size: int) -> Result:
+    """
+    Adds a size quota to the volume and path.
+    :param volume: String Volume to add a quota to
+    :param path: String.  Path of the directory to apply a quota on
+    :param size: int. Size in bytes of the quota to apply
+    :return: Result
+    """
+    arg_list = ["volume", "quota", volume, "limit-usage", path,
+                str(size)]
+    return await run_command_async("gluster", arg_list, True, False)
+
+
+async def volume_remove_quota(volume: str, path: str) -> Result:
+    """
+    Removes a size quota to the volume and path.
+    :param path: String.  Path of the directory to remove a quota on
+    :return: Result
+    """
+    arg_list = ["volume", "quota", volume, "remove", path]
+    return await run_command_async("gluster", arg_list, True, False)
+
+
+async def vol_set(volume: str, option: GlusterOption) -> Result:
+    """
+    :param volume: String. Volume name to set the option on
+    :param option: GlusterOption
+    :return: Result.  Return code and output of cmd
+    """
+    arg_list = ["volume", "set", volume, option.name, option.value]
+    return await run_command_async("gluster", arg_list, True, True)
+
+
+async def volume_set_options(volume: str,
+                             settings: List[GlusterOption]) -> Result:
+    """
+    Set options on the volume.  glusterd only allows one transaction per
+    volume at a time so the options are set one after another.
+    :param volume: String. Volume name to set the option on
+    :param settings: list of GlusterOption
+    """
+    error_list = []
+    for setting in settings:
+        result = await vol_set(volume, setting)
+        if result.is_err():
+            error_list.append(str(result.value))
+
+    if len(error_list) > 0:
+        return Err("\n".join(error_list))
+    return Ok()
+
+
+async def vol_set_many(volume: str, settings: List[GlusterOption]) -> Result:
+    """
+    Set several options in a single volume set.  See
+    gluster.volume.vol_set_many.
+    :param volume: String. Volume name to set the options on
+    :param settings: list of GlusterOption
+    :return: Result.  Return code and output of cmd
+    """
+    return await run_command_async(
+        "gluster", vol_set_many_args(volume, settings), True, True)
+
+
+async def volume_set_options_batched(volume: str,
+                                     settings: List[GlusterOption]) -> Result:
+    """
+    Set options on the volume in one glusterd transaction, falling back to
+    one at a time if the batch is rejected.  See
+    gluster.volume.volume_set_options_batched.
+    :param volume: String. Volume name to set the options on
+    :param settings: list of GlusterOption
+    :return: Result.  Ok or Err of a dict of option name -> error
+    """
+    batch, alone = plan_batched_set(settings)
+    batch_errors = {}
+    if batch:
+        result = await vol_set_many(volume, batch)
+        if result.is_err():
+            record_batch_fallback(result.value)
+            batch_errors = await _set_each(volume, batch)
+    errors = await _set_each(volume, alone)
+    errors.update(batch_errors)
+    if errors:
+        return Err(errors)
+    return Ok()
+
+
+async def _set_each(volume: str,
+                    settings: List[GlusterOption]) -> Dict[str, str]:
+    errors = {}
+    for setting in settings:
+        result = await vol_set(volume, setting)
+        if result.is_err():
+            errors[setting.name] = str(result.value)
+    return errors
+
+
+async def volume_start(volume: str, force: bool) -> Result:
+    """
+    Start a volume
+    :param volume: String of the volume to start.
+    :param force:  bool.  Force start
+    :return: Result.  Ok or Err
+    """
+    arg_list = ["volume", "start", volume]
+    if force:
+        arg_list.append("force")
+    return await run_command_async("gluster", arg_list, True, True)
+
+
+async def volume_stop(volume: str, force: bool) -> Result:
+    """
+    This stops a running volume
+    :param volume:  String of the volume to stop
+    :param force:  bool. Force stop.
+    :return: Result.  Ok or Err
+    """
+    arg_list = ["volume", "stop", volume]
+    if force:
+        arg_list.append("force")
+    return await run_command_async("gluster", arg_list, True, True)
+
+
+async def volume_delete(volume: str) -> Result:
+    """
+    This deletes a stopped volume
+    :param volume:  String of the volume name to delete
+    :return: Result.  Ok or Err
+    """
+    arg_list = ["volume", "delete", volume]
+    return await run_command_async("gluster", arg_list, True, True)
+
+
+async def volume_create(volume: str, options: Dict[VolumeTranslator, str],
+                        transport: Transport, bricks: List[Brick],
+                        force: bool) -> Result:
+    """
+    :param volume: String.  Name of the volume to create
+    :param options:  dict of VolumeTranslator:String mappings.
+    :param transport: Transport.  The transport to use
+    :param bricks: list of Brick.  Bricks to put into the volume
+    :param force.  Should volume creation be forced or not
+    :return: Result.  Ok or Err
+    :raise GlusterError:
+    """
+    arg_list = volume_create_args(volume, options, transport, bricks, force)
+    return await run_command_async("gluster", arg_list, True, True)
+
+
+async def volume_add_brick(volume: str, bricks: List[Brick],
+                           force: bool) -> Result:
+    """
+    This adds new bricks to the volume
+    :param volume: String of the volume to add bricks to.
+    :param bricks:  list.  List of bricks to add to the volume
+    :param force:  bool.  Force add brick
+    :return: Result.  Ok or Err
+    """
+    if len(bricks) == 0:
+        return Err("The brick list is empty.  Not expanding volume")
+    arg_list = ["volume", "add-brick", volume]
+    for brick in bricks:
+        arg_list.append(str(brick))
+    if force:
+        arg_list.append("force")
+    return await run_command_async("gluster", arg_list, True, True)
+
+
+async def volume_remove_brick(volume: str, bricks: List[Brick],
+                              force: bool) -> Result:
+    """
+    This starts removing bricks from the volume
+    :param volume: String of the volume to remove bricks from.
+    :param bricks:  list.  List of bricks to remove from the volume
+    :param force:  bool.  Force remove brick
+    :return: Result.  Ok or Err
+    """
+    if len(bricks) == 0:
+        return Err("The brick list is empty.  Not removing brick")
+    status = await volume_status(volume)
+    if status.is_err():
+        return Err("vol status cmd failed with error: {}".format(
+            status.value))
+    for brick in bricks:
+        arg_list = ["volume", "remove-brick", volume, str(brick)]
+        if force:
+            arg_list.append("force")
+        arg_list.append("start")
+        output = await run_command_async("gluster", arg_list, True, True)
+        if output.is_err():
+            return Err(
+                "Remove brick failed with error: {}".format(output.value))
+    return Ok()
@@ -0,0 +1,272 @@
+# A file backed cache of volume and peer state.
+#
+# Every charm hook is a new process so an in memory cache doesn't help them.
+# This stores the parsed results of peer_list and volume_info on disk
+# together with a fingerprint of glusterd's own store (see gluster.store).  A
+# later process that finds the fingerprint unchanged reuses the state.
+#
+# Only server nodes have a store to fingerprint, and there peer_list and
+# volume_info already read the store instead of running the CLI.  What the
+# cache still saves is:
+#   - reading and parsing one file per brick and per peer.  A hit reads a
+#     single JSON file after checking the volume's info file and stat()ing
+#     the peer files.
+#   - the CLI call made when the store can't be used on its own, for example
+#     a newer store format or bricks on a peer missing from the peer store.
+#     Without the cache every hook runs the CLI again.
+# Client nodes have no store and always go to the CLI.  volume_status isn't
+# cached: a brick that dies changes nothing in the store.
+
+from enum import Enum
+from ipaddress import ip_address
+import json
+import os
+from result import Ok, Result
+import tempfile
+import uuid
+from typing import Dict, Optional
+
+from gluster import peer as peer_mod
+from gluster import store
+from gluster import volume as volume_mod
+from gluster.peer import Peer, State
+from gluster.volume import Brick, Transport, Volume, VolumeType
+
+# Bump this if the serialized layout changes
+CACHE_FORMAT = 3
+
+
+def _enum_name(value) -> Optional[str]:
+    if isinstance(value, Enum):
+        return value.name
+    return None
+
+
+def _enum_value(enum, name: Optional[str]):
+    if name is None:
+        return None
+    return enum[name]
+
+
+def _optional_str(value) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value)
+
+
+def encode_peer(peer: Peer) -> Dict:
+    hostname = peer.hostname
+    return {"uuid": _optional_str(peer.uuid),
+            "hostname": _optional_str(hostname),
+            "is_ip": not isinstance(hostname, str) and hostname is not None,
+            "hostnames": peer.hostnames,
+            "status": _enum_name(peer.status)}
+
+
+def decode_peer(data: Dict) -> Peer:
+    hostname = data["hostname"]
+    if data["is_ip"]:
+        hostname = ip_address(hostname)
+    peer_uuid = data["uuid"]
+    if peer_uuid is not None:
+        peer_uuid = uuid.UUID(peer_uuid)
+    return Peer(uuid=peer_uuid, hostname=hostname,
+                status=_enum_value(State, data["status"]),
+                hostnames=data["hostnames"])
+
+
+def encode_brick(brick: Brick) -> Dict:
+    return {"uuid": _optional_str(brick.uuid),
+            "peer": encode_peer(brick.peer) if brick.peer else None,
+            "path": brick.path,
+            "is_arbiter": brick.is_arbiter}
+
+
+def decode_brick(data: Dict, peers: Dict[str, Peer]) -> Brick:
+    """
+    :param peers: dict.  Peers already decoded, keyed by uuid, so bricks on
+      the same host share one Peer
+    """
+    peer = None
+    if data["peer"] is not None:
+        key = data["peer"]["uuid"]
+        peer = peers.get(key)
+        if peer is None:
+            peer = decode_peer(data["peer"])
+            peers[key] = peer
+    brick_uuid = data["uuid"]
+    if brick_uuid is not None:
+        brick_uuid = uuid.UUID(brick_uuid)
+    return Brick(uuid=brick_uuid, peer=peer, path=data["path"],
+                 is_arbiter=data["is_arbiter"])
+
+
+def encode_volume(volume: Volume) -> Dict:
+    return {"name": volume.name,
+            "vol_type": _enum_name(volume.vol_type),
+            "vol_id": _optional_str(volume.vol_id),
+            "status": volume.status,
+            "snapshot_count": volume.snapshot_count,
+            "dist_count": volume.dist_count,
+            "stripe_count": volume.stripe_count,
+            "replica_count": volume.replica_count,
+            "arbiter_count": volume.arbiter_count,
+            "disperse_count": volume.disperse_count,
+            "redundancy_count": volume.redundancy_count,
+            "transport": _enum_name(volume.transport),
+            "bricks": [encode_brick(b) for b in volume.bricks],
+            "options": volume.options}
+
+
+def decode_volume(data: Dict, peers: Dict[str, Peer]) -> Volume:
+    return Volume(name=data["name"],
+                  vol_type=_enum_value(VolumeType, data["vol_type"]),
+                  vol_id=data["vol_id"],
+                  status=data["status"],
+                  snapshot_count=data["snapshot_count"],
+                  dist_count=data["dist_count"],
+                  stripe_count=data["stripe_count"],
+                  replica_count=data["replica_count"],
+                  arbiter_count=data["arbiter_count"],
+                  disperse_count=data["disperse_count"],
+                  redundancy_count=data["redundancy_count"],
+                  transport=_enum_value(Transport, data["transport"]),
+                  bricks=[decode_brick(b, peers) for b in data["bricks"]],
+                  options=data["options"])
+
+
+class DiskCache(object):
+    def __init__(self, cache_dir: str = "/var/run/gluster-charm",
+                 workdir: str = store.GLUSTERD_WORKDIR):
+        """
+        A cache of peer and volume state shared by every process on the node.
+        Entries are only used while glusterd's store still has the
+        fingerprint they were saved with.  If there is no glusterd store
+        (a client node for example) nothing is cached.
+        :param cache_dir: String.  Directory to keep the cache files in.
+          Created on first write.
+        :param workdir: String.  glusterd's working directory
+        """
+        self.cache_dir = cache_dir
+        self.workdir = workdir
+
+    def _path(self, kind: str, volume: Optional[str] = None) -> str:
+        if volume is None:
+            return os.path.join(self.cache_dir, "{}.json".format(kind))
+        return os.path.join(self.cache_dir,
+                            "{}-{}.json".format(kind, volume))
+
+    def _load(self, path: str, marker):
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get("format") != CACHE_FORMAT or \
+                entry.get("marker") != marker:
+            return None
+        return entry.get("data")
+
+    def _save(self, path: str, marker, data):
+        entry = {"format": CACHE_FORMAT, "marker": marker, "data": data}
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        except (IOError, OSError):
+            # The cache is only an optimisation
+            return
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            # Readers never see a half written file
+            os.replace(tmp_path, path)
+        except (IOError, OSError, TypeError, ValueError):
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def _cached(self, path: str, marker, fetch, encode, decode) -> Result:
+        """
+        Return the decoded entry at path if it was saved with marker,
+        otherwise call fetch and save what it returns
+        """
+        if marker is None:
+            return fetch()
+        data = self._load(path, marker)
+        if data is not None:
+            try:
+                # Decoded bricks on the same host share one Peer
+                peers = {}
+                return Ok([decode(item, peers) for item in data])
+            except (KeyError, TypeError, ValueError):
+                pass
+        result = fetch()
+        if result.is_ok():
+            self._save(path, marker, [encode(item) for item in result.value])
+        return result
+
+    def peer_list(self) -> Result:
+        """
+        Like gluster.peer.peer_list but reused while the peer store hasn't
+        changed
+        :return: Result.  List of Peer or Err
+        """
+        return self._cached(self._path("peers"),
+                            store.peers_marker(self.workdir),
+                            peer_mod.peer_list, encode_peer,
+                            lambda item, peers: decode_peer(item))
+
+    def volume_info(self, volume: str) -> Result:
+        """
+        Like gluster.volume.volume_info but reused while the volume's
+        version and the peer store haven't changed
+        :param volume: String.  The volume to gather info about
+        :return: Result.  List of Volume or Err
+        """
+        marker = None
+        version = store.volume_version(volume, self.workdir)
+        peers = store.peers_marker(self.workdir)
+        if version is not None and peers is not None:
+            marker = [version, peers]
+        return self._cached(self._path("volume", volume), marker,
+                            lambda: volume_mod.volume_info(volume),
+                            encode_volume, decode_volume)
+
+    def invalidate(self, volume: Optional[str] = None):
+        """
+        Remove cache files
+        :param volume: String.  Only remove this volume's files, or None to
+          remove everything
+        """
+        if volume is None:
+            try:
+                names = os.listdir(self.cache_dir)
+            except (IOError, OSError):
+                return
+            paths = [os.path.join(self.cache_dir, name) for name in names
+                     if name.endswith(".json")]
+        else:
+            paths = [self._path("volume", volume)]
+        for path in paths:
+            try:
+                os.unlink(path)
+            except (IOError, OSError):
+                pass
+
+
+_disk_cache = DiskCache()
+
+
+def cached_peer_list() -> Result:
+    """
+    peer_list backed by the shared on-disk cache.  See DiskCache.
+    """
+    return _disk_cache.peer_list()
+
+
+def cached_volume_info(volume: str) -> Result:
+    """
+    volume_info backed by the shared on-disk cache.  See DiskCache.
+    """
+    return _disk_cache.volume_info(volume)
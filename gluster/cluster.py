@@ -0,0 +1,239 @@
+# A consistent view of the whole cluster gathered in one go.
+#
+# A monitoring collector typically runs peer status, pool list, volume info,
+# volume status and a quota list per volume one after another.  These
+# queries don't depend on each other so cluster_snapshot runs them at the
+# same time (with bounded parallelism) and joins the answers into one object
+# graph: bricks point at the Peers in the snapshot's PeerRegistry and status
+# rows point at the Bricks of their Volume.  Collecting then costs about as
+# much as the slowest single query.
+#
+# Example:
+#   snapshot = cluster_snapshot().value
+#   for vol in snapshot.volumes.values():
+#       for brick in vol.bricks:
+#           status = snapshot.brick_status(vol.name, brick)
+#           print(brick.peer.hostname, brick.path, status and status.online)
+
+from result import Err, Ok, Result
+import time
+from typing import Awaitable, Dict, List, Optional
+
+from gluster import aio
+from gluster.peer import Peer, PeerRegistry
+from gluster.volume import Brick, BrickStatus, normalize_option_value, \
+    parse_volume_info_all, Quota, Volume, volume_info_all_from_store
+
+
+class ClusterSnapshot(object):
+    def __init__(self, peers: PeerRegistry, volumes: Dict[str, Volume],
+                 status: Dict[str, List[BrickStatus]],
+                 daemons: Dict[str, List[BrickStatus]],
+                 quotas: Dict[str, List[Quota]],
+                 timings: Dict[str, float], errors: Dict[str, str]):
+        """
+        The state of the cluster at one point in time
+        :param peers: PeerRegistry.  Every peer including this node.  Their
+          status comes from peer status where it's known.
+        :param volumes: dict.  Volume name -> Volume.  Brick peers are the
+          Peers in peers.
+        :param status: dict.  Volume name -> BrickStatus of each brick whose
+          status is known.  BrickStatus.brick is the Brick in volumes.
+          Volumes that aren't started are missing.
+        :param daemons: dict.  Volume name -> BrickStatus of the NFS server,
+          self-heal daemon and other processes vol status lists
+        :param quotas: dict.  Volume name -> Quota list for volumes with
+          quotas enabled
+        :param timings: dict.  Seconds each query and phase took
+        :param errors: dict.  Query -> error for the queries that failed.
+          Their part of the snapshot is left empty.
+        """
+        self.peers = peers
+        self.volumes = volumes
+        self.status = status
+        self.daemons = daemons
+        self.quotas = quotas
+        self.timings = timings
+        self.errors = errors
+        self._status_index = {}  # type: Dict[tuple, BrickStatus]
+        for name, rows in status.items():
+            for row in rows:
+                self._status_index[(name, id(row.brick))] = row
+
+    def brick_status(self, volume: str,
+                     brick: Brick) -> Optional[BrickStatus]:
+        """
+        :param volume: String.  Name of the volume the brick is in
+        :param brick: Brick.  One of the bricks of snapshot.volumes[volume]
+        :return: BrickStatus or None if vol status didn't report the brick
+        """
+        return self._status_index.get((volume, id(brick)))
+
+    def __str__(self):
+        return "ClusterSnapshot peers: {} volumes: {} errors: {}".format(
+            len(self.peers), len(self.volumes), len(self.errors))
+
+
+async def _timed(name: str, aw: Awaitable, timings: Dict[str, float]):
+    start = time.monotonic()
+    try:
+        return await aw
+    finally:
+        timings[name] = time.monotonic() - start
+
+
+def _merge_peer_status(peers: List[Peer], status: List[Peer]) -> List[Peer]:
+    # pool list (or the store) knows every peer, peer status knows the live
+    # state of the remote ones
+    states = {p.uuid: p.status for p in status if p.status is not None}
+    merged = []
+    for peer in peers:
+        state = states.get(peer.uuid)
+        if state is None or state == peer.status:
+            merged.append(peer)
+        else:
+            merged.append(Peer(uuid=peer.uuid, hostname=peer.hostname,
+                               status=state, hostnames=peer.hostnames))
+    return merged
+
+
+def _join_volumes(volumes: Dict[str, Volume], registry: PeerRegistry):
+    # Point every brick at the registry's Peer for its host
+    for vol in volumes.values():
+        for brick in vol.bricks:
+            peer = registry.get(brick.uuid)
+            if peer is not None:
+                brick.peer = peer
+
+
+def _join_status(volumes: Dict[str, Volume],
+                 statuses: Dict[str, List[BrickStatus]]) -> tuple:
+    # Replace the Brick each status row was parsed with by the Volume's own
+    # Brick.  Rows that aren't bricks are the volume's daemons.
+    joined = {}
+    daemons = {}
+    for name, rows in statuses.items():
+        vol = volumes.get(name)
+        bricks = {}
+        if vol is not None:
+            bricks = {(b.uuid, b.path): b for b in vol.bricks}
+        for row in rows:
+            brick = bricks.get((row.brick.uuid, row.brick.path))
+            if brick is None:
+                daemons.setdefault(name, []).append(row)
+                continue
+            joined.setdefault(name, []).append(
+                BrickStatus(brick=brick, tcp_port=row.tcp_port,
+                            rdma_port=row.rdma_port, online=row.online,
+                            pid=row.pid, detail=row.detail))
+    return joined, daemons
+
+
+def _quota_enabled(vol: Volume) -> bool:
+    # quota list fails on volumes without quotas
+    return normalize_option_value(vol.options.get("features.quota", "off")) \
+        == "on"
+
+
+async def cluster_snapshot_async(limit: int = 8,
+                                 detail: bool = False) -> Result:
+    """
+    Gather peers, volumes, their status and quotas concurrently and join
+    them into a ClusterSnapshot.  On a server node the volumes and peers are
+    read from glusterd's store so quota lists can start straight away.
+    :param limit: int.  Maximum number of gluster commands running at once
+    :param detail: bool.  Ask for vol status detail.  See BrickStatus.detail
+    :return: Result.  ClusterSnapshot or Err if the peers or volumes can't
+      be listed.  Failures of the other queries are in
+      ClusterSnapshot.errors.
+    """
+    timings = {}
+    errors = {}
+    start = time.monotonic()
+
+    queries = {
+        "peer_status": aio.peer_status(),
+        "peer_list": aio.peer_list(),
+        "volume_status": aio.volume_status_all(detail),
+    }
+    from_store = volume_info_all_from_store()
+    if from_store.is_ok():
+        volumes = from_store.value
+        for name, vol in volumes.items():
+            if _quota_enabled(vol):
+                queries["quota_list {}".format(name)] = aio.quota_list(name)
+    else:
+        volumes = None
+        queries["volume_info"] = aio.run_command_async(
+            "gluster", ["volume", "info", "all", "--xml"], True, False)
+    names = list(queries)
+    results = dict(zip(names, await aio.gather_bounded(
+        [_timed(name, queries[name], timings) for name in names], limit)))
+    timings["query"] = time.monotonic() - start
+
+    peers = results["peer_list"]
+    if peers.is_err():
+        return Err(peers.value)
+    peer_status = results["peer_status"]
+    if peer_status.is_err():
+        errors["peer_status"] = peer_status.value
+        merged = peers.value
+    else:
+        merged = _merge_peer_status(peers.value, peer_status.value)
+
+    if volumes is None:
+        output = results["volume_info"]
+        if output.is_err():
+            return Err("Volume info get cmd failed: {}".format(output.value))
+        parsed = parse_volume_info_all(output.value, peers=merged)
+        if parsed.is_err():
+            return Err(parsed.value)
+        volumes = parsed.value
+        # Which volumes have quotas is only known now
+        quota_start = time.monotonic()
+        quota_names = [name for name, vol in volumes.items()
+                       if _quota_enabled(vol)]
+        quota_results = await aio.gather_bounded(
+            [_timed("quota_list {}".format(name), aio.quota_list(name),
+                    timings) for name in quota_names], limit)
+        results.update(("quota_list {}".format(name), result)
+                       for name, result in zip(quota_names, quota_results))
+        timings["quotas"] = time.monotonic() - quota_start
+
+    join_start = time.monotonic()
+    registry = PeerRegistry(merged, resolve=False)
+    _join_volumes(volumes, registry)
+
+    status = results["volume_status"]
+    if status.is_err():
+        errors["volume_status"] = status.value
+        joined, daemons = {}, {}
+    else:
+        joined, daemons = _join_status(volumes, status.value)
+
+    quotas = {}
+    for name in volumes:
+        key = "quota_list {}".format(name)
+        if key not in results:
+            continue
+        if results[key].is_err():
+            errors[key] = results[key].value
+        else:
+            quotas[name] = results[key].value
+    timings["join"] = time.monotonic() - join_start
+    timings["total"] = time.monotonic() - start
+
+    return Ok(ClusterSnapshot(peers=registry, volumes=volumes, status=joined,
+                              daemons=daemons, quotas=quotas, timings=timings,
+                              errors=errors))
+
+
+def cluster_snapshot(limit: int = 8, detail: bool = False) -> Result:
+    """
+    Blocking version of cluster_snapshot_async for callers that aren't in
+    an event loop
+    :param limit: int.  Maximum number of gluster commands running at once
+    :param detail: bool.  Ask for vol status detail
+    :return: Result.  ClusterSnapshot or Err
+    """
+    return aio.run(cluster_snapshot_async(limit=limit, detail=detail))
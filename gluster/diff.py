@@ -0,0 +1,247 @@
+# What changed between two views of the cluster.
+#
+# Comparing the results of two peer_list, volume_info or volume_status calls
+# (or two ClusterSnapshots) gives a feed of Change records so a reconciler
+# only has to act on what actually changed.  Each collection is indexed by a
+# stable key first so a diff is linear in the size of its inputs.
+#
+# Example:
+#   changes = diff_snapshots(previous, cluster_snapshot().value)
+#   for name in changed_volumes(changes):
+#       reconcile(name)
+
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from gluster.peer import Peer
+from gluster.volume import Brick, BrickStatus, Volume
+
+
+class ChangeKind(Enum):
+    PeerAdded = "peer added"
+    PeerRemoved = "peer removed"
+    PeerStateChanged = "peer state changed"
+    VolumeAdded = "volume added"
+    VolumeRemoved = "volume removed"
+    VolumeStatusChanged = "volume status changed"
+    BrickAdded = "brick added"
+    BrickRemoved = "brick removed"
+    OptionAdded = "option added"
+    OptionRemoved = "option removed"
+    OptionChanged = "option changed"
+    BrickOnline = "brick online"
+    BrickOffline = "brick offline"
+
+    def __str__(self) -> str:
+        return "{}".format(self.value)
+
+
+class Change(object):
+    __slots__ = ("kind", "volume", "key", "old", "new")
+
+    def __init__(self, kind: ChangeKind, volume: Optional[str], key,
+                 old, new):
+        """
+        One difference between two views of the cluster
+        :param kind: ChangeKind.
+        :param volume: String.  The volume changed or None for peers
+        :param key: What changed within it.  The peer UUID, the brick's
+          (host UUID, path), the option name or the volume name.
+        :param old: The value before: a Peer State, option value, Brick,
+          Volume etc.  None if it was added.
+        :param new: The value after.  None if it was removed.
+        """
+        self.kind = kind
+        self.volume = volume
+        self.key = key
+        self.old = old
+        self.new = new
+
+    def __eq__(self, other):
+        if not isinstance(other, Change):
+            return NotImplemented
+        return (self.kind, self.volume, self.key, self.old, self.new) == \
+            (other.kind, other.volume, other.key, other.old, other.new)
+
+    def __str__(self):
+        return "Change {} volume: {} key: {} old: {} new: {}".format(
+            self.kind, self.volume, self.key, self.old, self.new)
+
+    def __repr__(self):
+        return str(self)
+
+
+def _brick_key(brick: Brick) -> tuple:
+    return brick.uuid, brick.path
+
+
+def _status_key(status: BrickStatus) -> tuple:
+    # The daemons of a host all have its address as their path so their name
+    # is part of the key too
+    brick = status.brick
+    hostname = None if brick.peer is None else str(brick.peer.hostname)
+    return brick.uuid, brick.path, hostname
+
+
+def _volumes_by_name(volumes: Union[Dict[str, Volume], Iterable[Volume]]) \
+        -> Dict[str, Volume]:
+    if isinstance(volumes, dict):
+        return volumes
+    return {vol.name: vol for vol in volumes}
+
+
+def diff_peers(old: Iterable[Peer], new: Iterable[Peer]) -> List[Change]:
+    """
+    Peers added, removed or whose State changed
+    :param old: list or PeerRegistry.  Peers before
+    :param new: list or PeerRegistry.  Peers after
+    :return: list.  Change records keyed by peer UUID
+    """
+    old_peers = {p.uuid: p for p in old}
+    changes = []
+    seen = set()
+    for peer in new:
+        seen.add(peer.uuid)
+        before = old_peers.get(peer.uuid)
+        if before is None:
+            changes.append(Change(ChangeKind.PeerAdded, None, peer.uuid,
+                                  None, peer))
+        elif before.status != peer.status:
+            changes.append(Change(ChangeKind.PeerStateChanged, None,
+                                  peer.uuid, before.status, peer.status))
+    for peer_uuid, peer in old_peers.items():
+        if peer_uuid not in seen:
+            changes.append(Change(ChangeKind.PeerRemoved, None, peer_uuid,
+                                  peer, None))
+    return changes
+
+
+def diff_options(volume: str, old: Dict[str, str],
+                 new: Dict[str, str]) -> List[Change]:
+    """
+    Options set, unset or changed on a volume
+    :param volume: String.  Name of the volume
+    :param old: dict.  Volume.options before
+    :param new: dict.  Volume.options after
+    :return: list.  Change records keyed by option name
+    """
+    changes = []
+    for name, value in new.items():
+        if name not in old:
+            changes.append(Change(ChangeKind.OptionAdded, volume, name,
+                                  None, value))
+        elif old[name] != value:
+            changes.append(Change(ChangeKind.OptionChanged, volume, name,
+                                  old[name], value))
+    for name, value in old.items():
+        if name not in new:
+            changes.append(Change(ChangeKind.OptionRemoved, volume, name,
+                                  value, None))
+    return changes
+
+
+def diff_bricks(volume: str, old: Iterable[Brick],
+                new: Iterable[Brick]) -> List[Change]:
+    """
+    Bricks added to or removed from a volume
+    :param volume: String.  Name of the volume
+    :param old: list.  Volume.bricks before
+    :param new: list.  Volume.bricks after
+    :return: list.  Change records keyed by (host UUID, path)
+    """
+    old_bricks = {_brick_key(b): b for b in old}
+    changes = []
+    seen = set()
+    for brick in new:
+        key = _brick_key(brick)
+        seen.add(key)
+        if key not in old_bricks:
+            changes.append(Change(ChangeKind.BrickAdded, volume, key,
+                                  None, brick))
+    for key, brick in old_bricks.items():
+        if key not in seen:
+            changes.append(Change(ChangeKind.BrickRemoved, volume, key,
+                                  brick, None))
+    return changes
+
+
+def diff_volumes(old: Union[Dict[str, Volume], Iterable[Volume]],
+                 new: Union[Dict[str, Volume], Iterable[Volume]]) \
+        -> List[Change]:
+    """
+    Volumes created or deleted, started or stopped and the bricks and
+    options of those in both
+    :param old: dict of name -> Volume or a list of Volume.  Before
+    :param new: dict of name -> Volume or a list of Volume.  After
+    :return: list.  Change records
+    """
+    old_volumes = _volumes_by_name(old)
+    new_volumes = _volumes_by_name(new)
+    changes = []
+    for name, vol in new_volumes.items():
+        before = old_volumes.get(name)
+        if before is None:
+            changes.append(Change(ChangeKind.VolumeAdded, name, name,
+                                  None, vol))
+            continue
+        if before.status != vol.status:
+            changes.append(Change(ChangeKind.VolumeStatusChanged, name, name,
+                                  before.status, vol.status))
+        changes.extend(diff_bricks(name, before.bricks, vol.bricks))
+        changes.extend(diff_options(name, before.options, vol.options))
+    for name, vol in old_volumes.items():
+        if name not in new_volumes:
+            changes.append(Change(ChangeKind.VolumeRemoved, name, name,
+                                  vol, None))
+    return changes
+
+
+def diff_brick_status(volume: Optional[str], old: Iterable[BrickStatus],
+                      new: Iterable[BrickStatus]) -> List[Change]:
+    """
+    Bricks and daemons that went online or offline.  Rows only in one of
+    old and new are ignored, diff_bricks reports bricks coming and going.
+    :param volume: String.  Name of the volume
+    :param old: list.  BrickStatus before
+    :param new: list.  BrickStatus after
+    :return: list.  Change records keyed by (host UUID, path, hostname)
+      with the BrickStatus before and after
+    """
+    old_status = {_status_key(s): s for s in old}
+    changes = []
+    for status in new:
+        key = _status_key(status)
+        before = old_status.get(key)
+        if before is None or bool(before.online) == bool(status.online):
+            continue
+        kind = ChangeKind.BrickOnline if status.online else \
+            ChangeKind.BrickOffline
+        changes.append(Change(kind, volume, key, before, status))
+    return changes
+
+
+def diff_snapshots(old, new) -> List[Change]:
+    """
+    Everything that changed between two ClusterSnapshots
+    :param old: ClusterSnapshot.  Before
+    :param new: ClusterSnapshot.  After
+    :return: list.  Peer changes, then volume, brick and option changes,
+      then brick status changes
+    """
+    changes = diff_peers(old.peers, new.peers)
+    changes.extend(diff_volumes(old.volumes, new.volumes))
+    for name, rows in new.status.items():
+        changes.extend(diff_brick_status(name, old.status.get(name, ()),
+                                         rows))
+    for name, rows in new.daemons.items():
+        changes.extend(diff_brick_status(name, old.daemons.get(name, ()),
+                                         rows))
+    return changes
+
+
+def changed_volumes(changes: Iterable[Change]) -> Set[str]:
+    """
+    :param changes: list.  Change records
+    :return: set.  Names of the volumes with at least one change
+    """
+    return {change.volume for change in changes if change.volume is not None}
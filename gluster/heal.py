@@ -1,21 +1,738 @@
+from concurrent.futures import ThreadPoolExecutor
 import os
-from gluster.volume import Brick
+from result import Err, Ok, Result
+import threading
+from typing import Dict, Iterator, List, Optional, Union
+import uuid
 
+from gluster.inotify import IN_CREATE, IN_DELETE, IN_DELETE_SELF, \
+    IN_IGNORED, IN_ISDIR, IN_MOVE_SELF, IN_MOVED_FROM, IN_MOVED_TO, \
+    IN_ONLYDIR, IN_Q_OVERFLOW, IN_UNMOUNT, Inotify
+from gluster.lib import command_stream, GlusterError, intern_str, \
+    iter_cli_xml, run_command
+from gluster.volume import Brick, get_all_local_bricks
 
-def get_self_heal_count(brick: Brick) -> int:
+
+def xattrop_path(brick: Brick) -> str:
+    """
+    :param brick: Brick.
+    :return: String.  The directory glusterd indexes pending heals in
     """
-    Find the self heal count for a given brick.
+    return "{}/.glusterfs/indices/xattrop".format(brick.path)
 
-    :param brick: the brick to probe for the self heal count.
-    :return int: the number of files that need healing
+
+def get_self_heal_count(brick: Brick, at_least: Optional[int] = None) -> int:
     """
-    brick_path = "{}/.glusterfs/indices/xattrop".format(brick.path)
+    Find the self heal count for a given brick.  The index directory is read
+    entry by entry so memory use doesn't grow with the number of entries.
 
+    :param brick: the brick to probe for the self heal count.
+    :param at_least: int.  Stop counting once this many entries are found.
+      Enough for a health check that only needs to know if there are at
+      least N pending heals.
+    :return int: the number of files that need healing, or at_least if there
+      are at least that many
+    """
     # The gfids which need healing are those files which do not start
     # with 'xattrop'.
     count = 0
-    for f in os.listdir(brick_path):
-        if not f.startswith('xattrop'):
-            count += 1
+    entries = os.scandir(xattrop_path(brick))
+    try:
+        for entry in entries:
+            if at_least is not None and count >= at_least:
+                break
+            if not entry.name.startswith('xattrop'):
+                count += 1
+    finally:
+        # Python 3.5's scandir iterator has no close() and is only closed
+        # once it's exhausted or garbage collected
+        if hasattr(entries, "close"):
+            entries.close()
 
     return count
+
+
+class HealCounts(object):
+    def __init__(self, bricks: Dict[str, Dict[str, int]],
+                 errors: Dict[str, Dict[str, str]]):
+        """
+        Pending heal counts of the local bricks
+        :param bricks: dict.  Volume name -> brick path -> count
+        :param errors: dict.  Volume name -> brick path -> error for bricks
+          whose index couldn't be read
+        """
+        self.bricks = bricks
+        self.errors = errors
+
+    def volume_total(self, volume: str) -> int:
+        """
+        :param volume: String.  Volume name
+        :return: int.  Sum of the counts of the volume's local bricks
+        """
+        return sum(self.bricks.get(volume, {}).values())
+
+    def volumes(self) -> Dict[str, int]:
+        """
+        :return: dict.  Volume name -> sum of its local brick counts
+        """
+        return {name: self.volume_total(name) for name in self.bricks}
+
+    def total(self) -> int:
+        return sum(self.volume_total(name) for name in self.bricks)
+
+    def __str__(self):
+        return "HealCounts volumes: {} errors: {}".format(self.volumes(),
+                                                          self.errors)
+
+
+def count_bricks(bricks: Dict[str, List[Brick]],
+                 at_least: Optional[int] = None,
+                 max_workers: int = 8) -> HealCounts:
+    """
+    Count the pending heals of many bricks at once.  Each brick is usually
+    on its own disk so the directory scans run in parallel.
+    :param bricks: dict.  Volume name -> list of Brick
+    :param at_least: int.  Stop counting each brick at this many.  See
+      get_self_heal_count
+    :param max_workers: int.  Maximum bricks scanned at the same time
+    :return: HealCounts
+    """
+    jobs = [(name, brick) for name, volume_bricks in bricks.items()
+            for brick in volume_bricks]
+    counts = {}
+    errors = {}
+    if not jobs:
+        return HealCounts(counts, errors)
+
+    def count(job):
+        try:
+            return get_self_heal_count(job[1], at_least=at_least), None
+        except OSError as e:
+            return None, str(e)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+        for (name, brick), (value, error) in zip(jobs, pool.map(count, jobs)):
+            if error is None:
+                counts.setdefault(name, {})[brick.path] = value
+            else:
+                errors.setdefault(name, {})[brick.path] = error
+    return HealCounts(counts, errors)
+
+
+def get_local_heal_counts(at_least: Optional[int] = None,
+                          max_workers: int = 8) -> Result:
+    """
+    Count the pending heals of every local brick of every volume in
+    parallel
+    :param at_least: int.  Stop counting each brick at this many
+    :param max_workers: int.  Maximum bricks scanned at the same time
+    :return: Result.  HealCounts or Err if the local bricks can't be listed
+    """
+    bricks = get_all_local_bricks()
+    if bricks.is_err():
+        return Err(bricks.value)
+    return Ok(count_bricks(bricks.value, at_least=at_least,
+                           max_workers=max_workers))
+
+
+# inotify events that add or remove an index entry, and those that mean the
+# index directory itself went away
+_ENTRY_ADDED = IN_CREATE | IN_MOVED_TO
+_ENTRY_REMOVED = IN_DELETE | IN_MOVED_FROM
+_INDEX_GONE = IN_DELETE_SELF | IN_MOVE_SELF | IN_UNMOUNT | IN_IGNORED
+WATCH_MASK = _ENTRY_ADDED | _ENTRY_REMOVED | IN_DELETE_SELF | \
+    IN_MOVE_SELF | IN_ONLYDIR
+
+
+class HealTracker(object):
+    def __init__(self, bricks: Optional[Dict[str, List[Brick]]] = None):
+        """
+        Keeps the pending heal count of bricks up to date without rescanning
+        their index directories.  Each directory is scanned once when it's
+        watched and then inotify create and delete events adjust the count.
+        If the kernel's event queue overflows every brick is rescanned.
+
+        Entries created or removed while a brick's baseline scan is running
+        can be counted twice or missed, so a count can be off by that many
+        until the next rescan.
+
+        Call open() first, then either call process_events() from your own
+        loop or start() a background thread to do it.  refresh() can be
+        called from any thread.
+        :param bricks: dict.  Volume name -> list of Brick to track.  If
+          None every local brick of every volume is tracked and refresh()
+          picks up bricks being added or removed.
+        """
+        self._bricks = bricks
+        self._notify = None  # type: Optional[Inotify]
+        self._lock = threading.Lock()
+        # (volume, brick path) -> count
+        self._counts = {}  # type: Dict[tuple, int]
+        # (volume, brick path) -> why it isn't tracked
+        self._errors = {}  # type: Dict[tuple, str]
+        # The watch maps below are changed by refresh() in the caller's
+        # thread and by event handling in start()'s thread
+        self._watch_lock = threading.Lock()
+        self._by_wd = {}  # type: Dict[int, tuple]
+        self._by_key = {}  # type: Dict[tuple, int]
+        self._paths = {}  # type: Dict[tuple, Brick]
+        self._thread = None
+        self._stop = threading.Event()
+        # Number of times the event queue overflowed
+        self.overflows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self) -> Result:
+        """
+        Start watching the bricks and take their baseline counts
+        :return: Result.  Ok or Err if inotify isn't available or the local
+          bricks can't be listed
+        """
+        try:
+            self._notify = Inotify()
+        except OSError as e:
+            return Err("Unable to use inotify: {}".format(e))
+        return self.refresh()
+
+    def refresh(self) -> Result:
+        """
+        Watch bricks that are new or couldn't be watched before and stop
+        watching the ones that are gone.  Only needed when tracking every
+        local brick.
+        :return: Result.  Ok or Err if the local bricks can't be listed
+        """
+        bricks = self._bricks
+        if bricks is None:
+            local_bricks = get_all_local_bricks()
+            if local_bricks.is_err():
+                return Err(local_bricks.value)
+            bricks = local_bricks.value
+        wanted = {(name, brick.path): brick
+                  for name, volume_bricks in bricks.items()
+                  for brick in volume_bricks}
+        with self._watch_lock:
+            for key in list(self._paths):
+                if key not in wanted:
+                    self._unwatch(key)
+            for key, brick in wanted.items():
+                if key not in self._by_key:
+                    self._watch(key, brick)
+        return Ok()
+
+    def _watch(self, key: tuple, brick: Brick):
+        self._paths[key] = brick
+        wd = None
+        try:
+            # Watch before scanning so nothing after the scan is missed
+            wd = self._notify.add_watch(xattrop_path(brick), WATCH_MASK)
+            count = get_self_heal_count(brick)
+        except OSError as e:
+            if wd is not None:
+                self._notify.rm_watch(wd)
+            with self._lock:
+                self._counts.pop(key, None)
+                self._errors[key] = str(e)
+            return
+        self._by_wd[wd] = key
+        self._by_key[key] = wd
+        with self._lock:
+            self._counts[key] = count
+            self._errors.pop(key, None)
+
+    def _unwatch(self, key: tuple):
+        wd = self._by_key.pop(key, None)
+        if wd is not None:
+            self._by_wd.pop(wd, None)
+            self._notify.rm_watch(wd)
+        self._paths.pop(key, None)
+        with self._lock:
+            self._counts.pop(key, None)
+            self._errors.pop(key, None)
+
+    def _lost(self, key: tuple, error: str):
+        # Stop counting a brick but keep its path so refresh() retries it
+        wd = self._by_key.pop(key, None)
+        if wd is not None:
+            self._by_wd.pop(wd, None)
+            self._notify.rm_watch(wd)
+        with self._lock:
+            self._counts.pop(key, None)
+            self._errors[key] = error
+
+    def _rescan(self):
+        for key in list(self._by_key):
+            try:
+                count = get_self_heal_count(self._paths[key])
+            except OSError as e:
+                self._lost(key, str(e))
+                continue
+            with self._lock:
+                self._counts[key] = count
+
+    def _handle(self, wd: int, mask: int, name: bytes):
+        with self._watch_lock:
+            self._apply(wd, mask, name)
+
+    def _apply(self, wd: int, mask: int, name: bytes):
+        if mask & IN_Q_OVERFLOW:
+            self.overflows += 1
+            self._rescan()
+            return
+        key = self._by_wd.get(wd)
+        if key is None:
+            return
+        if mask & _INDEX_GONE:
+            # The brick was removed or its filesystem unmounted
+            self._lost(key, "index directory went away")
+            return
+        if mask & IN_ISDIR or name.startswith(b"xattrop"):
+            return
+        with self._lock:
+            count = self._counts.get(key)
+            if count is None:
+                return
+            if mask & _ENTRY_ADDED:
+                self._counts[key] = count + 1
+            elif mask & _ENTRY_REMOVED and count > 0:
+                self._counts[key] = count - 1
+
+    def process_events(self, timeout: Optional[float] = 0) -> int:
+        """
+        Apply queued inotify events to the counts.  One call handles at
+        most one read of the queue so it returns even while a heal keeps
+        adding events.
+        :param timeout: float.  Seconds to wait for the first event, 0 to
+          not wait or None to wait forever
+        :return: int.  Number of events handled
+        """
+        handled = 0
+        for wd, mask, cookie, name in self._notify.read_events(timeout):
+            self._handle(wd, mask, name)
+            handled += 1
+        return handled
+
+    def count(self, volume: str, brick: Brick) -> Optional[int]:
+        """
+        :param volume: String.  Volume name
+        :param brick: Brick.
+        :return: int.  The brick's pending heal count or None if it isn't
+          tracked
+        """
+        with self._lock:
+            return self._counts.get((volume, brick.path))
+
+    def counts(self) -> HealCounts:
+        """
+        :return: HealCounts.  A copy of every tracked brick's count
+        """
+        bricks = {}
+        errors = {}
+        with self._lock:
+            for (name, path), count in self._counts.items():
+                bricks.setdefault(name, {})[path] = count
+            for (name, path), error in self._errors.items():
+                errors.setdefault(name, {})[path] = error
+        return HealCounts(bricks, errors)
+
+    def start(self, poll_interval: float = 1.0):
+        """
+        Process events on a background thread until stop() is called
+        :param poll_interval: float.  Longest the thread waits for events
+          before checking if it should stop
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.is_set():
+                self.process_events(poll_interval)
+
+        self._thread = threading.Thread(target=run, name="heal-tracker",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread started by start()
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def close(self):
+        """
+        Stop tracking and release the inotify instance
+        """
+        self.stop()
+        if self._notify is not None:
+            self._notify.close()
+            self._notify = None
+
+
+HEAL_BRICK_PATH = "cliOutput/healInfo/bricks/brick"
+# Suffixes heal info puts after an entry's path
+SPLIT_BRAIN_SUFFIX = " - Is in split-brain"
+POSSIBLY_HEALING_SUFFIX = " - Possibly undergoing heal"
+
+
+class HealEntry(object):
+    __slots__ = ("host", "brick_path", "gfid", "path", "split_brain",
+                 "possibly_healing")
+
+    def __init__(self, host: Optional[str], brick_path: Optional[str],
+                 gfid: Optional[uuid.UUID], path: Optional[str],
+                 split_brain: bool = False, possibly_healing: bool = False):
+        """
+        A file or directory heal info lists as needing heal on a brick
+        :param host: String.  Host of the brick as heal info names it
+        :param brick_path: String.  Path of the brick
+        :param gfid: uuid.UUID.  The entry's gfid or None if not reported
+        :param path: String.  Path within the volume or None if heal info
+          only knows the gfid
+        :param split_brain: bool.  The entry is in split-brain
+        :param possibly_healing: bool.  The self heal daemon may be healing
+          it right now
+        """
+        self.host = host
+        self.brick_path = brick_path
+        self.gfid = gfid
+        self.path = path
+        self.split_brain = split_brain
+        self.possibly_healing = possibly_healing
+
+    def __str__(self):
+        return "HealEntry host: {} brick_path: {} gfid: {} path: {} " \
+               "split_brain: {} possibly_healing: {}".format(
+                   self.host, self.brick_path, self.gfid, self.path,
+                   self.split_brain, self.possibly_healing)
+
+    def __repr__(self):
+        return str(self)
+
+
+class BrickHealInfo(object):
+    __slots__ = ("host", "path", "host_uuid", "status", "total", "pending",
+                 "split_brain", "possibly_healing", "entries")
+
+    def __init__(self, host: Optional[str], path: Optional[str],
+                 host_uuid: Optional[uuid.UUID], status: Optional[str],
+                 total: Optional[int], pending: Optional[int] = None,
+                 split_brain: Optional[int] = None,
+                 possibly_healing: Optional[int] = None,
+                 entries: Optional[List[HealEntry]] = None):
+        """
+        What one brick reported to heal info.  The counts are None when the
+        brick couldn't be reached or the command doesn't report them.
+        :param host: String.  Host of the brick
+        :param path: String.  Path of the brick
+        :param host_uuid: uuid.UUID of the host or None if not connected
+        :param status: String.  Connected or why the brick can't be reached
+        :param total: int.  Entries needing heal
+        :param pending: int.  Of those, entries waiting for heal.  Only from
+          info summary
+        :param split_brain: int.  Of those, entries in split-brain.  Only
+          from info summary
+        :param possibly_healing: int.  Of those, entries possibly being
+          healed.  Only from info summary
+        :param entries: list.  HealEntry of each entry listed, from
+          parse_heal_info
+        """
+        self.host = host
+        self.path = path
+        self.host_uuid = host_uuid
+        self.status = status
+        self.total = total
+        self.pending = pending
+        self.split_brain = split_brain
+        self.possibly_healing = possibly_healing
+        self.entries = entries if entries is not None else []
+
+    def __str__(self):
+        return "BrickHealInfo host: {} path: {} status: {} total: {} " \
+               "pending: {} split_brain: {} possibly_healing: {}".format(
+                   self.host, self.path, self.status, self.total,
+                   self.pending, self.split_brain, self.possibly_healing)
+
+    def __repr__(self):
+        return str(self)
+
+
+def _heal_count(text: Optional[str]) -> Optional[int]:
+    # Bricks that can't be reached report - instead of a number
+    if text is None:
+        return None
+    text = text.strip()
+    if not text.isdigit():
+        return None
+    return int(text)
+
+
+def _split_brick_name(name: Optional[str]) -> tuple:
+    # host:/path
+    if not name:
+        return None, None
+    host, sep, path = name.strip().partition(":/")
+    if not sep:
+        return None, intern_str(name.strip())
+    return intern_str(host), intern_str("/" + path)
+
+
+def _gfid(text: Optional[str]) -> Optional[uuid.UUID]:
+    if not text:
+        return None
+    try:
+        return uuid.UUID(text.strip())
+    except ValueError:
+        return None
+
+
+def _heal_entry(host: Optional[str], brick_path: Optional[str], elem,
+                split_brain: bool) -> HealEntry:
+    text = (elem.text or "").strip()
+    possibly_healing = False
+    if text.endswith(SPLIT_BRAIN_SUFFIX):
+        text = text[:-len(SPLIT_BRAIN_SUFFIX)]
+        split_brain = True
+    elif text.endswith(POSSIBLY_HEALING_SUFFIX):
+        text = text[:-len(POSSIBLY_HEALING_SUFFIX)]
+        possibly_healing = True
+    gfid = _gfid(elem.get("gfid"))
+    path = text
+    # Entries whose path isn't known are listed as <gfid:...>
+    if text.startswith("<gfid:"):
+        path = None
+        if gfid is None:
+            gfid = _gfid(text[len("<gfid:"):].rstrip(">"))
+    return HealEntry(host=host, brick_path=brick_path, gfid=gfid,
+                     path=path or None, split_brain=split_brain,
+                     possibly_healing=possibly_healing)
+
+
+def stream_heal_info(source, split_brain: bool = False) -> Iterator[
+        Union[HealEntry, BrickHealInfo]]:
+    """
+    Incrementally parse the --xml output of volume heal info, info
+    split-brain, info summary or statistics heal-count.  A HealEntry is
+    yielded for each entry as soon as it's read and a BrickHealInfo once
+    each brick is complete, after its entries.  Neither keeps the XML
+    behind it so lists of millions of entries can be read from the pipe.
+    :param source: bytes, String or a file like object such as the stdout
+      pipe of the gluster command
+    :param split_brain: bool.  The output is from info split-brain so every
+      entry is in split-brain
+    :return: Iterator of HealEntry and BrickHealInfo
+    :raise GlusterError: if the command failed or the output can't be parsed
+    """
+    host = None
+    brick_path = None
+    fields = {}
+    for path, elem in iter_cli_xml(source, [HEAL_BRICK_PATH,
+                                            HEAL_BRICK_PATH + "/*"]):
+        if path == HEAL_BRICK_PATH:
+            total = fields.get("numberOfEntries",
+                               fields.get("totalNumberOfEntries"))
+            yield BrickHealInfo(
+                host=host, path=brick_path,
+                host_uuid=_gfid(elem.get("hostUuid")),
+                status=fields.get("status"), total=_heal_count(total),
+                pending=_heal_count(fields.get(
+                    "numberOfEntriesInHealPending")),
+                split_brain=_heal_count(fields.get(
+                    "numberOfEntriesInSplitBrain")),
+                possibly_healing=_heal_count(fields.get(
+                    "numberOfEntriesPossiblyHealing")))
+            host = None
+            brick_path = None
+            fields = {}
+        elif elem.tag == "name":
+            host, brick_path = _split_brick_name(elem.text)
+        elif elem.tag == "file":
+            yield _heal_entry(host, brick_path, elem, split_brain)
+        else:
+            fields[elem.tag] = elem.text
+
+
+def stream_heal_entries(source, split_brain: bool = False) -> \
+        Iterator[HealEntry]:
+    """
+    Incrementally parse heal info --xml output yielding only the entries
+    :param source: bytes, String or a file like object
+    :param split_brain: bool.  The output is from info split-brain
+    :return: Iterator of HealEntry
+    :raise GlusterError: if the command failed or the output can't be parsed
+    """
+    for record in stream_heal_info(source, split_brain):
+        if isinstance(record, HealEntry):
+            yield record
+
+
+def parse_heal_info(output_xml, split_brain: bool = False) -> Result:
+    """
+    Parse heal info --xml output into one BrickHealInfo per brick with its
+    entries
+    :param output_xml: bytes, String or a file like object
+    :param split_brain: bool.  The output is from info split-brain
+    :return: Result.  List of BrickHealInfo or Err
+    """
+    bricks = []
+    entries = []
+    try:
+        for record in stream_heal_info(output_xml, split_brain):
+            if isinstance(record, HealEntry):
+                entries.append(record)
+            else:
+                record.entries = entries
+                entries = []
+                bricks.append(record)
+    except GlusterError as e:
+        return Err(str(e))
+    return Ok(bricks)
+
+
+def parse_heal_summary(output_xml) -> Result:
+    """
+    Parse the --xml output of heal info summary or statistics heal-count
+    :param output_xml: bytes, String or a file like object
+    :return: Result.  List of BrickHealInfo or Err
+    """
+    try:
+        return Ok([record for record in stream_heal_info(output_xml)
+                   if isinstance(record, BrickHealInfo)])
+    except GlusterError as e:
+        return Err(str(e))
+
+
+def parse_heal_count(output) -> Result:
+    """
+    Parse statistics heal-count output.  Some gluster releases print their
+    usual text even when asked for --xml so both are understood.
+    Brick host:/path
+    Number of entries: 3
+    :param output: bytes or String
+    :return: Result.  List of BrickHealInfo or Err
+    """
+    if isinstance(output, bytes):
+        output = output.decode("utf-8", "replace")
+    if output.lstrip().startswith("<"):
+        return parse_heal_summary(output)
+    bricks = []
+    for line in output.splitlines():
+        line = line.strip()
+        if line.startswith("Brick "):
+            host, path = _split_brick_name(line[len("Brick "):])
+            bricks.append(BrickHealInfo(host=host, path=path, host_uuid=None,
+                                        status=None, total=None))
+        elif line.startswith("Number of entries:") and bricks:
+            bricks[-1].total = _heal_count(line.split(":", 1)[1])
+        elif line.startswith("Status:") and bricks:
+            bricks[-1].status = line.split(":", 1)[1].strip()
+    return Ok(bricks)
+
+
+def _heal_info_args(volume: str, split_brain: bool) -> List[str]:
+    arg_list = ["volume", "heal", volume, "info"]
+    if split_brain:
+        arg_list.append("split-brain")
+    return arg_list + ["--xml"]
+
+
+def heal_info(volume: str, split_brain: bool = False) -> Result:
+    """
+    The entries needing heal on each brick of a volume.  Listing every
+    entry can be slow on a volume with a big backlog.  Use heal_summary when
+    only the counts are needed or iter_heal_entries to process the entries
+    as they're listed.
+    :param volume: String.  The volume to query
+    :param split_brain: bool.  Only list entries in split-brain
+    :return: Result.  List of BrickHealInfo with their entries or Err
+    """
+    output = run_command("gluster", _heal_info_args(volume, split_brain),
+                         True, False)
+    if output.is_err():
+        return Err("Volume heal info command failed with error: {}".format(
+            output.value))
+    return parse_heal_info(output.value, split_brain)
+
+
+def iter_heal_info(volume: str, split_brain: bool = False) -> Iterator[
+        Union[HealEntry, BrickHealInfo]]:
+    """
+    Lazily yield heal info records as the command lists them.  Stopping
+    early kills the command.  See stream_heal_info.
+    :param volume: String.  The volume to query
+    :param split_brain: bool.  Only list entries in split-brain
+    :return: Iterator of HealEntry and BrickHealInfo
+    :raise GlusterError: if the command fails
+    """
+    arg_list = _heal_info_args(volume, split_brain)
+    with command_stream("gluster", arg_list, True, False) as stdout:
+        yield from stream_heal_info(stdout, split_brain)
+
+
+def iter_heal_entries(volume: str, split_brain: bool = False) -> \
+        Iterator[HealEntry]:
+    """
+    Lazily yield the entries needing heal.  Stopping early kills the
+    command.
+    :param volume: String.  The volume to query
+    :param split_brain: bool.  Only list entries in split-brain
+    :return: Iterator of HealEntry
+    :raise GlusterError: if the command fails
+    """
+    for record in iter_heal_info(volume, split_brain):
+        if isinstance(record, HealEntry):
+            yield record
+
+
+def heal_info_summary(volume: str) -> Result:
+    """
+    Count the entries needing heal, in split-brain and possibly healing on
+    each brick without listing them.  Needs gluster 3.13 or later.
+    :param volume: String.  The volume to query
+    :return: Result.  List of BrickHealInfo or Err
+    """
+    arg_list = ["volume", "heal", volume, "info", "summary", "--xml"]
+    output = run_command("gluster", arg_list, True, False)
+    if output.is_err():
+        return Err("Volume heal info summary command failed with error: "
+                   "{}".format(output.value))
+    return parse_heal_summary(output.value)
+
+
+def heal_count(volume: str) -> Result:
+    """
+    Count the entries needing heal on each brick, as the self heal daemon's
+    index has them.  Cheaper than heal info and available on every
+    release.
+    :param volume: String.  The volume to query
+    :return: Result.  List of BrickHealInfo with only the total or Err
+    """
+    arg_list = ["volume", "heal", volume, "statistics", "heal-count",
+                "--xml"]
+    output = run_command("gluster", arg_list, True, False)
+    if output.is_err():
+        return Err("Volume heal statistics command failed with error: "
+                   "{}".format(output.value))
+    return parse_heal_count(output.value)
+
+
+def heal_summary(volume: str) -> Result:
+    """
+    The per brick heal counts without any entry lists, for fleet wide
+    checks.  Uses info summary and falls back to statistics heal-count on
+    releases without it.
+    :param volume: String.  The volume to query
+    :return: Result.  List of BrickHealInfo or Err
+    """
+    summary = heal_info_summary(volume)
+    if summary.is_ok():
+        return summary
+    return heal_count(volume)
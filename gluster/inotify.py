@@ -0,0 +1,132 @@
+# A minimal binding to Linux inotify using ctypes so no extra package is
+# needed.  Only what the heal tracker uses is wrapped: watching directories
+# for entries being created and removed.
+#
+# Example:
+#   with Inotify() as notify:
+#       wd = notify.add_watch(b"/srv/brick/.glusterfs/indices/xattrop",
+#                             IN_CREATE | IN_DELETE)
+#       for wd, mask, cookie, name in notify.read_events(timeout=1.0):
+#           print(wd, mask, name)
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+from typing import Iterator, Optional, Tuple
+
+# Event masks from <sys/inotify.h>
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_EVENT = struct.Struct("iIII")
+# Enough for a few hundred events per read
+READ_SIZE = 64 * 1024
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        _libc = libc
+    return _libc
+
+
+def _check(value: int) -> int:
+    if value < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return value
+
+
+class Inotify(object):
+    def __init__(self):
+        """
+        An inotify instance.  Close it when done, or use it as a context
+        manager.
+        :raise OSError: if inotify isn't available or the per user instance
+          limit has been reached
+        """
+        self._libc = _load_libc()
+        flags = os.O_NONBLOCK | os.O_CLOEXEC
+        self.fd = _check(self._libc.inotify_init1(flags))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def add_watch(self, path, mask: int) -> int:
+        """
+        Watch a path
+        :param path: String or bytes.  The file or directory to watch
+        :param mask: int.  IN_* events to report
+        :return: int.  The watch descriptor events will carry
+        :raise OSError: if the path can't be watched
+        """
+        return _check(self._libc.inotify_add_watch(self.fd, os.fsencode(path),
+                                                   ctypes.c_uint32(mask)))
+
+    def rm_watch(self, wd: int):
+        """
+        Stop watching.  The kernel sends IN_IGNORED for the watch.
+        :param wd: int.  Watch descriptor from add_watch
+        """
+        try:
+            _check(self._libc.inotify_rm_watch(self.fd, wd))
+        except OSError as e:
+            # Already gone with the directory
+            if e.errno != errno.EINVAL:
+                raise
+
+    def read_events(self, timeout: Optional[float] = 0) -> \
+            Iterator[Tuple[int, int, int, bytes]]:
+        """
+        Yield the events from one read of the queue, waiting up to timeout
+        seconds for the first one.  At most READ_SIZE bytes of events are
+        read so a busy queue can't keep the caller here; call again for the
+        rest.
+        :param timeout: float.  Seconds to wait, 0 to not wait or None to
+          wait forever
+        :return: Iterator of (wd, mask, cookie, name).  name is empty for
+          events about the watched path itself.  wd is -1 for
+          IN_Q_OVERFLOW.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            yield wd, mask, cookie, name
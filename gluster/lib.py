@@ -10,13 +10,29 @@
 # Repo](https:#github.com/cholcombe973/Gluster)
 # Pull requests are more than welcome!
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from enum import Enum
 from ipaddress import ip_address
+import fcntl
+import os
+import random
 import re
 from result import Err, Ok, Result
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+import signal
+import socket
+import struct
 import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+import xml.etree.ElementTree as etree
 
 
 class SelfHealAlgorithm(Enum):
@@ -60,7 +76,7 @@ class SplitBrainPolicy(Enum):
         elif s == "mtime":
             return SplitBrainPolicy.Mtime
         elif s == "size":
-            return SplitBrainPolicy.Size,
+            return SplitBrainPolicy.Size
         else:
             return None
 
@@ -590,38 +606,999 @@ class GlusterError(Exception):
         super(GlusterError, self).__init__(message)
 
 
-def run_command(command: str, arg_list: List[str], as_root: bool,
-                script_mode: bool) -> Result:
+# One uuid.UUID object per distinct value while anything still uses it
+_uuids = weakref.WeakValueDictionary()
+_uuids_lock = threading.Lock()
+
+
+def intern_uuid(value) -> Optional[uuid.UUID]:
+    """
+    Return a shared uuid.UUID for value.  Every brick on a host refers to
+    the same UUID so parsing large volumes doesn't keep thousands of copies.
+    :param value: uuid.UUID or String
+    :return: uuid.UUID or None if value is None
+    :raise ValueError: if value is a String that isn't a UUID
+    """
+    if value is None:
+        return None
+    if not isinstance(value, uuid.UUID):
+        value = uuid.UUID(value.strip())
+    with _uuids_lock:
+        shared = _uuids.get(value.int)
+        if shared is None:
+            _uuids[value.int] = value
+            shared = value
+    return shared
+
+
+def intern_str(value):
+    """
+    Intern hostnames, paths and option names that repeat across many objects
+    :param value: String.  Anything else is returned unchanged
+    """
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
+# Bytes read from a pipe or file at a time by iter_cli_xml
+XML_CHUNK_SIZE = 64 * 1024
+
+
+def _xml_chunks(source) -> Iterator:
+    if isinstance(source, (bytes, str)):
+        yield source
+        return
+    while True:
+        chunk = source.read(XML_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_cli_xml(source, record_paths: Iterable[str]) -> Iterator[
+        Tuple[str, etree.Element]]:
     """
+    Incrementally parse the --xml output of a gluster command.  Only a chunk
+    of the input and the record currently being built are held in memory so
+    very large outputs can be read straight from a subprocess pipe.
+    Each element whose path matches one of record_paths is yielded once it
+    is complete and is then removed from the tree and cleared, so copy
+    anything you need out of it before asking for the next record.
+    :param source: bytes, String or a file like object opened for reading
+      such as Popen.stdout
+    :param record_paths: list.  Slash separated tag paths from the root, for
+      example cliOutput/volStatus/volumes/volume/node.  A last component of
+      * matches every child of that path.
+    :return: Iterator of (path, Element)
+    :raise GlusterError: if the command reported a failure or the output
+      isn't well formed XML
+    """
+    record_paths = set(record_paths)
+    parser = etree.XMLPullParser(events=("start", "end"))
+    stack = []
+    path = []
+    return_code = 0
+    try:
+        for chunk in _xml_chunks(source):
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == "start":
+                    stack.append(elem)
+                    path.append(elem.tag)
+                    continue
+                elem_path = "/".join(path)
+                stack.pop()
+                path.pop()
+                if elem_path == "cliOutput/opRet":
+                    return_code = int(elem.text)
+                elif elem_path == "cliOutput/opErrstr" and return_code != 0:
+                    raise GlusterError(elem.text or "gluster command failed "
+                                       "with {}".format(return_code))
+                if elem_path not in record_paths and \
+                        "/".join(path + ["*"]) not in record_paths:
+                    continue
+                yield elem_path, elem
+                if stack:
+                    stack[-1].remove(elem)
+                elem.clear()
+        parser.close()
+    except etree.ParseError as e:
+        raise GlusterError("Unable to parse gluster xml output: {}".format(e))
+    if return_code != 0:
+        raise GlusterError("gluster command failed with {}".format(
+            return_code))
+
+
+def build_command(command: str, arg_list: List[str], as_root: bool,
+                  script_mode: bool) -> List[str]:
+    """
+    Build the argv used to run a command
     command: String.  The command to run
     arg_list: list. A list of arguments to add to the command
     as_root: bool.  Should the command be run as root
     script_mode: bool.  Should the command be run in script mode
-    :returns: Result.  Ok(stdout) or Err(stderr)
+    :returns: list.  The full command line
     """
     cmd = []
     if as_root:
         cmd.append("sudo")
-    else:
-        cmd.append(command)
+    cmd.append(command)
     if script_mode:
         cmd.append("--mode=script")
     for arg in arg_list:
-        cmd.append(arg)
+        cmd.append(str(arg))
+    return cmd
+
+
+class CommandTimeout(GlusterError):
+    def __init__(self, cmd: List[str], elapsed: float):
+        """
+        Returned inside an Err when a command ran past its deadline and was
+        killed.
+        :param cmd: list.  The command line that timed out
+        :param elapsed: float.  Seconds the command ran before being killed
+        """
+        self.cmd = cmd
+        self.elapsed = elapsed
+        super(CommandTimeout, self).__init__(
+            "Command '{}' timed out after {:.1f}s".format(" ".join(cmd),
+                                                          elapsed))
+
+
+# Timeout applied to run_command calls that don't pass one.  None means no
+# limit.
+_timeouts = {"default": None}
+# The absolute time.monotonic() deadline set by command_deadline() in the
+# current thread, so one thread's budget doesn't limit another's commands
+_deadline = threading.local()
+
+
+def set_command_timeout(timeout: Optional[float]):
+    """
+    Set the timeout used by every run_command call that doesn't give one
+    :param timeout: float.  Seconds, or None to wait forever
+    """
+    _timeouts["default"] = timeout
+
+
+@contextmanager
+def command_deadline(seconds: float):
+    """
+    Every command this thread runs inside this block must finish within
+    seconds of entering it.  Commands started after the deadline fail
+    immediately.  Nested deadlines can only shorten the outer one.  Other
+    threads aren't affected.
+    :param seconds: float.  Time budget for the block
+    """
+    previous = getattr(_deadline, "value", None)
+    deadline = time.monotonic() + seconds
+    if previous is not None:
+        deadline = min(deadline, previous)
+    _deadline.value = deadline
     try:
-        output = subprocess.check_output(cmd, stderr=subprocess.PIPE)
-        return Ok(output)
-    except subprocess.CalledProcessError as e:
-        return Err(e.output)
+        yield
+    finally:
+        _deadline.value = previous
 
 
-def get_local_ip() -> Result:
+def command_timeout(timeout: Optional[float] = None) -> Optional[float]:
     """
-    Returns the local IPAddr address associated with this server
-    # Failures
-    Returns a GlusterError representing any failure that may have happened
-    while trying to
-    query this information.
+    Work out how long a command may run for given the per call timeout, the
+    default timeout and any active command_deadline
+    :param timeout: float.  The per call timeout or None for the default
+    :return: float.  Seconds the command may run, or None for no limit
+    """
+    if timeout is None:
+        timeout = _timeouts["default"]
+    deadline = getattr(_deadline, "value", None)
+    if deadline is not None:
+        remaining = max(0.0, deadline - time.monotonic())
+        if timeout is None or remaining < timeout:
+            timeout = remaining
+    return timeout
+
+
+def kill_process_group(pid: int, as_root: bool):
+    """
+    Kill a command started in its own session along with everything it
+    spawned.  Commands run through sudo belong to root so if we aren't
+    allowed to signal them directly sudo is used to do it.
+    :param pid: int.  Process id of the session leader
+    :param as_root: bool.  Whether the command was run with sudo
+    """
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    except PermissionError:
+        if as_root:
+            subprocess.call(["sudo", "-n", "kill", "-KILL", "--",
+                             "-{}".format(pid)],
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+
+
+# Sub commands and actions that only read cluster state
+READ_ONLY_VERBS = ("info", "list", "status", "get", "statistics")
+# volume sub commands whose action follows the volume name, as in
+# volume heal <vol> info.  Anything after the action is a value.
+ACTION_COMMANDS = ("quota", "heal", "rebalance", "profile")
+# Errors glusterd gives when another transaction holds the cluster lock
+LOCK_CONTENTION_RE = re.compile(
+    r"another transaction (is|could be) in progress|locking failed on|"
+    r"unable to acquire lock", re.IGNORECASE)
+
+
+def is_read_only(command: str, arg_list: List[str]) -> bool:
+    """
+    Decide if a command only reads cluster state.  Anything that isn't a
+    gluster command is treated as read only.
+    :param command: String.  The command to run
+    :param arg_list: list.  Arguments to the command
+    :return: bool.  True if the command doesn't change cluster state
+    """
+    if command != "gluster":
+        return True
+    args = [str(arg) for arg in arg_list if not str(arg).startswith("--")]
+    if len(args) < 2:
+        return True
+    if args[0] == "pool":
+        return True
+    if args[0] in ("volume", "vol"):
+        if args[1] in READ_ONLY_VERBS:
+            return True
+        return _volume_action_is_read_only(args[1], args[2:])
+    return args[1] in READ_ONLY_VERBS
+
+
+def _volume_action_is_read_only(sub_command: str, args: List[str]) -> bool:
+    # Only the action word is looked at.  Option names and values such as
+    # volume set <vol> <key> info are never taken for one.
+    if sub_command in ACTION_COMMANDS:
+        return len(args) > 1 and \
+            args[1] in READ_ONLY_VERBS + ("list-objects",)
+    if sub_command == "bitrot":
+        # volume bitrot <vol> scrub status
+        return args[1:3] == ["scrub", "status"]
+    if sub_command == "remove-brick":
+        # volume remove-brick <vol> [replica <count>] <brick> ... status
+        return len(args) > 1 and args[-1] == "status"
+    if sub_command == "geo-replication":
+        # volume geo-replication [<master> [<slave>]] status [detail]
+        return "status" in args[:3]
+    return False
+
+
+def is_lock_contention(output) -> bool:
+    """
+    :param output: bytes or String.  Error output of a gluster command
+    :return: bool.  True if glusterd refused because its lock was held
+    """
+    if isinstance(output, bytes):
+        output = output.decode('utf-8', 'replace')
+    return LOCK_CONTENTION_RE.search(str(output)) is not None
+
+
+class SchedulerStats(object):
+    def __init__(self):
+        """
+        Counters kept by the CommandScheduler
+        serialized: int.  Mutating commands run under the lock
+        lock_wait_time: float.  Total seconds spent waiting for the lock
+        retries: int.  Commands retried because glusterd was busy
+        retry_wait_time: float.  Total seconds spent backing off
+        last_wait: float.  Lock wait plus back off of the last command
+        """
+        self.serialized = 0
+        self.lock_wait_time = 0.0
+        self.retries = 0
+        self.retry_wait_time = 0.0
+        self.last_wait = 0.0
+
+    def __str__(self):
+        return "serialized: {} lock wait: {:.3f}s retries: {} " \
+               "retry wait: {:.3f}s last wait: {:.3f}s".format(
+                   self.serialized, self.lock_wait_time, self.retries,
+                   self.retry_wait_time, self.last_wait)
+
+
+class CommandScheduler(object):
+    def __init__(self, lock_path: str = "/var/run/gluster-charm.lock",
+                 max_retries: int = 5, base_delay: float = 0.5,
+                 max_delay: float = 8.0):
+        """
+        Runs mutating gluster commands one at a time per node and retries
+        them when glusterd reports another transaction holds its lock.
+        Read only commands go straight through.
+        :param lock_path: String.  Lock file shared by every process on the
+          node.  If it can't be opened commands run without it.
+        :param max_retries: int.  Retries after a lock contention error
+        :param base_delay: float.  Back off before the first retry.  Doubles
+          with each retry, with full jitter.
+        :param max_delay: float.  Upper bound of a single back off
+        """
+        self.lock_path = lock_path
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = SchedulerStats()
+        self._stats_lock = threading.Lock()
+
+    def _acquire(self, deadline: Optional[float]):
+        """
+        Take the node wide lock, polling so a deadline can be honoured
+        :return: The open lock file or None if it couldn't be used
+        :raises: BlockingIOError if the deadline passes before the lock is
+          free
+        """
+        try:
+            lock_file = open(self.lock_path, "a")
+        except (IOError, OSError):
+            return None
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_file
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    lock_file.close()
+                    raise
+                time.sleep(0.05)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay,
+                                     self.base_delay * (2 ** attempt)))
+
+    def run(self, cmd: List[str], as_root: bool,
+            timeout: Optional[float]) -> Result:
+        """
+        Run a mutating command under the node lock, retrying on glusterd
+        lock contention until the retries or the timeout run out
+        :param cmd: list.  Full command line
+        :param as_root: bool.  Whether the command is run with sudo
+        :param timeout: float.  Seconds for the whole call including lock
+          waits and back off, or None for no limit
+        :return: Result.  The result of the last attempt
+        """
+        start = time.monotonic()
+        deadline = None
+        if timeout is not None:
+            deadline = start + timeout
+        try:
+            lock_file = self._acquire(deadline)
+        except BlockingIOError:
+            lock_wait = time.monotonic() - start
+            with self._stats_lock:
+                self.stats.lock_wait_time += lock_wait
+                self.stats.last_wait = lock_wait
+            return Err(CommandTimeout(cmd, lock_wait))
+        lock_wait = time.monotonic() - start
+        retry_wait = 0.0
+        try:
+            attempt = 0
+            while True:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                result = _execute(cmd, as_root, remaining)
+                if result.is_ok() or attempt >= self.max_retries or \
+                        not is_lock_contention(result.value):
+                    return result
+                delay = self._backoff(attempt)
+                if deadline is not None and \
+                        time.monotonic() + delay >= deadline:
+                    # No time left for another attempt
+                    return result
+                time.sleep(delay)
+                retry_wait += delay
+                attempt += 1
+                with self._stats_lock:
+                    self.stats.retries += 1
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+            with self._stats_lock:
+                self.stats.serialized += 1
+                self.stats.lock_wait_time += lock_wait
+                self.stats.retry_wait_time += retry_wait
+                self.stats.last_wait = lock_wait + retry_wait
+
+
+# Used by run_command for every mutating gluster command
+_scheduler = CommandScheduler()
+
+
+def scheduler_stats() -> SchedulerStats:
+    """
+    :return: SchedulerStats.  Lock wait and retry counters of run_command
+    """
+    return _scheduler.stats
+
+
+def run_scheduled(cmd: List[str], as_root: bool,
+                  timeout: Optional[float]) -> Result:
+    """
+    Run a mutating gluster command line under the node lock with lock
+    contention retries, as run_command does.  For callers that build the
+    command line themselves such as gluster.aio.
+    :param cmd: list.  Full command line as built by build_command
+    :param as_root: bool.  Whether the command is run with sudo
+    :param timeout: float.  Seconds for the whole call or None
+    :return: Result.  Ok(stdout) or Err(stderr)
+    """
+    return _scheduler.run(cmd, as_root, timeout)
+
+
+def _execute(cmd: List[str], as_root: bool,
+             timeout: Optional[float]) -> Result:
+    """
+    Run a command line once, killing it if it runs past timeout
+    """
+    if timeout is not None and timeout <= 0:
+        return Err(CommandTimeout(cmd, 0.0))
+
+    start = time.monotonic()
+    try:
+        # A new session lets us kill sudo and the command it started together
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   start_new_session=True)
+    except OSError as e:
+        return Err("Unable to run {}: {}".format(" ".join(cmd), e))
+    try:
+        output, error = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_process_group(process.pid, as_root)
+        process.communicate()
+        return Err(CommandTimeout(cmd, time.monotonic() - start))
+    except BaseException:
+        # Don't leave the command running if we are interrupted
+        kill_process_group(process.pid, as_root)
+        process.wait()
+        raise
+    if process.returncode != 0:
+        if output:
+            return Err(output)
+        return Err(error)
+    return Ok(output)
+
+
+class _Flight(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight(object):
+    def __init__(self):
+        """
+        Coalesces identical calls that overlap in time.  The first caller
+        runs the command and everyone who asks for the same thing while it
+        is running waits for that result instead of starting their own.
+        leaders: int.  Calls that actually ran
+        followers: int.  Calls that were answered by another caller's run
+        """
+        self.leaders = 0
+        self.followers = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key) -> tuple:
+        """
+        Join the flight for key, starting one if there is none.  For callers
+        that can't hand do() a function, such as coroutines.
+        :param key: Hashable key identifying identical calls
+        :return: tuple.  (flight, leader).  The leader must call finish()
+          once it has its result, even if it failed.  Followers wait on
+          flight.done and then read flight.result, which is None if the
+          leader didn't get one.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.leaders += 1
+            else:
+                self.followers += 1
+        return flight, leader
+
+    def finish(self, key, flight: _Flight, result: Optional[Result]):
+        """
+        Land a flight started by begin() and wake its followers
+        :param key: Hashable key given to begin()
+        :param flight: _Flight returned by begin()
+        :param result: Result or None if the leader was interrupted
+        """
+        flight.result = result
+        with self._lock:
+            del self._flights[key]
+        flight.done.set()
+
+    def do(self, key, fn, timeout: Optional[float] = None) -> Result:
+        """
+        :param key: Hashable key identifying identical calls
+        :param fn: Callable returning a Result.  Only run by the leader.
+        :param timeout: float.  How long a follower waits for the leader
+        :return: Result.  The leader's result
+        """
+        flight, leader = self.begin(key)
+        if leader:
+            result = None
+            try:
+                result = fn()
+            finally:
+                self.finish(key, flight, result)
+            return result
+        start = time.monotonic()
+        if not flight.done.wait(timeout):
+            return Err(CommandTimeout(list(key),
+                                      time.monotonic() - start))
+        if flight.result is None:
+            # The leader was interrupted before it got a result
+            return fn()
+        return flight.result
+
+
+# Shares in flight read only gluster queries between threads
+_single_flight = SingleFlight()
+
+
+def begin_read(cmd: List[str]) -> tuple:
+    """
+    Join the in flight run of a read only gluster query, for callers that
+    run the command themselves such as gluster.aio.  Shared with
+    run_command so threads and coroutines asking for the same thing run it
+    once.
+    :param cmd: list.  A full command line as built by build_command
+    :return: tuple.  (flight, leader).  See SingleFlight.begin.  The leader
+      runs cmd and passes its result to finish_read.
+    """
+    return _single_flight.begin(tuple(cmd))
+
+
+def finish_read(cmd: List[str], flight, result: Optional[Result]):
+    """
+    Hand the leader's result of a query joined with begin_read to its
+    followers
+    :param cmd: list.  The command line given to begin_read
+    :param flight: The flight returned by begin_read
+    :param result: Result or None if the command didn't finish
+    """
+    _single_flight.finish(tuple(cmd), flight, result)
+
+
+def cache_scope(arg_list: List[str]):
+    """
+    Work out which part of the cluster state a gluster command reads or
+    changes
+    :param arg_list: list.  Arguments to the gluster command
+    :return: tuple.  ("peer", None) for peer and pool commands,
+      ("volume", name) for commands on one volume, ("volume", None) for
+      commands on every volume and (None, None) if unknown
+    """
+    args = [str(arg) for arg in arg_list if not str(arg).startswith("--")]
+    if len(args) > 0 and args[0] in ("peer", "pool"):
+        return "peer", None
+    if len(args) > 0 and args[0] in ("volume", "vol"):
+        if len(args) < 3 or args[1] == "list" or args[2] == "all":
+            return "volume", None
+        return "volume", args[2]
+    return None, None
+
+
+class ReadCacheStats(object):
+    def __init__(self):
+        """
+        Counters kept by the ReadCache
+        hits: int.  Queries answered from the cache
+        misses: int.  Queries that ran the command
+        invalidations: int.  Entries dropped because of a mutating command
+        evictions: int.  Entries dropped to stay within max_entries
+        """
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def __str__(self):
+        return "hits: {} misses: {} invalidations: {} evictions: {}".format(
+            self.hits, self.misses, self.invalidations, self.evictions)
+
+
+class ReadCache(object):
+    def __init__(self):
+        """
+        An opt in cache of read only gluster query output.  Entries are keyed
+        by the full command line and tagged with the volume (or peer list)
+        they describe so mutating commands can drop just what they change.
+        Disabled until enable() is called.
+        """
+        self.enabled = False
+        self.ttl = 0.0
+        self.max_entries = 0
+        self.stats = ReadCacheStats()
+        # Bumped by every invalidation so a read that was running while its
+        # output went stale isn't stored
+        self.generation = 0
+        # command line -> (expiry time, scope, Result)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def enable(self, ttl: float, max_entries: int):
+        with self._lock:
+            self.enabled = True
+            self.ttl = ttl
+            self.max_entries = max_entries
+
+    def disable(self):
+        with self._lock:
+            self.enabled = False
+            self.generation += 1
+            self._entries.clear()
+
+    def get(self, key) -> Optional[Result]:
+        with self._lock:
+            if not self.enabled:
+                return None
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry[2]
+            if entry is not None:
+                del self._entries[key]
+            self.stats.misses += 1
+            return None
+
+    def put(self, key, scope, result: Result,
+            generation: Optional[int] = None):
+        """
+        :param key: Hashable.  The command line
+        :param scope: tuple.  As returned by cache_scope
+        :param result: Result.  The command's output.  Errors aren't stored.
+        :param generation: int.  The generation when the command started.
+          Nothing is stored if an invalidation happened since.
+        """
+        if result.is_err():
+            return
+        with self._lock:
+            if not self.enabled:
+                return
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, scope, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def invalidate(self, scope=(None, None)):
+        """
+        Drop the entries a change to scope could make stale.  A volume
+        change drops that volume's entries and anything covering every
+        volume.  A peer change drops the peer entries.  An unknown scope
+        drops everything.
+        :param scope: tuple.  As returned by cache_scope
+        """
+        kind, volume = scope
+        with self._lock:
+            self.generation += 1
+            for key, entry in list(self._entries.items()):
+                entry_kind, entry_volume = entry[1]
+                if kind is not None and kind != entry_kind:
+                    continue
+                if volume is not None and entry_volume is not None \
+                        and volume != entry_volume:
+                    continue
+                del self._entries[key]
+                self.stats.invalidations += 1
+
+
+# Read only gluster query output.  Off unless enable_read_cache is called.
+_read_cache = ReadCache()
+
+
+def enable_read_cache(ttl: float = 5.0, max_entries: int = 256):
+    """
+    Cache the output of read only gluster queries such as volume info,
+    volume status, quota list and pool list.  Commands that change a volume
+    or the peer list invalidate the affected entries.
+    :param ttl: float.  Seconds an entry is kept
+    :param max_entries: int.  Maximum number of entries kept
+    """
+    _read_cache.enable(ttl, max_entries)
+
+
+def disable_read_cache():
+    """
+    Stop caching read only gluster queries and drop everything cached
+    """
+    _read_cache.disable()
+
+
+def invalidate_read_cache(volume: Optional[str] = None):
+    """
+    Drop cached query output
+    :param volume: String.  Only drop entries for this volume, or None to
+      drop everything
+    """
+    if volume is None:
+        _read_cache.invalidate()
+    else:
+        _read_cache.invalidate(("volume", volume))
+
+
+def read_cache_lookup(cmd: List[str]) -> Optional[Result]:
+    """
+    :param cmd: list.  A full command line as built by build_command
+    :return: Result.  The cached output of cmd or None
+    """
+    return _read_cache.get(tuple(cmd))
+
+
+def read_cache_generation() -> int:
+    """
+    :return: int.  Changes whenever the read cache is invalidated.  Take it
+      before running a query and pass it to read_cache_update.
+    """
+    return _read_cache.generation
+
+
+def read_cache_update(command: str, arg_list: List[str], cmd: List[str],
+                      result: Result, generation: Optional[int] = None):
+    """
+    Tell the read cache a command has finished.  Read only gluster queries
+    are stored and mutating gluster commands invalidate what they changed.
+    :param command: String.  The command that ran
+    :param arg_list: list.  Its arguments
+    :param cmd: list.  The full command line as built by build_command
+    :param result: Result.  What the command returned
+    :param generation: int.  read_cache_generation() from before the
+      command ran.  A query isn't stored if the cache was invalidated since.
+    """
+    if command != "gluster":
+        return
+    if is_read_only(command, arg_list):
+        _read_cache.put(tuple(cmd), cache_scope(arg_list), result,
+                        generation)
+    else:
+        _read_cache.invalidate(cache_scope(arg_list))
+
+
+def read_cache_stats() -> ReadCacheStats:
+    """
+    :return: ReadCacheStats.  Hit and miss counters of the read cache
+    """
+    return _read_cache.stats
+
+
+def run_command(command: str, arg_list: List[str], as_root: bool,
+                script_mode: bool, timeout: Optional[float] = None) -> Result:
+    """
+    command: String.  The command to run
+    arg_list: list. A list of arguments to add to the command
+    as_root: bool.  Should the command be run as root
+    script_mode: bool.  Should the command be run in script mode
+    timeout: float.  Seconds to wait before killing the command.  Defaults to
+      the value given to set_command_timeout and is capped by any active
+      command_deadline.
+    Gluster commands that change cluster state are serialized across
+    processes on this node and retried when glusterd reports another
+    transaction is in progress.  See CommandScheduler.  Identical read only
+    gluster queries that overlap share one process and its output.  See
+    SingleFlight.  If enable_read_cache was called their output is also
+    cached until it expires or a mutating command invalidates it.
+    :returns: Result.  Ok(stdout) or Err(stderr).  A command that timed out
+      returns Err(CommandTimeout)
+    """
+    cmd = build_command(command, arg_list, as_root, script_mode)
+    timeout = command_timeout(timeout)
+    if not is_read_only(command, arg_list):
+        try:
+            return _scheduler.run(cmd, as_root, timeout)
+        finally:
+            _read_cache.invalidate(cache_scope(arg_list))
+    if command != "gluster":
+        return _execute(cmd, as_root, timeout)
+
+    key = tuple(cmd)
+    cached = _read_cache.get(key)
+    if cached is not None:
+        return cached
+
+    def read():
+        # Only the leader stores the output.  A follower may have started
+        # after an invalidation the leader's command predates.
+        generation = _read_cache.generation
+        result = _execute(cmd, as_root, timeout)
+        _read_cache.put(key, cache_scope(arg_list), result, generation)
+        return result
+    return _single_flight.do(key, read, timeout)
+
+
+class _StreamReader(object):
+    # Wraps a pipe to notice when the reader has reached the end of it
+    def __init__(self, pipe):
+        self.pipe = pipe
+        self.eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.pipe.read(size)
+        if not data and size != 0:
+            self.eof = True
+        elif size is None or size < 0:
+            self.eof = True
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        line = self.pipe.readline(size)
+        if not line:
+            self.eof = True
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+    def fileno(self) -> int:
+        return self.pipe.fileno()
+
+
+@contextmanager
+def command_stream(command: str, arg_list: List[str], as_root: bool,
+                   script_mode: bool, timeout: Optional[float] = None):
+    """
+    Run a read only command and hand its stdout pipe to the caller to read
+    as the output is produced.  Use this with the stream_* parsers to
+    handle output bigger than you want to hold in memory or to stop as soon
+    as you've seen what you need.  Streamed commands don't share the read
+    cache or SingleFlight with run_command.
+    with command_stream("gluster", ["vol", "status", "test", "--xml"],
+                        True, False) as stdout:
+        for status in stream_volume_status(stdout):
+            ...
+    command: String.  The command to run
+    arg_list: list. A list of arguments to add to the command
+    as_root: bool.  Should the command be run as root
+    script_mode: bool.  Should the command be run in script mode
+    timeout: float.  Seconds to allow, as for run_command.  The command is
+      killed when it runs out.
+    :return: A binary file like object reading the command's stdout
+    :raise GlusterError: if the command can't be started, is not read only
+      or exits non zero after its output was read to the end.
+      CommandTimeout if it ran out of time.  If the block exits early the
+      command is killed and no error is raised for it.
+    """
+    if not is_read_only(command, arg_list):
+        raise GlusterError("Only read only commands can be streamed: "
+                           "{}".format(" ".join(arg_list)))
+    cmd = build_command(command, arg_list, as_root, script_mode)
+    timeout = command_timeout(timeout)
+    if timeout is not None and timeout <= 0:
+        raise CommandTimeout(cmd, 0.0)
+
+    start = time.monotonic()
+    # stderr goes to a file so a chatty command can't block on a full pipe
+    # while we're reading stdout
+    stderr = tempfile.TemporaryFile()
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                   stderr=stderr, start_new_session=True)
+    except OSError as e:
+        stderr.close()
+        raise GlusterError("Unable to run {}: {}".format(" ".join(cmd), e))
+    timer = None
+    timed_out = threading.Event()
+    if timeout is not None:
+        def expire():
+            timed_out.set()
+            kill_process_group(process.pid, as_root)
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+    reader = _StreamReader(process.stdout)
+    finished = False
+    try:
+        yield reader
+        # Still running without its output read to the end means the caller
+        # stopped early
+        finished = reader.eof or process.poll() is not None
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if not finished:
+            kill_process_group(process.pid, as_root)
+        process.stdout.close()
+        process.wait()
+        stderr.seek(0)
+        error = stderr.read()
+        stderr.close()
+    if timed_out.is_set():
+        raise CommandTimeout(cmd, time.monotonic() - start)
+    if not finished:
+        # The caller stopped early and we killed it
+        return
+    if process.returncode != 0:
+        message = error.decode("utf-8", "replace").strip()
+        if not message:
+            message = "{} exited with {}".format(" ".join(cmd),
+                                                 process.returncode)
+        raise GlusterError(message)
+
+
+# The kernel's IPv4 routing table.  Reading it is much cheaper than forking
+# ip route and lets us notice when the routes change.
+ROUTE_TABLE_PATH = "/proc/net/route"
+# Flags from linux/route.h
+RTF_UP = 0x0001
+RTF_GATEWAY = 0x0002
+
+# The routing table get_local_ip last answered for and its answer
+_local_ip_cache = {"routes": None, "ip": None}
+_local_ip_lock = threading.Lock()
+
+
+def _read_route_table() -> Optional[str]:
+    try:
+        with open(ROUTE_TABLE_PATH) as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+def _default_gateway(route_table: str) -> Optional[str]:
+    """
+    Find the gateway of the default route with the lowest metric
+    :param route_table: String.  Contents of /proc/net/route
+    :return: String or None if there is no default route via a gateway
+    """
+    best = None
+    # Iface Destination Gateway Flags RefCnt Use Metric Mask MTU Window IRTT
+    for line in route_table.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 8:
+            continue
+        try:
+            destination = int(fields[1], 16)
+            gateway = int(fields[2], 16)
+            flags = int(fields[3], 16)
+            metric = int(fields[6])
+            mask = int(fields[7], 16)
+        except ValueError:
+            continue
+        if destination != 0 or mask != 0:
+            continue
+        if not flags & RTF_UP or not flags & RTF_GATEWAY:
+            continue
+        if best is None or metric < best[0]:
+            best = (metric, gateway)
+    if best is None:
+        return None
+    # The kernel prints the address in host byte order
+    return socket.inet_ntoa(struct.pack("=L", best[1]))
+
+
+def _source_address(gateway: str) -> Optional[ip_address]:
+    """
+    Ask the kernel which source address it would use to reach gateway.
+    Connecting a UDP socket only does a route lookup, nothing is sent.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect((gateway, 9))
+        return ip_address(sock.getsockname()[0])
+    except (OSError, ValueError):
+        return None
+    finally:
+        sock.close()
+
+
+def _get_local_ip_from_ip_route() -> Result:
+    """
+    Find the local address by running ip route.  This is the slow path used
+    when the routing table can't be read directly.
     """
     output = run_command("ip", ["route", "show", "0.0.0.0/0"],
                          False, False)
@@ -629,6 +1606,8 @@ def get_local_ip() -> Result:
         return Err("ip route show cmd failed: {}".format(output.value))
 
     default_route_stdout = output.value
+    if isinstance(default_route_stdout, bytes):
+        default_route_stdout = default_route_stdout.decode('utf-8')
 
     # default via 192.168.1.1 dev wlan0  proto static
     addr_regex = re.compile(r"(?P<addr>via \S+)")
@@ -639,13 +1618,15 @@ def get_local_ip() -> Result:
     addr_raw = default_route_parse.group("addr")
     addr = addr_raw.split(" ")[1]
 
-    src_address_output = run_command("ip", ["route", "get", addr[0]],
+    src_address_output = run_command("ip", ["route", "get", addr],
                                      False, False)
     if src_address_output.is_err():
         return Err(
             "ip route get cmd failed: {}".format(src_address_output.value))
     # 192.168.1.1 dev wlan0  src 192.168.1.7
     local_address_stdout = src_address_output.value
+    if isinstance(local_address_stdout, bytes):
+        local_address_stdout = local_address_stdout.decode('utf-8')
     src_regex = re.compile(r"(?P<src>src \S+)")
     capture_output = src_regex.search(local_address_stdout)
     if capture_output is None:
@@ -656,12 +1637,224 @@ def get_local_ip() -> Result:
     local_ip = local_address_src.split(" ")[1]
     ip_addr = ip_address(local_ip.strip())
 
-    return Ok(ip_addr)  # Resolves a str hostname into a ip address.
+    return Ok(ip_addr)
+
+
+def get_local_ip() -> Result:
+    """
+    Returns the local IPAddr address associated with this server.  The
+    source address of the default route is read from the kernel and cached
+    until the routing table changes.  ip route is only run if the kernel
+    tables can't be used.
+    # Failures
+    Returns a GlusterError representing any failure that may have happened
+    while trying to
+    query this information.
+    """
+    routes = _read_route_table()
+    with _local_ip_lock:
+        if routes is not None and routes == _local_ip_cache["routes"]:
+            return Ok(_local_ip_cache["ip"])
+
+    ip_addr = None
+    if routes is not None:
+        gateway = _default_gateway(routes)
+        if gateway is not None:
+            ip_addr = _source_address(gateway)
+    if ip_addr is None:
+        fallback = _get_local_ip_from_ip_route()
+        if fallback.is_err():
+            return fallback
+        ip_addr = fallback.value
+
+    if routes is not None:
+        with _local_ip_lock:
+            _local_ip_cache["routes"] = routes
+            _local_ip_cache["ip"] = ip_addr
+    return Ok(ip_addr)
+
+
+class ResolverStats(object):
+    def __init__(self):
+        """
+        Counters kept by a Resolver so callers can see how effective the
+        cache is.
+        hits: int.  Lookups answered from a positive cache entry
+        negative_hits: int.  Lookups answered from a cached failure
+        misses: int.  Lookups that had to go to the system resolver
+        lookup_time: float.  Total seconds spent in the system resolver
+        max_lookup_time: float.  Slowest single system resolver call
+        """
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.lookup_time = 0.0
+        self.max_lookup_time = 0.0
+
+    def hit_rate(self) -> float:
+        """
+        :return: float.  Fraction of lookups answered from the cache
+        """
+        total = self.hits + self.negative_hits + self.misses
+        if total == 0:
+            return 0.0
+        return (self.hits + self.negative_hits) / total
+
+    def average_lookup_time(self) -> float:
+        """
+        :return: float.  Mean seconds per system resolver call
+        """
+        if self.misses == 0:
+            return 0.0
+        return self.lookup_time / self.misses
+
+    def __str__(self):
+        return "hits: {} negative hits: {} misses: {} hit rate: {:.2%} " \
+               "avg lookup: {:.6f}s max lookup: {:.6f}s".format(
+                   self.hits, self.negative_hits, self.misses,
+                   self.hit_rate(), self.average_lookup_time(),
+                   self.max_lookup_time)
+
+
+class Resolver(object):
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0,
+                 negative_ttl: float = 30.0):
+        """
+        An in process hostname to ip address resolver with a bounded, TTL
+        expiring cache.  Failed lookups are cached for negative_ttl seconds so
+        an unresolvable brick host doesn't get retried for every brick.
+        :param max_entries: int.  Maximum number of hostnames to remember.
+          The least recently used entry is evicted first.
+        :param ttl: float.  Seconds a successful lookup is kept
+        :param negative_ttl: float.  Seconds a failed lookup is kept
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stats = ResolverStats()
+        # hostname -> (expiry time, Result)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, hostname: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(hostname)
+            if entry is None:
+                return None
+            expires, result = entry
+            if expires <= now:
+                del self._cache[hostname]
+                return None
+            self._cache.move_to_end(hostname)
+            if result.is_ok():
+                self.stats.hits += 1
+            else:
+                self.stats.negative_hits += 1
+            return result
+
+    def _store(self, hostname: str, result: Result):
+        if result.is_ok():
+            expires = time.monotonic() + self.ttl
+        else:
+            expires = time.monotonic() + self.negative_ttl
+        with self._lock:
+            self._cache[hostname] = (expires, result)
+            self._cache.move_to_end(hostname)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _lookup(self, hostname: str) -> Result:
+        start = time.monotonic()
+        try:
+            # Prefer an A record like dig +short does and fall back to
+            # whatever the system resolver has.
+            try:
+                addresses = socket.getaddrinfo(hostname, None,
+                                               socket.AF_INET)
+            except socket.gaierror:
+                addresses = socket.getaddrinfo(hostname, None)
+            result = Ok(ip_address(addresses[0][4][0]))
+        except (socket.gaierror, socket.herror, UnicodeError,
+                IndexError) as e:
+            result = Err("failed to resolve {}: {}".format(hostname, e))
+        except ValueError as e:
+            result = Err("failed to parse ip address: {}".format(e))
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self.stats.misses += 1
+            self.stats.lookup_time += elapsed
+            if elapsed > self.stats.max_lookup_time:
+                self.stats.max_lookup_time = elapsed
+        return result
+
+    def resolve(self, hostname: str) -> Result:
+        """
+        Resolve a hostname to an ip address, using the cache if possible
+        :param hostname: String.  Hostname to resolve
+        :return: Result.  Ok(ip_address) or Err(String)
+        """
+        hostname = hostname.strip()
+        result = self._cached(hostname)
+        if result is None:
+            result = self._lookup(hostname)
+            self._store(hostname, result)
+        return result
+
+    def resolve_many(self, hostnames: Iterable[str],
+                     max_workers: int = 8) -> Dict[str, Result]:
+        """
+        Resolve many hostnames at once.  Each distinct hostname that isn't
+        cached is looked up once, with at most max_workers lookups in flight.
+        :param hostnames: list.  Hostnames to resolve.  Duplicates are fine.
+        :param max_workers: int.  Maximum concurrent system resolver calls
+        :return: dict.  hostname -> Result
+        """
+        results = {}
+        pending = []
+        for hostname in hostnames:
+            hostname = hostname.strip()
+            if hostname in results or hostname in pending:
+                continue
+            cached = self._cached(hostname)
+            if cached is None:
+                pending.append(hostname)
+            else:
+                results[hostname] = cached
+        if len(pending) == 0:
+            return results
+        workers = max(1, min(max_workers, len(pending)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for hostname, result in zip(pending,
+                                        executor.map(self._lookup, pending)):
+                self._store(hostname, result)
+                results[hostname] = result
+        return results
+
+    def clear(self):
+        """
+        Forget every cached entry.  Stats are left alone.
+        """
+        with self._lock:
+            self._cache.clear()
+
+
+# Shared by resolve_to_ip and every module in this library
+_resolver = Resolver()
+
+
+def resolver_stats() -> ResolverStats:
+    """
+    :return: ResolverStats.  Cache counters of the resolver used by
+      resolve_to_ip
+    """
+    return _resolver.stats
 
 
 def resolve_to_ip(address: str) -> Result:
     """
-    Resolves an dns address to an ip address.  Relies on dig
+    Resolves an dns address to an ip address.  Lookups are done in process
+    and cached, see Resolver.
     :param address: String.  Hostname to resolve to an ip address
     :return: result
     """
@@ -675,18 +1868,26 @@ def resolve_to_ip(address: str) -> Result:
         except ValueError:
             return Err("failed to parse ip address: {}".format(local_ip.value))
 
-    arg_list = ["+short", address.strip()]
-    output = run_command("dig", arg_list, False, False)
+    return _resolver.resolve(address)
 
-    if output.is_err():
-        return Err("dig cmd failed with error:{}".format(output.value))
-    # Remove the trailing . and newline
-    trimmed = output.value.strip().rstrip(".")
-    try:
-        ip_addr = ip_address(trimmed)
-        return Ok(ip_addr)
-    except ValueError:
-        return Err("failed to parse ip address: {}".format(trimmed))
+
+def resolve_many_to_ip(addresses: Iterable[str],
+                       max_workers: int = 8) -> Dict[str, Result]:
+    """
+    Resolves many dns addresses at once with bounded concurrency
+    :param addresses: list.  Hostnames to resolve
+    :param max_workers: int.  Maximum concurrent lookups
+    :return: dict.  hostname -> Result
+    """
+    results = {}
+    others = []
+    for address in addresses:
+        if address == "localhost":
+            results[address] = resolve_to_ip(address)
+        else:
+            others.append(address)
+    results.update(_resolver.resolve_many(others, max_workers))
+    return results
 
 
 def get_local_hostname() -> str:
@@ -1,11 +1,14 @@
 from enum import Enum
 from ipaddress import ip_address
-from typing import Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from result import Ok, Err, Result
 import uuid
+from uuid import UUID
 import xml.etree.ElementTree as etree
 
-from gluster.lib import resolve_to_ip, run_command
+from gluster import store
+from gluster.lib import get_local_ip, intern_str, intern_uuid, \
+    resolve_many_to_ip, resolve_to_ip, run_command
 
 
 # A enum representing the possible States that a Peer can be in
@@ -61,22 +64,55 @@ class State(Enum):
             return None
 
 
+# glusterd's friend state machine states in the order they're numbered in
+# the state= field of the peer store.  These are the CLI's stateStr values.
+STORE_PEER_STATES = [
+    "Establishing Connection",
+    "Probe Sent to Peer",
+    "Probe Received from Peer",
+    "Peer in Cluster",
+    "Accepted peer request",
+    "Sent and Received peer request",
+    "Peer Rejected",
+    "Peer detach in progress",
+    "Probe Received from peer",
+    "Connected to Peer",
+    "Peer is connected and Accepted",
+    "Invalid State",
+]
+
+
 class Peer(object):
+    __slots__ = ("uuid", "hostname", "status", "hostnames")
+
     def __init__(self, uuid: uuid.UUID, hostname: ip_address,
-                 status: Optional[State]):
+                 status: Optional[State],
+                 hostnames: Optional[List[str]] = None):
         """
         A Gluster Peer.  A Peer is roughly equivalent to a server in Gluster.
         :param uuid: Unique identifier of this peer
         :param hostname: ip address of the peer
         :param status:  current State of the peer
+        :param hostnames: list.  Every name the peer is known by.  Defaults
+          to just hostname.
         """
-        self.uuid = uuid
-        self.hostname = hostname
+        if isinstance(uuid, UUID):
+            uuid = intern_uuid(uuid)
+        self.uuid = intern_str(uuid)
+        self.hostname = intern_str(hostname)
         self.status = status
+        if hostnames is None:
+            hostnames = [] if hostname is None else [str(hostname)]
+        self.hostnames = [intern_str(h) for h in hostnames]
 
     def __eq__(self, other):
+        if not isinstance(other, Peer):
+            return NotImplemented
         return self.uuid == other.uuid
 
+    def __hash__(self):
+        return hash(self.uuid)
+
     def __str__(self):
         return "UUID: {}  Hostname: {} Status: {}".format(
             self.uuid,
@@ -84,20 +120,158 @@ class Peer(object):
             self.status)
 
 
+class PeerRegistry(object):
+    def __init__(self, peers: Iterable[Peer] = (), resolve: bool = True):
+        """
+        An index of peers by UUID, by hostname and by every address they're
+        known by.  Lookups and membership tests are O(1).  Iterating gives
+        the peers and set operations between registries (or any iterable of
+        Peer) compare by UUID so membership can be diffed.
+        :param peers: list.  Peers to start with
+        :param resolve: bool.  Also index the addresses that non ip
+          hostnames resolve to
+        """
+        self.resolve = resolve
+        self._by_uuid = {}  # type: Dict[uuid.UUID, Peer]
+        self._by_name = {}  # type: Dict[str, Peer]
+        self._names = {}  # type: Dict[uuid.UUID, List[str]]
+        self.refresh(peers)
+
+    def _peer_names(self, peer: Peer,
+                    resolved: Dict[str, Result]) -> List[str]:
+        names = []
+        if peer.hostname is not None:
+            names.append(str(peer.hostname))
+        names.extend(str(h) for h in peer.hostnames)
+        for name in list(names):
+            result = resolved.get(name)
+            if result is not None and result.is_ok():
+                names.append(str(result.value))
+        return names
+
+    def _index(self, peer: Peer, names: List[str]):
+        self._by_uuid[peer.uuid] = peer
+        self._names[peer.uuid] = names
+        for name in names:
+            self._by_name[name] = peer
+
+    def _unindex(self, peer_uuid: uuid.UUID):
+        del self._by_uuid[peer_uuid]
+        for name in self._names.pop(peer_uuid):
+            if self._by_name.get(name) is not None and \
+                    self._by_name[name].uuid == peer_uuid:
+                del self._by_name[name]
+
+    def refresh(self, peers: Iterable[Peer]) -> Tuple[Set[Peer], Set[Peer]]:
+        """
+        Bring the registry up to date with a new peer listing.  Only the
+        peers that were added, removed or whose names changed are
+        re-indexed.  Peers that are still present are replaced by the new
+        objects.
+        :param peers: list.  The complete current list of Peer
+        :return: tuple.  The set of added Peers and the set of removed Peers
+        """
+        peers = list(peers)
+        current = {peer.uuid: peer for peer in peers}
+        removed = {peer for peer_uuid, peer in self._by_uuid.items()
+                   if peer_uuid not in current}
+        for peer in removed:
+            self._unindex(peer.uuid)
+
+        resolved = {}
+        if self.resolve:
+            unresolved = set()
+            for peer in peers:
+                for name in [peer.hostname] + list(peer.hostnames):
+                    if name is None or name == "localhost":
+                        continue
+                    try:
+                        ip_address(str(name))
+                    except ValueError:
+                        unresolved.add(str(name))
+            if unresolved:
+                resolved = resolve_many_to_ip(sorted(unresolved))
+
+        added = set()
+        for peer in peers:
+            names = self._peer_names(peer, resolved)
+            previous = self._by_uuid.get(peer.uuid)
+            if previous is None:
+                added.add(peer)
+            elif previous is peer and self._names[peer.uuid] == names:
+                continue
+            else:
+                self._unindex(peer.uuid)
+            self._index(peer, names)
+        return added, removed
+
+    def get(self, key) -> Optional[Peer]:
+        """
+        Find a peer
+        :param key: uuid.UUID, ip_address or String hostname or address
+        :return: Peer or None if it isn't known
+        """
+        if isinstance(key, uuid.UUID):
+            return self._by_uuid.get(key)
+        if key is None:
+            return None
+        return self._by_name.get(str(key))
+
+    def __contains__(self, key) -> bool:
+        if isinstance(key, Peer):
+            return key.uuid in self._by_uuid
+        return self.get(key) is not None
+
+    def __iter__(self) -> Iterator[Peer]:
+        return iter(list(self._by_uuid.values()))
+
+    def __len__(self) -> int:
+        return len(self._by_uuid)
+
+    def uuids(self) -> Set[uuid.UUID]:
+        return set(self._by_uuid)
+
+    def __sub__(self, other: Iterable[Peer]) -> Set[Peer]:
+        return set(self) - set(other)
+
+    def __and__(self, other: Iterable[Peer]) -> Set[Peer]:
+        return set(self) & set(other)
+
+    def __or__(self, other: Iterable[Peer]) -> Set[Peer]:
+        return set(self) | set(other)
+
+    def __xor__(self, other: Iterable[Peer]) -> Set[Peer]:
+        return set(self) ^ set(other)
+
+
+# Kept up to date by get_peer so repeated lookups only pay for the peers
+# that changed
+_registry = PeerRegistry()
+
+
+def peer_registry() -> Result:
+    """
+    The shared PeerRegistry refreshed from a new peer_list()
+    :return: Result.  PeerRegistry or Err
+    """
+    peers = peer_list()
+    if peers.is_err():
+        return Err(peers.value)
+    _registry.refresh(peers.value)
+    return Ok(_registry)
+
+
 def get_peer(hostname: ip_address) -> Optional[Peer]:
     """
     This will query the Gluster peer list and return a Peer class for the peer
-    :param hostname: String.  Name of the peer to get
+    :param hostname: String.  Name of the peer to get.  Any name or address
+      the peer is known by or its UUID will do.
     :return Peer or None in case of not found
     """
-    peers = peer_list()
-    if peers.is_err():
+    registry = peer_registry()
+    if registry.is_err():
         return None
-
-    for peer in peers.value:
-        if peer.hostname == hostname:
-            return peer
-    return None
+    return registry.value.get(hostname)
 
 
 def parse_peer_status(output_xml: str) -> Result:
@@ -125,6 +299,7 @@ def parse_peer_status(output_xml: str) -> Result:
     for status in peer_tree:
         peer_uuid = None
         hostname = None
+        hostnames = None
         state = None
         if status.tag == 'peer':
             for peer_info in status:
@@ -132,11 +307,15 @@ def parse_peer_status(output_xml: str) -> Result:
                     peer_uuid = uuid.UUID(peer_info.text)
                 elif peer_info.tag == 'hostname':
                     hostname = ip_address(peer_info.text)
+                elif peer_info.tag == 'hostnames':
+                    hostnames = [h.text for h in peer_info
+                                 if h.text is not None]
                 elif peer_info.tag == 'stateStr':
                     state = State.from_str(peer_info.text)
             peers.append(Peer(uuid=peer_uuid,
                               hostname=hostname,
-                              status=state))
+                              status=state,
+                              hostnames=hostnames))
 
     return Ok(peers)
 
@@ -156,16 +335,74 @@ def peer_status() -> Result:
     return parse_peer_status(output.value)
 
 
+def local_peer_uuid(
+        workdir: str = store.GLUSTERD_WORKDIR) -> Optional[uuid.UUID]:
+    """
+    The UUID glusterd identifies this node by, from glusterd.info
+    :param workdir: String.  glusterd's working directory
+    :return: uuid.UUID or None if this isn't a server node
+    """
+    info = store.read_glusterd_info(workdir)
+    if info is None or "UUID" not in info:
+        return None
+    try:
+        return uuid.UUID(info["UUID"])
+    except ValueError:
+        return None
+
+
+def peer_list_from_store(workdir: str = store.GLUSTERD_WORKDIR) -> Result:
+    """
+    List all peers including localhost from glusterd's peer store.  This
+    builds the same Peers that parse_peer_list does without running the CLI.
+    :param workdir: String.  glusterd's working directory
+    :return: Result.  List of Peers or Err if there is no usable store
+    """
+    local_uuid = local_peer_uuid(workdir)
+    if local_uuid is None:
+        return Err("No glusterd.info in {}".format(workdir))
+    peer_files = store.read_peers(workdir)
+    if peer_files is None:
+        return Err("No peer store in {}".format(workdir))
+
+    peers = []
+    for entries in peer_files:
+        try:
+            peer_uuid = uuid.UUID(entries["uuid"])
+            hostname = entries["hostname1"]
+            state_name = STORE_PEER_STATES[int(entries["state"])]
+        except (IndexError, KeyError, ValueError) as e:
+            return Err("Unable to parse peer store: {}".format(e))
+        hostnames = []
+        while "hostname{}".format(len(hostnames) + 1) in entries:
+            hostnames.append(entries["hostname{}".format(len(hostnames) + 1)])
+        peers.append(Peer(uuid=peer_uuid, hostname=hostname,
+                          status=State.from_str(state_name),
+                          hostnames=hostnames))
+
+    # The pool list reports this node as localhost and resolves that to
+    # the local ip address
+    local_ip = get_local_ip()
+    if local_ip.is_err():
+        return Err("Unable to resolve localhost to ip address")
+    peers.append(Peer(uuid=local_uuid, hostname=local_ip.value, status=None))
+    return Ok(peers)
+
+
 def peer_list() -> Result:
     """
     List all peers including localhost
-    Runs gluster pool list and returns a Vec<Peer> representing all the peers
+    Reads glusterd's peer store on a server node, otherwise runs gluster pool
+    list and returns a Vec<Peer> representing all the peers
     in the cluster
     This also returns information for the localhost as a Peer.  peer_status()
     does not
     # Failures
     Returns GlusterError if the command failed to run
     """
+    from_store = peer_list_from_store()
+    if from_store.is_ok():
+        return from_store
     arg_list = ["pool", "list", "--xml"]
     output = run_command("gluster", arg_list, True, False)
     if output.is_err():
@@ -193,6 +430,7 @@ def parse_peer_list(output_xml: str) -> Result:
     for status in peer_tree:
         peer_uuid = None
         hostname = None
+        hostnames = None
         state = None
         if status.tag == 'peer':
             for peer_info in status:
@@ -209,9 +447,13 @@ def parse_peer_list(output_xml: str) -> Result:
                                 "Unable to resolve localhost to ip address")
                     else:
                         hostname = peer_info.text
+                elif peer_info.tag == 'hostnames':
+                    hostnames = [h.text for h in peer_info
+                                 if h.text is not None]
                 elif peer_info.tag == 'stateStr':
                     state = State.from_str(peer_info.text)
-            peers.append(Peer(uuid=peer_uuid, hostname=hostname, status=state))
+            peers.append(Peer(uuid=peer_uuid, hostname=hostname, status=state,
+                              hostnames=hostnames))
 
     return Ok(peers)
 
@@ -223,13 +465,12 @@ def peer_probe(hostname: str) -> Result:
     :param hostname: String.  Add a host to the cluster
     :return:
     """
-    current_peers = peer_list()
-    if current_peers.is_err():
-        return Err(current_peers.value)
-    for peer in current_peers.value:
-        if peer.hostname is hostname:
-            # Bail instead of double probing
-            return Ok(0)  # Does it make sense to say this is ok?
+    registry = peer_registry()
+    if registry.is_err():
+        return Err(registry.value)
+    if hostname in registry.value:
+        # Bail instead of double probing
+        return Ok(0)  # Does it make sense to say this is ok?
 
     arg_list = ["peer", "probe", hostname]
     return run_command("gluster", arg_list, True, False)
@@ -0,0 +1,328 @@
+# How fast a heal is going and when it will be done.
+#
+# A HealSampler records the pending heal count of each local brick every time
+# sample() is called.  Each brick keeps its last samples in a fixed size ring
+# of typed arrays so a sampler can run for days in constant memory.  The heal
+# rate is smoothed with an exponentially weighted moving average so one slow
+# interval doesn't swing the ETA around.  Counts can come from a directory
+# scan (the default) or from a HealTracker that already keeps them current.
+#
+# Example:
+#   sampler = HealSampler(get_all_local_bricks().value)
+#   result = sampler.wait(timeout=3600, interval=10)
+#   if result.is_err():
+#       print(result.value)
+#   for brick_set in sampler.replica_sets(volume_info("test").value[0]):
+#       print(brick_set.count, brick_set.rate, brick_set.eta)
+
+from array import array
+from result import Err, Ok, Result
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from gluster.heal import count_bricks, HealCounts
+from gluster.volume import Brick, Volume
+
+
+class HealProgress(object):
+    __slots__ = ("count", "rate", "eta")
+
+    def __init__(self, count: int, rate: Optional[float],
+                 eta: Optional[float]):
+        """
+        :param count: int.  Pending heals at the last sample
+        :param rate: float.  Smoothed heals per second.  Negative if the
+          backlog is growing, None until there are two samples.
+        :param eta: float.  Seconds until the count reaches 0 at the current
+          rate.  0 if nothing is pending and None if it can't be estimated.
+        """
+        self.count = count
+        self.rate = rate
+        self.eta = eta
+
+    def __str__(self):
+        return "HealProgress count: {} rate: {} eta: {}".format(
+            self.count, self.rate, self.eta)
+
+    def __repr__(self):
+        return str(self)
+
+
+def _eta(count: int, rate: Optional[float]) -> Optional[float]:
+    if count == 0:
+        return 0.0
+    if rate is None or rate <= 0:
+        return None
+    return count / rate
+
+
+class HealSeries(object):
+    __slots__ = ("times", "counts", "start", "size", "rate", "smoothing")
+
+    def __init__(self, capacity: int = 120, smoothing: float = 0.3):
+        """
+        The last capacity samples of one brick's pending heal count
+        :param capacity: int.  Samples kept.  Older ones are overwritten.
+        :param smoothing: float.  Weight of the newest interval in the
+          smoothed rate, between 0 and 1.  Higher follows changes faster.
+        """
+        self.times = array("d", [0.0]) * capacity
+        self.counts = array("q", [0]) * capacity
+        self.start = 0
+        self.size = 0
+        self.rate = None  # type: Optional[float]
+        self.smoothing = smoothing
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[Tuple[float, int]]:
+        """
+        :return: Iterator of (time, count), oldest first
+        """
+        capacity = len(self.times)
+        for offset in range(self.size):
+            index = (self.start + offset) % capacity
+            yield self.times[index], self.counts[index]
+
+    def last(self) -> Optional[Tuple[float, int]]:
+        """
+        :return: tuple.  The newest (time, count) or None if empty
+        """
+        if self.size == 0:
+            return None
+        index = (self.start + self.size - 1) % len(self.times)
+        return self.times[index], self.counts[index]
+
+    def first(self) -> Optional[Tuple[float, int]]:
+        """
+        :return: tuple.  The oldest (time, count) kept or None if empty
+        """
+        if self.size == 0:
+            return None
+        return self.times[self.start], self.counts[self.start]
+
+    def add(self, when: float, count: int):
+        """
+        Record a sample and update the smoothed rate
+        :param when: float.  time.monotonic() of the sample
+        :param count: int.  Pending heals
+        """
+        last = self.last()
+        if last is not None and when > last[0]:
+            rate = (last[1] - count) / (when - last[0])
+            if self.rate is None:
+                self.rate = rate
+            else:
+                self.rate = self.smoothing * rate + \
+                    (1 - self.smoothing) * self.rate
+        capacity = len(self.times)
+        index = (self.start + self.size) % capacity
+        self.times[index] = when
+        self.counts[index] = count
+        if self.size == capacity:
+            self.start = (self.start + 1) % capacity
+        else:
+            self.size += 1
+
+    def window_rate(self) -> Optional[float]:
+        """
+        The average rate from the oldest to the newest sample kept.  Steadier
+        than the smoothed rate but slower to notice changes.
+        :return: float.  Heals per second or None with fewer than 2 samples
+        """
+        first = self.first()
+        last = self.last()
+        if first is None or last[0] <= first[0]:
+            return None
+        return (first[1] - last[1]) / (last[0] - first[0])
+
+    def progress(self) -> Optional[HealProgress]:
+        """
+        :return: HealProgress or None if there are no samples
+        """
+        last = self.last()
+        if last is None:
+            return None
+        return HealProgress(count=last[1], rate=self.rate,
+                            eta=_eta(last[1], self.rate))
+
+
+def combine(progress: List[HealProgress]) -> HealProgress:
+    """
+    The progress of bricks healing at the same time, such as a replica set.
+    Counts and rates add up and the ETA is that of the slowest brick.
+    :param progress: list of HealProgress
+    :return: HealProgress
+    """
+    count = sum(p.count for p in progress)
+    rates = [p.rate for p in progress if p.rate is not None]
+    rate = sum(rates) if rates else None
+    eta = 0.0
+    for p in progress:
+        if p.eta is None:
+            eta = None
+            break
+        eta = max(eta, p.eta)
+    return HealProgress(count=count, rate=rate, eta=eta)
+
+
+def replica_sets(volume: Volume) -> List[List[Brick]]:
+    """
+    Split a volume's bricks into its replica sets.  gluster groups bricks by
+    the order they were given in, replica_count at a time.
+    :param volume: Volume
+    :return: list.  One list of Brick per replica set
+    """
+    # Parsed volumes hold the count as a string
+    size = int(volume.replica_count or 1)
+    return [volume.bricks[i:i + size]
+            for i in range(0, len(volume.bricks), size)]
+
+
+class HealSampler(object):
+    def __init__(self, bricks: Dict[str, List[Brick]],
+                 source: Optional[Callable[[], HealCounts]] = None,
+                 capacity: int = 120, smoothing: float = 0.3):
+        """
+        Keeps a time series of the pending heal count of each brick
+        :param bricks: dict.  Volume name -> list of local Brick, as returned
+          by get_all_local_bricks
+        :param source: Function returning the current HealCounts, for
+          example HealTracker.counts.  Defaults to scanning the bricks with
+          count_bricks.
+        :param capacity: int.  Samples kept per brick
+        :param smoothing: float.  See HealSeries
+        """
+        self.bricks = bricks
+        self.source = source
+        self.capacity = capacity
+        self.smoothing = smoothing
+        # (volume, brick path) -> HealSeries
+        self.series = {}  # type: Dict[tuple, HealSeries]
+        # The (volume, brick path) counted by the last sample and the
+        # bricks it couldn't count, as in HealCounts.errors
+        self.counted = set()  # type: set
+        self.errors = {}  # type: Dict[str, Dict[str, str]]
+
+    def sample(self) -> HealCounts:
+        """
+        Count the pending heals and record them
+        :return: HealCounts.  The counts just recorded.  Bricks that couldn't
+          be read are in its errors and get no sample.
+        """
+        if self.source is None:
+            counts = count_bricks(self.bricks)
+        else:
+            counts = self.source()
+        now = time.monotonic()
+        self.counted = set()
+        for name, paths in counts.bricks.items():
+            for path, count in paths.items():
+                series = self.series.get((name, path))
+                if series is None:
+                    series = HealSeries(self.capacity, self.smoothing)
+                    self.series[(name, path)] = series
+                series.add(now, count)
+                self.counted.add((name, path))
+        self.errors = counts.errors
+        return counts
+
+    def _current(self, key: tuple) -> Optional[HealProgress]:
+        # Bricks that couldn't be counted in the last sample are left out
+        # rather than reported with a stale count
+        if key not in self.counted:
+            return None
+        return self.series[key].progress()
+
+    def brick(self, volume: str, brick: Brick) -> Optional[HealProgress]:
+        """
+        :param volume: String.  Volume name
+        :param brick: Brick.
+        :return: HealProgress or None if the brick wasn't counted in the
+          last sample
+        """
+        return self._current((volume, brick.path))
+
+    def volume(self, volume: str) -> Optional[HealProgress]:
+        """
+        :param volume: String.  Volume name
+        :return: HealProgress of the volume's local bricks counted in the
+          last sample together or None if there are none
+        """
+        progress = [self._current(key) for key in self.series
+                    if key[0] == volume]
+        progress = [p for p in progress if p is not None]
+        if not progress:
+            return None
+        return combine(progress)
+
+    def replica_sets(self, volume: Volume) -> List[Optional[HealProgress]]:
+        """
+        Progress of each replica set of a volume.  Only the set's local
+        bricks are counted so run a sampler on every node in the set for
+        the whole picture.
+        :param volume: Volume.  From volume_info, for its brick order and
+          replica count
+        :return: list.  HealProgress per replica set in order, None for sets
+          without a sampled local brick
+        """
+        local = {(b.uuid, b.path) for b in self.bricks.get(volume.name, [])}
+        sets = []
+        for brick_set in replica_sets(volume):
+            progress = [self.brick(volume.name, b) for b in brick_set
+                        if (b.uuid, b.path) in local]
+            progress = [p for p in progress if p is not None]
+            sets.append(combine(progress) if progress else None)
+        return sets
+
+    def total(self) -> Optional[HealProgress]:
+        """
+        :return: HealProgress of every brick counted in the last sample
+          together or None if there are none
+        """
+        progress = [self._current(key) for key in self.series]
+        progress = [p for p in progress if p is not None]
+        if not progress:
+            return None
+        return combine(progress)
+
+    def wait(self, timeout: float, interval: float = 10.0,
+             volume: Optional[str] = None,
+             give_up_early: bool = False) -> Result:
+        """
+        Sample until nothing is pending or the deadline passes
+        :param timeout: float.  Seconds to wait at most
+        :param interval: float.  Seconds between samples
+        :param volume: String.  Only wait for this volume's bricks
+        :param give_up_early: bool.  Fail as soon as the ETA is past the
+          deadline instead of waiting for it
+        :return: Result.  Ok(HealProgress) once every brick was counted and
+          the count is 0 or Err(String) with the last progress if the
+          deadline passed or would be missed.  Waiting goes on while any
+          brick can't be counted or there is nothing to count.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            self.sample()
+            if volume is None:
+                progress = self.total()
+                errors = self.errors
+            else:
+                progress = self.volume(volume)
+                errors = {volume: self.errors[volume]} \
+                    if volume in self.errors else {}
+            # A brick that can't be counted might still have pending heals
+            done = progress is not None and progress.count == 0 and \
+                not errors
+            if done:
+                return Ok(progress)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return Err("Heal not done after {} seconds: {} errors: "
+                           "{}".format(timeout, progress, errors))
+            if give_up_early and progress is not None and \
+                    progress.eta is not None and progress.eta > remaining:
+                return Err("Heal won't be done within {} seconds: {}".format(
+                    timeout, progress))
+            time.sleep(min(interval, remaining))
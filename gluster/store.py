@@ -0,0 +1,182 @@
+# Helpers to read glusterd's own on-disk store.
+#
+# On a server node glusterd keeps its configuration in simple key=value
+# files under /var/lib/glusterd.  Reading them directly is much cheaper than
+# asking the CLI and doesn't need root for most of them.
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Where glusterd keeps its store
+GLUSTERD_WORKDIR = "/var/lib/glusterd"
+
+
+def volume_version(volume: str,
+                   workdir: str = GLUSTERD_WORKDIR) -> Optional[str]:
+    """
+    glusterd bumps the version= field of a volume's info file every time the
+    volume's configuration changes.
+    :param volume: String.  Name of the volume
+    :param workdir: String.  glusterd's working directory
+    :return: String.  The version or None if the volume isn't in the store
+    """
+    try:
+        with open(os.path.join(workdir, "vols", volume, "info")) as f:
+            for line in f:
+                if line.startswith("version="):
+                    return line[len("version="):].strip()
+    except (IOError, OSError, UnicodeDecodeError):
+        return None
+    return None
+
+
+def _mtimes(directory: str) -> Optional[List[Tuple[str, int, int]]]:
+    try:
+        names = sorted(os.listdir(directory))
+    except (IOError, OSError):
+        return None
+    mtimes = []
+    for name in names:
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except (IOError, OSError):
+            continue
+        mtimes.append((name, st.st_mtime_ns, st.st_size))
+    return mtimes
+
+
+def peers_marker(workdir: str = GLUSTERD_WORKDIR) -> Optional[List]:
+    """
+    A cheap fingerprint of the peer store.  glusterd rewrites a peer's file
+    whenever its state or addresses change, so the names, sizes and mtimes
+    of the files change with the peer list.
+    :param workdir: String.  glusterd's working directory
+    :return: list.  Comparable fingerprint or None if there is no store
+    """
+    mtimes = _mtimes(os.path.join(workdir, "peers"))
+    if mtimes is None:
+        return None
+    try:
+        st = os.stat(os.path.join(workdir, "glusterd.info"))
+    except (IOError, OSError):
+        return None
+    return [[st.st_mtime_ns, st.st_size]] + [list(m) for m in mtimes]
+
+
+def read_store_file(path: str) -> Optional[Dict[str, str]]:
+    """
+    Parse one of glusterd's key=value store files
+    :param path: String.  Path of the file
+    :return: dict.  Keys and values in file order or None if the file can't
+      be read
+    """
+    entries = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, sep, value = line.rstrip("\n").partition("=")
+                if sep:
+                    entries[key] = value
+    except (IOError, OSError, UnicodeDecodeError):
+        return None
+    return entries
+
+
+def volume_names(workdir: str = GLUSTERD_WORKDIR) -> Optional[List[str]]:
+    """
+    The volumes glusterd has in its store
+    :param workdir: String.  glusterd's working directory
+    :return: list.  Sorted volume names or None if there is no store
+    """
+    vols_dir = os.path.join(workdir, "vols")
+    try:
+        names = os.listdir(vols_dir)
+    except (IOError, OSError):
+        return None
+    return sorted(name for name in names
+                  if os.path.isfile(os.path.join(vols_dir, name, "info")))
+
+
+def read_glusterd_info(workdir: str = GLUSTERD_WORKDIR) -> Optional[Dict]:
+    """
+    Read glusterd.info which holds this node's UUID and operating version
+    :param workdir: String.  glusterd's working directory
+    :return: dict.  The file's keys and values or None
+    """
+    return read_store_file(os.path.join(workdir, "glusterd.info"))
+
+
+def read_peers(workdir: str = GLUSTERD_WORKDIR) -> Optional[List[Dict]]:
+    """
+    Read every file in the peer store.  There is one per remote peer with
+    uuid=, state= and hostname1= to hostnameN= keys.  This node isn't in it.
+    :param workdir: String.  glusterd's working directory
+    :return: list.  One dict per peer sorted by file name or None if there is
+      no peer store
+    """
+    peers_dir = os.path.join(workdir, "peers")
+    try:
+        names = sorted(os.listdir(peers_dir))
+    except (IOError, OSError):
+        return None
+    peers = []
+    for name in names:
+        entries = read_store_file(os.path.join(peers_dir, name))
+        if entries is None:
+            return None
+        peers.append(entries)
+    return peers
+
+
+def read_volume_info(volume: str,
+                     workdir: str = GLUSTERD_WORKDIR) -> Optional[Dict]:
+    """
+    Read a volume's info file
+    :param volume: String.  Name of the volume
+    :param workdir: String.  glusterd's working directory
+    :return: dict.  The info file's keys and values or None
+    """
+    return read_store_file(os.path.join(workdir, "vols", volume, "info"))
+
+
+def read_brick_info(volume: str, brick: str,
+                    workdir: str = GLUSTERD_WORKDIR) -> Optional[Dict]:
+    """
+    Read the store file of one brick of a volume
+    :param volume: String.  Name of the volume
+    :param brick: String.  The brick-N value from the volume's info file,
+      for example 172.31.12.7:-mnt-xvdb
+    :param workdir: String.  glusterd's working directory
+    :return: dict.  The brick file's keys and values or None
+    """
+    return read_store_file(
+        os.path.join(workdir, "vols", volume, "bricks", brick))
+
+
+def volume_snapshots(volume: str,
+                     workdir: str = GLUSTERD_WORKDIR) -> List[str]:
+    """
+    Names of the snapshots taken of a volume.  Each snapshot keeps a copy of
+    the volume's info file with a parent_volname= field.
+    :param volume: String.  Name of the volume
+    :param workdir: String.  glusterd's working directory
+    :return: list.  Sorted snapshot names
+    """
+    snaps_dir = os.path.join(workdir, "snaps")
+    try:
+        snap_names = sorted(os.listdir(snaps_dir))
+    except (IOError, OSError):
+        return []
+    snapshots = []
+    for snap_name in snap_names:
+        try:
+            entries = os.listdir(os.path.join(snaps_dir, snap_name))
+        except (IOError, OSError):
+            continue
+        for entry in entries:
+            info = read_store_file(
+                os.path.join(snaps_dir, snap_name, entry, "info"))
+            if info is not None and info.get("parent_volname") == volume:
+                snapshots.append(snap_name)
+                break
+    return snapshots
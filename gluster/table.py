@@ -0,0 +1,267 @@
+# A columnar view of the bricks of one or more volumes.
+#
+# Questions like "which bricks are offline" or "how many bricks does each
+# peer have" are answered with one pass over a typed array column instead of
+# walking thousands of BrickStatus objects.  If NumPy is installed the
+# columns can be used as NumPy arrays without copying and the filters use
+# it.
+#
+# Example:
+#   table = volume_status_table("test").value
+#   for row in table.offline():
+#       print(table.hostname(row), table.paths[row])
+
+from array import array
+from typing import Dict, List, Optional
+import uuid
+
+from gluster.lib import intern_str
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Value stored for a port, pid or flag that isn't known
+UNKNOWN = -1
+
+# Column name -> array typecode
+COLUMNS = {
+    "volume": "i",
+    "host": "i",
+    "port": "i",
+    "rdma_port": "i",
+    "pid": "q",
+    "online": "b",
+    "arbiter": "b",
+}
+
+
+def _flag(value: Optional[bool]) -> int:
+    if value is None:
+        return UNKNOWN
+    return 1 if value else 0
+
+
+def _number(value: Optional[int]) -> int:
+    if value is None:
+        return UNKNOWN
+    return value
+
+
+class BrickTable(object):
+    def __init__(self):
+        """
+        One row per brick (or per daemon for volume status) with a typed
+        array per column.  Hosts and volumes are stored once and the rows
+        refer to them by index.
+        Columns: volume, host, port, rdma_port, pid, online and arbiter.
+        Anything not known, for example the ports of a table built from
+        volume info or the arbiter flag of one built from volume status, is
+        UNKNOWN.
+        """
+        self.columns = {name: array(code) for name, code in COLUMNS.items()}
+        self.paths = []  # type: List[str]
+        self.volumes = []  # type: List[str]
+        self.hostnames = []  # type: List[str]
+        self.host_uuids = []  # type: List[Optional[uuid.UUID]]
+        self._volume_index = {}  # type: Dict[str, int]
+        self._host_index = {}  # type: Dict[tuple, int]
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def _volume(self, name: Optional[str]) -> int:
+        index = self._volume_index.get(name)
+        if index is None:
+            index = len(self.volumes)
+            self.volumes.append(intern_str(name))
+            self._volume_index[name] = index
+        return index
+
+    def _host(self, hostname, host_uuid) -> int:
+        key = (host_uuid, str(hostname))
+        index = self._host_index.get(key)
+        if index is None:
+            index = len(self.hostnames)
+            self.hostnames.append(intern_str(str(hostname)))
+            self.host_uuids.append(host_uuid)
+            self._host_index[key] = index
+        return index
+
+    def append(self, volume: Optional[str], hostname, host_uuid, path: str,
+               port: Optional[int] = None, rdma_port: Optional[int] = None,
+               pid: Optional[int] = None, online: Optional[bool] = None,
+               is_arbiter: Optional[bool] = None):
+        """
+        Add a row
+        :param volume: String.  Volume the brick belongs to
+        :param hostname: String or ip_address of the brick's host
+        :param host_uuid: uuid.UUID of the brick's host
+        :param path: String.  The brick's path
+        :param port: int.  tcp port or None
+        :param rdma_port: int.  rdma port or None
+        :param pid: int.  Process id or None
+        :param online: bool or None if not known
+        :param is_arbiter: bool or None if not known
+        """
+        columns = self.columns
+        columns["volume"].append(self._volume(volume))
+        columns["host"].append(self._host(hostname, host_uuid))
+        columns["port"].append(_number(port))
+        columns["rdma_port"].append(_number(rdma_port))
+        columns["pid"].append(_number(pid))
+        columns["online"].append(_flag(online))
+        columns["arbiter"].append(_flag(is_arbiter))
+        self.paths.append(path)
+
+    @staticmethod
+    def from_bricks(bricks, volume: Optional[str] = None) -> 'BrickTable':
+        """
+        Build a table from Brick objects, as in Volume.bricks
+        :param bricks: list of Brick
+        :param volume: String.  Name of the volume they belong to
+        :return: BrickTable
+        """
+        table = BrickTable()
+        for brick in bricks:
+            hostname = None if brick.peer is None else brick.peer.hostname
+            table.append(volume, hostname, brick.uuid, brick.path,
+                         is_arbiter=brick.is_arbiter)
+        return table
+
+    @staticmethod
+    def from_brick_status(statuses,
+                          volume: Optional[str] = None) -> 'BrickTable':
+        """
+        Build a table from BrickStatus objects
+        :param statuses: list of BrickStatus
+        :param volume: String.  Name of the volume they belong to
+        :return: BrickTable
+        """
+        table = BrickTable()
+        for status in statuses:
+            brick = status.brick
+            hostname = None if brick.peer is None else brick.peer.hostname
+            table.append(volume, hostname, brick.uuid, brick.path,
+                         port=status.tcp_port, rdma_port=status.rdma_port,
+                         pid=status.pid, online=status.online)
+        return table
+
+    def column(self, name: str):
+        """
+        A column as NumPy array sharing memory with the table if NumPy is
+        installed, otherwise the array.array itself.  Don't append rows
+        while holding a NumPy view.
+        :param name: String.  One of COLUMNS
+        """
+        column = self.columns[name]
+        if numpy is None:
+            return column
+        return numpy.frombuffer(column, dtype=column.typecode)
+
+    def select(self, **conditions) -> List[int]:
+        """
+        Rows where every named column equals the value given, for example
+        select(online=0, volume=table.volume_index("test"))
+        :return: list.  Row numbers in order
+        """
+        if numpy is not None:
+            mask = numpy.ones(len(self), dtype=bool)
+            for name, value in conditions.items():
+                mask &= self.column(name) == value
+            return numpy.flatnonzero(mask).tolist()
+        rows = range(len(self))
+        for name, value in conditions.items():
+            column = self.columns[name]
+            rows = [row for row in rows if column[row] == value]
+        return list(rows)
+
+    def offline(self) -> List[int]:
+        """
+        Rows whose process isn't running
+        :return: list.  Row numbers
+        """
+        return self.select(online=0)
+
+    def host_indexes(self, key) -> List[int]:
+        """
+        Find a host by UUID, hostname or address.  vol status lists a
+        host's daemons under names like "NFS Server" so one UUID can have
+        several entries.
+        :param key: uuid.UUID, String or ip_address
+        :return: list.  Indexes into hostnames
+        """
+        if isinstance(key, uuid.UUID):
+            return [index for index, host_uuid in enumerate(self.host_uuids)
+                    if host_uuid == key]
+        key = str(key)
+        return [index for index, hostname in enumerate(self.hostnames)
+                if hostname == key]
+
+    def volume_index(self, name: str) -> Optional[int]:
+        return self._volume_index.get(name)
+
+    def host_rows(self, key) -> List[int]:
+        """
+        Rows on a host
+        :param key: uuid.UUID, String or ip_address of the host
+        :return: list.  Row numbers in order
+        """
+        indexes = self.host_indexes(key)
+        if len(indexes) == 1:
+            return self.select(host=indexes[0])
+        rows = []
+        for index in indexes:
+            rows.extend(self.select(host=index))
+        return sorted(rows)
+
+    def hostname(self, row: int) -> str:
+        return self.hostnames[self.columns["host"][row]]
+
+    def group_by_host(self, rows: Optional[List[int]] = None) -> Dict[
+            str, List[int]]:
+        """
+        Rows grouped by the hostname they're on
+        :param rows: list.  Only group these rows.  Defaults to every row.
+        :return: dict.  hostname -> row numbers
+        """
+        if rows is None:
+            rows = range(len(self))
+        hosts = self.columns["host"]
+        groups = {}
+        for row in rows:
+            groups.setdefault(self.hostnames[hosts[row]], []).append(row)
+        return groups
+
+    def bricks_per_host(self) -> Dict[str, int]:
+        """
+        :return: dict.  hostname -> number of rows on it
+        """
+        hosts = self.columns["host"]
+        if numpy is not None:
+            counts = numpy.bincount(self.column("host"),
+                                    minlength=len(self.hostnames)).tolist()
+        else:
+            counts = [0] * len(self.hostnames)
+            for host in hosts:
+                counts[host] += 1
+        per_host = {}
+        for index, count in enumerate(counts):
+            if count:
+                hostname = self.hostnames[index]
+                per_host[hostname] = per_host.get(hostname, 0) + count
+        return per_host
+
+    def ports_by_host(self) -> Dict[str, List[int]]:
+        """
+        The tcp ports in use on each host
+        :return: dict.  hostname -> sorted list of ports
+        """
+        ports = self.columns["port"]
+        by_host = {}
+        for hostname, rows in self.group_by_host().items():
+            in_use = {ports[row] for row in rows if ports[row] != UNKNOWN}
+            if in_use:
+                by_host[hostname] = sorted(in_use)
+        return by_host
@@ -1,18 +1,29 @@
 from enum import Enum
 from ipaddress import ip_address
+import re
 from result import Err, Ok, Result
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional
 import uuid
+from uuid import UUID
 import xml.etree.ElementTree as etree
 
-from gluster.peer import get_peer
-from gluster.peer import Peer
+from gluster import store
+from gluster.peer import local_peer_uuid, Peer, peer_list, PeerRegistry
+from gluster.table import BrickTable
 from gluster.lib import BitrotOption, get_local_ip, GlusterError, \
-    GlusterOption, resolve_to_ip, run_command
+    GlusterOption, command_stream, intern_str, intern_uuid, iter_cli_xml, \
+    resolve_to_ip, run_command, translate_to_bytes
+
+# Where the records are in the --xml output of the volume commands
+VOLUME_INFO_PATH = "cliOutput/volInfo/volumes/volume"
+VOLUME_STATUS_PATH = "cliOutput/volStatus/volumes/volume"
+QUOTA_LIMIT_PATH = "cliOutput/volQuota/limit"
 
 
 # A Gluster Brick consists of a Peer and a path to the mount point
 class Brick(object):
+    __slots__ = ("uuid", "peer", "path", "is_arbiter")
+
     def __init__(self, uuid: uuid.UUID, peer: Peer, path, is_arbiter: bool):
         """
         A Gluster brick
@@ -22,8 +33,12 @@ class Brick(object):
         :param path: String.  The filesystem path the brick is located at
         :param is_arbiter:  bool.  Whether this brick is an arbiter or not
         """
-        self.uuid = uuid
+        if isinstance(uuid, UUID):
+            uuid = intern_uuid(uuid)
+        self.uuid = intern_str(uuid)
         self.peer = peer
+        # Paths are unique per brick so interning them only grows the
+        # interpreter's intern table
         self.path = path
         self.is_arbiter = is_arbiter
 
@@ -33,6 +48,9 @@ class Brick(object):
 
 
 class Quota(object):
+    __slots__ = ("path", "hard_limit", "soft_limit", "soft_limit_percentage",
+                 "used", "avail", "soft_limit_exceeded", "hard_limit_exceeded")
+
     def __init__(self, path: str, hard_limit: int, soft_limit: int,
                  soft_limit_percentage: str,
                  used: int, avail: int, soft_limit_exceeded: bool,
@@ -90,21 +108,64 @@ class Quota(object):
                          hard_exceeded=self.hard_limit_exceeded)
 
 
+class BrickDetail(object):
+    __slots__ = ("size_total", "size_free", "inodes_total", "inodes_free",
+                 "device", "block_size", "mount_options", "fs_name")
+
+    def __init__(self, size_total: Optional[int], size_free: Optional[int],
+                 inodes_total: Optional[int], inodes_free: Optional[int],
+                 device: Optional[str], block_size: Optional[int],
+                 mount_options: Optional[str], fs_name: Optional[str]):
+        """
+        The filesystem a brick is on as reported by vol status detail
+        size_total: int.  Size of the filesystem in bytes
+        size_free: int.  Bytes free
+        inodes_total: int.  Number of inodes
+        inodes_free: int.  Inodes free
+        device: String.  The block device
+        block_size: int.  Filesystem block size
+        mount_options: String.  Options the filesystem is mounted with
+        fs_name: String.  Filesystem type such as xfs
+        """
+        self.size_total = size_total
+        self.size_free = size_free
+        self.inodes_total = inodes_total
+        self.inodes_free = inodes_free
+        self.device = device
+        self.block_size = block_size
+        self.mount_options = intern_str(mount_options)
+        self.fs_name = intern_str(fs_name)
+
+    def __str__(self):
+        return "BrickDetail device: {} fs: {} size: {} free: {} " \
+               "inodes: {} inodes free: {}".format(self.device, self.fs_name,
+                                                   self.size_total,
+                                                   self.size_free,
+                                                   self.inodes_total,
+                                                   self.inodes_free)
+
+
 class BrickStatus(object):
+    __slots__ = ("brick", "tcp_port", "rdma_port", "online", "pid",
+                 "detail")
+
     def __init__(self, brick: Brick, tcp_port: int, rdma_port: int,
-                 online: bool, pid: int):
+                 online: bool, pid: int,
+                 detail: Optional[BrickDetail] = None):
         """
         brick: Brick,
         tcp_port: u16.  The tcp port
         rdma_port: u16. The rdma port
         online: bool. Whether the Brick is online or not
         pid: u16.  The process id of the Brick
+        detail: BrickDetail.  Only set by vol status detail
         """
         self.brick = brick
         self.tcp_port = tcp_port
         self.rdma_port = rdma_port
         self.online = online
         self.pid = pid
+        self.detail = detail
 
     def __eq__(self, other):
         return self.brick.peer == other.brick.peer
@@ -226,6 +287,10 @@ class Volume(object):
     A volume is a logical collection of bricks. Most of the gluster management
     operations happen on the volume.
     """
+    __slots__ = ("name", "vol_type", "vol_id", "status", "snapshot_count",
+                 "dist_count", "stripe_count", "replica_count",
+                 "arbiter_count", "disperse_count", "redundancy_count",
+                 "transport", "bricks", "options")
 
     def __init__(self, name: str, vol_type: VolumeType, vol_id: uuid.UUID,
                  status: str,
@@ -245,9 +310,11 @@ class Volume(object):
         :param bricks: list.  List of Brick
         :param options: dict.  String:String mapping of volume options
         """
-        self.name = name
+        self.name = intern_str(name)
         self.vol_type = vol_type
-        self.vol_id = vol_id
+        if isinstance(vol_id, UUID):
+            vol_id = intern_uuid(vol_id)
+        self.vol_id = intern_str(vol_id)
         self.status = status
         self.snapshot_count = snapshot_count
         self.dist_count = dist_count
@@ -258,7 +325,7 @@ class Volume(object):
         self.redundancy_count = redundancy_count
         self.transport = transport
         self.bricks = bricks
-        self.options = options
+        self.options = {intern_str(k): v for k, v in options.items()}
 
     def __str__(self):
         return "name:{name} type:{type} id:{id} status:{status} " \
@@ -283,12 +350,16 @@ class Volume(object):
 
 def volume_list() -> Result:
     """
-    # Lists all available volume names.
+    # Lists all available volume names.  Read from glusterd's store on a
+    # server node, otherwise from the CLI.
     # # Failures
     # Will return None if the Volume list command failed or if volume could not
     # be transformed
     # into a String from utf8
     """
+    from_store = volume_list_from_store()
+    if from_store.is_ok():
+        return from_store
     arg_list = ["volume", "list", "--xml"]
     output = run_command("gluster", arg_list, True, False)
     if output.is_err():
@@ -319,132 +390,353 @@ def parse_volume_list(volume_xml: str) -> Result:
     return Ok(volume_list)
 
 
-def parse_volume_info(volume_xml: str) -> Result:
+def _share_paths(bricks: Iterable[Brick]):
+    # Bricks on different hosts often have the same path.  Give them one
+    # string for the duration of a parse instead of interning every path,
+    # which would grow the interpreter's intern table with unique ones.
+    paths = {}
+    for brick in bricks:
+        brick.path = paths.setdefault(brick.path, brick.path)
+
+
+def parse_volume_info(volume_xml: str,
+                      peers: Optional[List[Peer]] = None) -> Result:
     """
     # Variables we will return in a class
     :param volume_xml: The output of the cli command with --xml flag
+    :param peers: list.  Optional list of Peer to resolve bricks against.  If
+      None the peer list is queried once, the first time a brick is seen.
     :return list of Volume objects
     """
-    tree = etree.fromstring(volume_xml)
-
-    return_code = 0
-    err_string = ""
-
-    for child in tree:
-        if child.tag == 'opRet':
-            return_code = int(child.text)
-        elif child.tag == 'opErrstr':
-            err_string = child.text
-
-    if return_code != 0:
-        return Err(err_string)
-
-    volume_info_list = []
-    volumes = tree.findall('./volInfo/volumes/volume')
-
-    name = None
-    vol_type = None
-    vol_id = None
-    status = None
-    snapshot_count = None
-    dist_count = None
-    stripe_count = None
-    replica_count = None
-    arbiter_count = None
-    disperse_count = None
-    redundancy_count = None
-    transport = None
+    try:
+        volumes = list(stream_volume_info(volume_xml, peers=peers))
+    except GlusterError as e:
+        return Err(str(e))
+    _share_paths(brick for vol in volumes for brick in vol.bricks)
+    return Ok(volumes)
+
+
+def stream_volume_info(source, peers: Optional[List[Peer]] = None) -> \
+        Iterator[Volume]:
+    """
+    Incrementally parse volume info --xml output.  Each Volume is yielded as
+    soon as its closing tag is read and the XML behind it is thrown away so
+    only one volume's worth of elements is held at a time.
+    :param source: bytes, String or a file like object such as the stdout
+      pipe of the gluster command
+    :param peers: list.  Optional list of Peer to resolve bricks against.  If
+      None the peer list is queried once, the first time a brick is seen.
+    :return: Iterator of Volume
+    :raise GlusterError: if the command failed or the output can't be parsed
+    """
+    for record in _stream_volume_info_records(source, peers):
+        if isinstance(record, Volume):
+            yield record
+
+
+def stream_bricks(source, peers: Optional[List[Peer]] = None) -> \
+        Iterator[Brick]:
+    """
+    Incrementally parse volume info --xml output yielding each Brick as soon
+    as it has been read
+    :param source: bytes, String or a file like object such as the stdout
+      pipe of the gluster command
+    :param peers: list.  Optional list of Peer to resolve bricks against
+    :return: Iterator of Brick
+    :raise GlusterError: if the command failed or the output can't be parsed
+    """
+    for record in _stream_volume_info_records(source, peers):
+        if isinstance(record, Brick):
+            yield record
+
+
+def _stream_volume_info_records(source, peers: Optional[List[Peer]]):
+    # Yields every Brick as it's parsed and each Volume when it's complete
+    brick_path = VOLUME_INFO_PATH + "/bricks/brick"
+    option_path = VOLUME_INFO_PATH + "/options/option"
+    # uuid and hostname lookups shared by every brick.  This is built from a
+    # single peer listing instead of one per brick.
+    registry = None
+    fields = {}
     bricks = []
     options = {}
+    for path, elem in iter_cli_xml(source, [VOLUME_INFO_PATH,
+                                            VOLUME_INFO_PATH + "/*",
+                                            brick_path, option_path]):
+        if path == brick_path:
+            if registry is None:
+                if peers is None:
+                    peer_result = peer_list()
+                    if peer_result.is_ok():
+                        peers = peer_result.value
+                    else:
+                        peers = []
+                registry = PeerRegistry(peers, resolve=False)
+            brick = _parse_brick(elem, registry)
+            bricks.append(brick)
+            yield brick
+        elif path == option_path:
+            options[elem.findtext("name")] = elem.findtext("value")
+        elif path == VOLUME_INFO_PATH:
+            yield _volume_from_fields(fields, bricks, options)
+            fields = {}
+            bricks = []
+            options = {}
+        elif elem.tag not in ("bricks", "options"):
+            fields[elem.tag] = elem.text
+
+
+def _brick_fields(brick) -> tuple:
+    # (hostname, path, host uuid, is_arbiter) of a volume info <brick>
+    brick_name = None
+    brick_uuid = None
+    is_arbiter = None
+    for brick_info in brick:
+        if brick_info.tag == 'name':
+            brick_name = brick_info.text
+        elif brick_info.tag == 'hostUuid':
+            brick_uuid = intern_uuid(brick_info.text)
+        elif brick_info.tag == 'isArbiter':
+            is_arbiter = brick_info.text == "1"
+    hostname, path = brick_name.rsplit(":", 1)
+    return hostname, path, brick_uuid, is_arbiter
+
+
+def _parse_brick(brick, registry: PeerRegistry) -> Brick:
+    hostname, path, brick_uuid, is_arbiter = _brick_fields(brick)
+    peer = registry.get(brick_uuid)
+    if peer is None:
+        peer = _find_brick_peer(hostname, registry)
+    return Brick(uuid=brick_uuid, peer=peer, path=path,
+                 is_arbiter=is_arbiter)
+
+
+def _volume_from_fields(fields: Dict[str, str], bricks: List[Brick],
+                        options: Dict[str, str]) -> Volume:
+    vol_type = None
+    if 'typeStr' in fields:
+        vol_type = VolumeType.from_str(fields['typeStr'])
+    transport = None
+    if 'transport' in fields:
+        transport = Transport.from_str(fields['transport'])
+    return Volume(name=fields.get('name'),
+                  vol_type=vol_type,
+                  vol_id=fields.get('id'),
+                  status=fields.get('status'),
+                  snapshot_count=fields.get('snapshotCount'),
+                  dist_count=fields.get('distCount'),
+                  stripe_count=fields.get('stripeCount'),
+                  replica_count=fields.get('replicaCount'),
+                  disperse_count=fields.get('disperseCount'),
+                  arbiter_count=fields.get('arbiterCount'),
+                  redundancy_count=fields.get('redundancyCount'),
+                  bricks=bricks,
+                  options=options,
+                  transport=transport)
+
+
+def _find_brick_peer(hostname: str,
+                     registry: PeerRegistry) -> Optional[Peer]:
+    peer = registry.get(hostname)
+    if peer is None:
+        # Translate back into an IP address if needed
+        try:
+            ip_address(hostname)
+        except ValueError:
+            resolved = resolve_to_ip(hostname)
+            if resolved.is_ok():
+                peer = registry.get(resolved.value)
+    return peer
+
+
+# glusterd's numeric volume types and the CLI's typeStr for them
+STORE_VOLUME_TYPES = {
+    "0": "Distribute",
+    "1": "Stripe",
+    "2": "Replicate",
+    "3": "Striped-Replicate",
+    "4": "Disperse",
+}
+
+# glusterd's numeric transport types
+STORE_TRANSPORTS = {
+    "0": Transport.Tcp,
+    "1": Transport.Rdma,
+    "2": Transport.TcpAndRdma,
+}
+
+
+def volume_list_from_store(workdir: str = store.GLUSTERD_WORKDIR) -> Result:
+    """
+    Lists the volumes in glusterd's store without running the CLI
+    :param workdir: String.  glusterd's working directory
+    :return: Result.  List of volume names or Err if there is no store
+    """
+    names = store.volume_names(workdir)
+    if names is None:
+        return Err("No glusterd store at {}".format(workdir))
+    return Ok(names)
+
+
+def volume_info_from_store(volume: str,
+                           workdir: str = store.GLUSTERD_WORKDIR,
+                           peers: Optional[List[Peer]] = None) -> Result:
+    """
+    Build the same Volume that parse_volume_info builds but from the info
+    and brick files in glusterd's store.  No CLI command or root is needed.
+    :param volume: String.  The volume to gather info about
+    :param workdir: String.  glusterd's working directory
+    :param peers: list.  Optional list of Peer to resolve bricks against.  If
+      None the peer list is queried once.
+    :return: Result.  List of Volume or Err if the store is missing,
+      incomplete or doesn't agree with itself.  Callers should fall back to
+      the CLI on Err.
+    """
+    info = store.read_volume_info(volume, workdir)
+    if info is None:
+        return Err("Volume {} not found in {}".format(volume, workdir))
+    try:
+        brick_names = [info["brick-{}".format(i)]
+                       for i in range(int(info["count"]))]
+        replica_count = int(info.get("replica_count", "1"))
+        stripe_count = int(info.get("stripe_count", "1"))
+        arbiter_count = int(info.get("arbiter_count", "0"))
+        disperse_count = int(info.get("disperse_count", "0"))
+        type_str = STORE_VOLUME_TYPES[info["type"]]
+        transport = STORE_TRANSPORTS[info.get("transport-type", "0")]
+    except (KeyError, ValueError) as e:
+        # A half written or newer format store
+        return Err("Unable to parse store info for {}: {}".format(volume, e))
+
+    if disperse_count > 0:
+        dist_leaf_count = disperse_count
+    else:
+        dist_leaf_count = replica_count * stripe_count
+    if type_str != "Distribute" and len(brick_names) > dist_leaf_count:
+        type_str = "Distributed-{}".format(type_str)
+
+    if peers is None:
+        peer_result = peer_list()
+        if peer_result.is_err():
+            return Err(peer_result.value)
+        peers = peer_result.value
+    registry = PeerRegistry(peers, resolve=False)
 
-    for volume in volumes:
-        for vol_info in volume:
-            if vol_info.tag == 'name':
-                name = vol_info.text
-            elif vol_info.tag == 'id':
-                vol_id = vol_info.text
-            elif vol_info.tag == 'status':
-                status = vol_info.text
-            elif vol_info.tag == 'statusStr':
-                pass
-            elif vol_info.tag == 'snapshotCount':
-                snapshot_count = vol_info.text
-            elif vol_info.tag == 'distCount':
-                dist_count = vol_info.text
-            elif vol_info.tag == 'stripeCount':
-                stripe_count = vol_info.text
-            elif vol_info.tag == 'replicaCount':
-                replica_count = vol_info.text
-            elif vol_info.tag == 'arbiterCount':
-                arbiter_count = vol_info.text
-            elif vol_info.tag == 'disperseCount':
-                disperse_count = vol_info.text
-            elif vol_info.tag == 'redundancyCount':
-                redundancy_count = vol_info.text
-            elif vol_info.tag == 'typeStr':
-                vol_type = VolumeType.from_str(vol_info.text)
-            elif vol_info.tag == 'transport':
-                transport = Transport.from_str(vol_info.text)
-            elif vol_info.tag == 'options':
-                for option in vol_info:
-                    option_info = list(option.iter())
-                    name = None
-                    value = None
-                    for entry in option_info:
-                        if entry.tag == 'name':
-                            name = entry.text
-                        if entry.tag == 'value':
-                            value = entry.text
-                    options[name] = value
-            elif vol_info.tag == 'bricks':
-                for brick in vol_info:
-                    name = None
-                    uuid = None
-                    is_arbiter = None
-                    for brick_info in brick:
-                        if brick_info.tag == 'name':
-                            name = brick_info.text
-                        elif brick_info.tag == 'hostUuid':
-                            uuid = brick_info.text
-                        elif brick_info.tag == 'isArbiter':
-                            is_arbiter = brick_info.text
-                    hostname = name.split(":")[0]
-                    # Translate back into an IP address if needed
-                    try:
-                        ip_address(hostname)
-                    except ValueError:
-                        hostname = resolve_to_ip(hostname)
-                    path = name.split(":")[1]
-                    peer = get_peer(hostname)
-                    bricks.append(
-                        Brick(
-                            uuid=uuid,
-                            peer=peer,
-                            path=path,
-                            is_arbiter=is_arbiter))
-        volume_info_list.append(
-            Volume(name=name, vol_type=vol_type, vol_id=vol_id,
-                   status=status,
-                   snapshot_count=snapshot_count,
-                   dist_count=dist_count,
-                   stripe_count=stripe_count,
-                   replica_count=replica_count,
-                   disperse_count=disperse_count,
-                   arbiter_count=arbiter_count,
-                   redundancy_count=redundancy_count,
-                   bricks=bricks,
-                   options=options,
-                   transport=transport))
-    return Ok(volume_info_list)
+    bricks = []
+    for index, brick_name in enumerate(brick_names):
+        brick_info = store.read_brick_info(volume, brick_name, workdir)
+        if brick_info is None or "path" not in brick_info:
+            return Err("Missing store file for brick {}".format(brick_name))
+        hostname = brick_info.get("hostname", brick_name.rsplit(":", 1)[0])
+        peer = _find_brick_peer(hostname, registry)
+        if peer is None:
+            # The store has a host we don't know about.  Let the CLI answer.
+            return Err("Unknown peer {} for brick {}".format(hostname,
+                                                             brick_name))
+        # An arbiter is the last brick of each replica set
+        is_arbiter = arbiter_count > 0 and \
+            index % replica_count == replica_count - 1
+        bricks.append(Brick(uuid=peer.uuid, peer=peer,
+                            path=brick_info["path"], is_arbiter=is_arbiter))
+
+    options = {key: value for key, value in info.items()
+               if "." in key and not key.startswith("brick-")}
+    snapshot_count = len(store.volume_snapshots(volume, workdir))
+
+    return Ok([Volume(name=volume,
+                      vol_type=VolumeType.from_str(type_str),
+                      vol_id=info.get("volume-id"),
+                      status=info.get("status"),
+                      snapshot_count=str(snapshot_count),
+                      dist_count=str(dist_leaf_count),
+                      stripe_count=str(stripe_count),
+                      replica_count=str(replica_count),
+                      arbiter_count=str(arbiter_count),
+                      disperse_count=str(disperse_count),
+                      redundancy_count=info.get("redundancy_count", "0"),
+                      transport=transport,
+                      bricks=bricks,
+                      options=options)])
 
 
 def volume_info(volume: str) -> Result:
     """
-    Returns a Volume with all available information on the volume
+    Returns a Volume with all available information on the volume.  On a
+    server node this is read from glusterd's store.  The CLI is used if the
+    store is missing or can't be used.
     volume: String.  The volume to gather info about
     :return: List[Volume].  The volume information
     :raises: GlusterError if the command fails to run
     """
+    from_store = volume_info_from_store(volume)
+    if from_store.is_ok():
+        return from_store
+    return volume_info_from_cli(volume)
+
+
+def volume_info_all_from_store() -> Result:
+    """
+    Every Volume described by glusterd's store.  The peers are listed once
+    and shared by all of them.
+    :return: Result.  Dict of volume name -> Volume or Err if any volume
+      can't be read from the store
+    """
+    names = volume_list_from_store()
+    if names.is_err():
+        return Err(names.value)
+    peers = peer_list()
+    if peers.is_err():
+        return Err(peers.value)
+    volumes = {}
+    for name in names.value:
+        from_store = volume_info_from_store(name, peers=peers.value)
+        if from_store.is_err():
+            return Err(from_store.value)
+        volumes[name] = from_store.value[0]
+    return Ok(volumes)
+
+
+def volume_info_all() -> Result:
+    """
+    Returns every Volume in the cluster.  On a server node they're read
+    from glusterd's store, otherwise a single volume info all is run instead
+    of volume list followed by one volume info per volume.
+    :return: Result.  Dict of volume name -> Volume or Err
+    """
+    from_store = volume_info_all_from_store()
+    if from_store.is_ok():
+        return from_store
+    arg_list = ["volume", "info", "all", "--xml"]
+    output = run_command("gluster", arg_list, True, False)
+    if output.is_err():
+        return Err("Volume info get cmd failed: {}".format(output.value))
+    return parse_volume_info_all(output.value)
+
+
+def parse_volume_info_all(volume_xml,
+                          peers: Optional[List[Peer]] = None) -> Result:
+    """
+    Parse volume info --xml output describing any number of volumes
+    :param volume_xml: bytes, String or a file like object
+    :param peers: list.  Optional list of Peer to resolve bricks against
+    :return: Result.  Dict of volume name -> Volume or Err
+    """
+    try:
+        volumes = {vol.name: vol
+                   for vol in stream_volume_info(volume_xml, peers=peers)}
+    except GlusterError as e:
+        return Err(str(e))
+    _share_paths(brick for vol in volumes.values() for brick in vol.bricks)
+    return Ok(volumes)
+
+
+def volume_info_from_cli(volume: str) -> Result:
+    """
+    Returns a Volume with all available information on the volume by asking
+    the gluster CLI
+    volume: String.  The volume to gather info about
+    :return: List[Volume].  The volume information
+    """
     arg_list = ["volume", "info", volume, '--xml']
     output = run_command("gluster", arg_list, True, False)
 
@@ -482,23 +774,22 @@ def parse_quota_list(output_xml: str) -> Result:
     Return a list of quotas on the volume if any
     :param output_xml:
     """
-    tree = etree.fromstring(output_xml)
+    try:
+        return Ok(list(stream_quota_list(output_xml)))
+    except GlusterError as e:
+        return Err(str(e))
 
-    return_code = 0
-    err_string = ""
 
-    for child in tree:
-        if child.tag == 'opRet':
-            return_code = int(child.text)
-        elif child.tag == 'opErrstr':
-            err_string = child.text
-
-    if return_code != 0:
-        return Err(err_string)
-
-    quota_list = []
-    limits = tree.findall('./volQuota/limit')
-    for limit in limits:
+def stream_quota_list(source) -> Iterator[Quota]:
+    """
+    Incrementally parse volume quota list --xml output.  Each limit is
+    discarded as soon as its Quota has been yielded.
+    :param source: bytes, String or a file like object such as the stdout
+      pipe of the gluster command
+    :return: Iterator of Quota
+    :raise GlusterError: if the command failed or the output can't be parsed
+    """
+    for _, limit in iter_cli_xml(source, [QUOTA_LIMIT_PATH]):
         path = None
         hard_limit = None
         soft_limit_percent = None
@@ -524,15 +815,12 @@ def parse_quota_list(output_xml: str) -> Result:
                 soft_limit_exceeded = limit_info.text
             elif limit_info.tag == 'hl_exceeded':
                 hard_limit_exceeded = limit_info.text
-        quota = Quota(path=path, hard_limit=hard_limit,
-                      soft_limit=soft_limit,
-                      soft_limit_percentage=soft_limit_percent,
-                      used=used_space, avail=avail_space,
-                      soft_limit_exceeded=soft_limit_exceeded,
-                      hard_limit_exceeded=hard_limit_exceeded)
-        quota_list.append(quota)
-
-    return Ok(quota_list)
+        yield Quota(path=path, hard_limit=hard_limit,
+                    soft_limit=soft_limit,
+                    soft_limit_percentage=soft_limit_percent,
+                    used=used_space, avail=avail_space,
+                    soft_limit_exceeded=soft_limit_exceeded,
+                    hard_limit_exceeded=hard_limit_exceeded)
 
 
 def volume_enable_bitrot(volume: str) -> Result:
@@ -594,9 +882,11 @@ def volume_quotas_enabled(volume: str) -> bool:
             if quota is None:
                 return False
             else:
-                if quota == "off":
+                # glusterd's store keeps the value as it was given
+                enabled = normalize_option_value(quota)
+                if enabled == "off":
                     return False
-                elif quota == "on":
+                elif enabled == "on":
                     return True
                 else:
                     # No idea what this is
@@ -682,63 +972,269 @@ def ok_to_remove(volume: str, brick: Brick) -> Result:
 
 
 def parse_volume_status(output_xml: str) -> Result:
-    tree = etree.fromstring(output_xml)
+    try:
+        statuses = list(stream_volume_status(output_xml))
+    except GlusterError as e:
+        return Err(str(e))
+    _share_paths(status.brick for status in statuses)
+    return Ok(statuses)
+
+
+def stream_volume_status(source) -> Iterator[BrickStatus]:
+    """
+    Incrementally parse vol status --xml output.  Each node is discarded as
+    soon as its BrickStatus has been yielded.
+    :param source: bytes, String or a file like object such as the stdout
+      pipe of the gluster command
+    :return: Iterator of BrickStatus
+    :raise GlusterError: if the command failed or the output can't be parsed
+    """
+    for volume, status in _stream_volume_status_records(source):
+        yield status
+
+
+def _stream_volume_status_records(source):
+    # Yields (volume name, BrickStatus) for every node of every volume
+    peers = {}
+    volume = None
+    for record, node in iter_cli_xml(source,
+                                     [VOLUME_STATUS_PATH,
+                                      VOLUME_STATUS_PATH + "/volName",
+                                      VOLUME_STATUS_PATH + "/node"]):
+        if record == VOLUME_STATUS_PATH:
+            # Only emptied out now, just let it be removed
+            continue
+        if node.tag == 'volName':
+            volume = node.text
+            continue
+        hostname, path, peer_id, online, tcp_port, rdma_port, pid, detail = \
+            _node_fields(node)
+        # Every brick and daemon on a host shares one Peer.  Whether each
+        # one is running is in BrickStatus.online.
+        peer = peers.get((peer_id, hostname))
+        if peer is None:
+            peer = Peer(uuid=peer_id, hostname=hostname, status=None)
+            peers[(peer_id, hostname)] = peer
+        # The is_arbiter field isn't known yet so we'll leave
+        # it as False
+        brick = Brick(uuid=peer_id, peer=peer, path=path,
+                      is_arbiter=False)
+        yield volume, BrickStatus(brick=brick,
+                                  tcp_port=tcp_port,
+                                  rdma_port=rdma_port,
+                                  online=online,
+                                  pid=pid,
+                                  detail=detail)
+
+
+def _optional_int(text: Optional[str]) -> Optional[int]:
+    # Ports and pids are N/A for processes that aren't running
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+# vol status detail <node> fields -> (BrickDetail argument, converter)
+DETAIL_FIELDS = {
+    'sizeTotal': ('size_total', _optional_int),
+    'sizeFree': ('size_free', _optional_int),
+    'inodesTotal': ('inodes_total', _optional_int),
+    'inodesFree': ('inodes_free', _optional_int),
+    'device': ('device', str),
+    'blockSize': ('block_size', _optional_int),
+    'mntOptions': ('mount_options', str),
+    'fsName': ('fs_name', str),
+}
+
+
+def _node_fields(node) -> tuple:
+    # (hostname, path, peer uuid, online, tcp port, rdma port, pid, detail)
+    # of a vol status <node>.  detail is None unless it's vol status detail
+    # output.
+    hostname = None
+    path = None
+    peer_id = None
+    status = None
+    tcp_port = None
+    rdma_port = None
+    pid = None
+    detail = None
+    for node_info in node:
+        if node_info.tag in DETAIL_FIELDS:
+            if detail is None:
+                detail = dict.fromkeys(
+                    name for name, _ in DETAIL_FIELDS.values())
+            name, convert = DETAIL_FIELDS[node_info.tag]
+            if node_info.text is not None:
+                detail[name] = convert(node_info.text)
+        elif node_info.tag == 'hostname':
+            hostname = node_info.text
+        elif node_info.tag == 'path':
+            path = node_info.text
+        elif node_info.tag == 'peerid':
+            peer_id = node_info.text
+        elif node_info.tag == 'status':
+            status = node_info.text
+        elif node_info.tag == 'ports':
+            for port_info in node_info:
+                if port_info.tag == 'rdma':
+                    rdma_port = _optional_int(port_info.text)
+                elif port_info.tag == 'tcp':
+                    tcp_port = _optional_int(port_info.text)
+        elif node_info.tag == 'pid':
+            pid = _optional_int(node_info.text)
+    try:
+        peer_id = intern_uuid(peer_id)
+    except ValueError:
+        pass
+    if detail is not None:
+        detail = BrickDetail(**detail)
+    return hostname, path, peer_id, status == "1", tcp_port, rdma_port, pid, \
+        detail
+
+
+def parse_volume_status_table(output_xml) -> Result:
+    """
+    Parse vol status --xml output straight into a BrickTable without
+    building BrickStatus objects
+    :param output_xml: bytes, String or a file like object
+    :return: Result.  BrickTable or Err
+    """
+    table = BrickTable()
+    volume = None
+    try:
+        for record, elem in iter_cli_xml(
+                output_xml, [VOLUME_STATUS_PATH, VOLUME_STATUS_PATH + "/*"]):
+            if elem.tag == 'volName':
+                volume = elem.text
+            elif elem.tag == 'node':
+                hostname, path, peer_id, online, tcp_port, rdma_port, pid, \
+                    _ = _node_fields(elem)
+                table.append(volume, hostname, peer_id, path, port=tcp_port,
+                             rdma_port=rdma_port, pid=pid, online=online)
+    except GlusterError as e:
+        return Err(str(e))
+    return Ok(table)
+
+
+def parse_volume_info_table(volume_xml) -> Result:
+    """
+    Parse volume info --xml output straight into a BrickTable.  Bricks are
+    identified by the host name and UUID in the output so no peer lookup is
+    needed.
+    :param volume_xml: bytes, String or a file like object
+    :return: Result.  BrickTable or Err
+    """
+    table = BrickTable()
+    volume = None
+    try:
+        for record, elem in iter_cli_xml(
+                volume_xml, [VOLUME_INFO_PATH, VOLUME_INFO_PATH + "/*",
+                             VOLUME_INFO_PATH + "/bricks/brick"]):
+            if record == VOLUME_INFO_PATH + "/name":
+                volume = elem.text
+            elif elem.tag == 'brick':
+                hostname, path, brick_uuid, is_arbiter = _brick_fields(elem)
+                table.append(volume, hostname, brick_uuid, path,
+                             is_arbiter=is_arbiter)
+    except GlusterError as e:
+        return Err(str(e))
+    return Ok(table)
+
+
+def iter_bricks(volume: str) -> Iterator[Brick]:
+    """
+    Lazily yield the bricks of a volume.  They're read from glusterd's store
+    on a server node, otherwise volume info is streamed and each brick is
+    yielded as it's parsed.  Stopping early kills the command.
+    :param volume: String.  The volume to list bricks of
+    :return: Iterator of Brick
+    :raise GlusterError: if the command fails
+    """
+    from_store = volume_info_from_store(volume)
+    if from_store.is_ok():
+        for vol in from_store.value:
+            yield from vol.bricks
+        return
+    arg_list = ["volume", "info", volume, "--xml"]
+    with command_stream("gluster", arg_list, True, False) as stdout:
+        yield from stream_bricks(stdout)
+
+
+def iter_brick_status(volume: str) -> Iterator[BrickStatus]:
+    """
+    Lazily yield the status of each brick and daemon of a volume as vol
+    status reports it.  Stopping early, for example at the first brick that
+    isn't online, kills the command.
+    :param volume: String.  The volume to query
+    :return: Iterator of BrickStatus
+    :raise GlusterError: if the command fails
+    """
+    arg_list = ["vol", "status", volume, "--xml"]
+    with command_stream("gluster", arg_list, True, False) as stdout:
+        yield from stream_volume_status(stdout)
 
-    return_code = 0
-    err_string = ""
 
-    for child in tree:
-        if child.tag == 'opRet':
-            return_code = int(child.text)
-        elif child.tag == 'opErrstr':
-            err_string = child.text
+def iter_quotas(volume: str) -> Iterator[Quota]:
+    """
+    Lazily yield the quotas on a volume.  Stopping early kills the command.
+    :param volume: String.  The volume to operate on.
+    :return: Iterator of Quota
+    :raise GlusterError: if the command fails
+    """
+    args_list = ["volume", "quota", volume, "list", "--xml"]
+    with command_stream("gluster", args_list, True, False) as stdout:
+        yield from stream_quota_list(stdout)
 
-    if return_code != 0:
-        return Err(err_string)
 
-    status_list = []
-
-    volumes = tree.findall('./volStatus/volumes/volume')
-    for volume in volumes:
-        for vol_info in volume:
-            if vol_info.tag == 'node':
-                hostname = None
-                path = None
-                peer_id = None
-                status = None
-                tcp_port = None
-                rdma_port = None
-                pid = None
-                for node_info in vol_info:
-                    if node_info.tag == 'hostname':
-                        hostname = node_info.text
-                    elif node_info.tag == 'path':
-                        path = node_info.text
-                    elif node_info.tag == 'peerid':
-                        peer_id = node_info.text
-                    elif node_info.tag == 'status':
-                        status = node_info.text
-                    elif node_info.tag == 'ports':
-                        for port_info in node_info:
-                            if port_info.tag == 'rdma':
-                                rdma_port = port_info.text
-                            elif port_info.tag == 'tcp':
-                                tcp_port = port_info.text
-                    elif node_info.tag == 'pid':
-                        pid = node_info.text
-                peer = Peer(uuid=peer_id, hostname=hostname, status=status)
-                # The is_arbiter field isn't known yet so we'll leave
-                # it as False
-                brick = Brick(uuid=peer_id, peer=peer, path=path,
-                              is_arbiter=False)
-                # The online field isn't known yet so we'll leave it as False
-                brick_status = BrickStatus(brick=brick,
-                                           tcp_port=tcp_port,
-                                           rdma_port=rdma_port,
-                                           online=False,
-                                           pid=pid)
-                status_list.append(brick_status)
-    return Ok(status_list)
+def parse_volume_status_all(output_xml) -> Result:
+    """
+    Parse vol status all --xml output, with or without detail
+    :param output_xml: bytes, String or a file like object
+    :return: Result.  Dict of volume name -> list of BrickStatus or Err
+    """
+    volumes = {}
+    try:
+        for volume, status in _stream_volume_status_records(output_xml):
+            volumes.setdefault(volume, []).append(status)
+    except GlusterError as e:
+        return Err(str(e))
+    _share_paths(status.brick for statuses in volumes.values()
+                 for status in statuses)
+    return Ok(volumes)
+
+
+def volume_status_all(detail: bool = False) -> Result:
+    """
+    Query the status of every volume with a single command instead of one
+    per volume.  Volumes that aren't started don't have a status and are
+    left out.
+    :param detail: bool.  Also ask for the filesystem details of each brick.
+      See BrickStatus.detail
+    :return: Result.  Dict of volume name -> list of BrickStatus or Err
+    """
+    arg_list = ["vol", "status", "all"]
+    if detail:
+        arg_list.append("detail")
+    arg_list.append("--xml")
+    output = run_command("gluster", arg_list, True, False)
+    if output.is_err():
+        return Err(output.value)
+    return parse_volume_status_all(output.value)
+
+
+def volume_status_table(volume: str) -> Result:
+    """
+    Query the status of the volume given as a BrickTable
+    :param volume: String.  The volume to query
+    :return: Result.  BrickTable or Err
+    """
+    arg_list = ["vol", "status", volume, "--xml"]
+    output = run_command("gluster", arg_list, True, False)
+    if output.is_err():
+        return Err(output.value)
+    return parse_volume_status_table(output.value)
 
 
 def volume_status(volume: str) -> Result:
@@ -894,6 +1390,18 @@ def volume_create(volume: str, options: Dict[VolumeTranslator, str],
     :return: Result.  Ok or Err
     :raise GlusterError:
     """
+    arg_list = volume_create_args(volume, options, transport, bricks, force)
+    return run_command("gluster", arg_list, True, True)
+
+
+def volume_create_args(volume: str, options: Dict[VolumeTranslator, str],
+                       transport: Transport, bricks: List[Brick],
+                       force: bool) -> List[str]:
+    """
+    Build the gluster arguments for volume_create
+    :return: list.  Arguments to pass to run_command
+    :raise GlusterError: if the brick list is empty
+    """
     if len(bricks) == 0:
         raise GlusterError("The brick list is empty. Not creating volume")
 
@@ -911,7 +1419,7 @@ def volume_create(volume: str, options: Dict[VolumeTranslator, str],
     if force:
         arg_list.append("force")
 
-    return run_command("gluster", arg_list, True, True)
+    return arg_list
 
 
 def vol_set(volume: str, option: GlusterOption) -> Result:
@@ -924,14 +1432,23 @@ def vol_set(volume: str, option: GlusterOption) -> Result:
     return run_command("gluster", arg_list, True, True)
 
 
-def volume_set_options(volume: str, settings: List[GlusterOption]) -> Result:
+def volume_set_options(volume: str, settings: List[GlusterOption],
+                       batch: bool = False) -> Result:
     """
     Set an option on the volume
     :param volume: String. Volume name to set the option on
     :param settings: list of GlusterOption
+    :param batch: bool.  Set them in as few glusterd transactions as
+      possible.  See volume_set_options_batched.
     """
     # # Failures
     # Will return GlusterError if the command fails to run
+    if batch:
+        result = volume_set_options_batched(volume, settings)
+        if result.is_err():
+            return Err("\n".join("{}: {}".format(name, error)
+                                 for name, error in result.value.items()))
+        return Ok()
     error_list = []
     for setting in settings:
         result = vol_set(volume, setting)
@@ -943,6 +1460,257 @@ def volume_set_options(volume: str, settings: List[GlusterOption]) -> Result:
     return Ok()
 
 
+# Keys the CLI treats specially that have to be set on their own
+UNBATCHABLE_OPTIONS = ("group",)
+
+# How a CLI that only takes one key and value per set rejects a batch
+BATCH_SET_UNSUPPORTED_RE = re.compile(r"Usage:\s*volume set", re.IGNORECASE)
+# Cleared once the CLI rejects the syntax of a batched set
+_batch_set_supported = True
+
+
+def vol_set_many_args(volume: str, settings: List[GlusterOption]) -> List:
+    """
+    :param volume: String. Volume name to set the options on
+    :param settings: list of GlusterOption
+    :return: list.  Arguments for one volume set of every key and value
+    """
+    arg_list = ["volume", "set", volume]
+    for setting in settings:
+        arg_list.extend((setting.name, setting.value))
+    return arg_list
+
+
+def vol_set_many(volume: str, settings: List[GlusterOption]) -> Result:
+    """
+    Set several options in a single volume set.  glusterd applies them in
+    one transaction and regenerates the volfiles once.  If any option is
+    rejected none of them are set.
+    :param volume: String. Volume name to set the options on
+    :param settings: list of GlusterOption
+    :return: Result.  Return code and output of cmd
+    """
+    return run_command("gluster", vol_set_many_args(volume, settings), True,
+                       True)
+
+
+def plan_batched_set(settings: List[GlusterOption]) -> tuple:
+    """
+    :param settings: list of GlusterOption
+    :return: tuple.  (settings that can go in one volume set, settings that
+      have to be set alone)
+    """
+    if not _batch_set_supported:
+        return [], list(settings)
+    batch = [s for s in settings if s.name not in UNBATCHABLE_OPTIONS]
+    alone = [s for s in settings if s.name in UNBATCHABLE_OPTIONS]
+    if len(batch) < 2:
+        return [], list(settings)
+    return batch, alone
+
+
+def record_batch_fallback(error):
+    """
+    Record why a batched set failed.  Batching is only turned off when the
+    CLI doesn't understand more than one key and value.  Other failures,
+    such as a timeout or another transaction holding the lock, leave it on.
+    :param error: The error the batched set returned
+    """
+    global _batch_set_supported
+    if BATCH_SET_UNSUPPORTED_RE.search(str(error)):
+        _batch_set_supported = False
+
+
+def volume_set_options_batched(volume: str,
+                               settings: List[GlusterOption]) -> Result:
+    """
+    Set options on the volume with one volume set, so one cluster wide
+    glusterd transaction and one volfile update for the clients instead of
+    one per option.  If the batch is rejected, either because an option is
+    bad or the CLI only takes one at a time, the options are set one by one
+    so the good ones are still applied and each failure is reported.
+    :param volume: String. Volume name to set the options on
+    :param settings: list of GlusterOption
+    :return: Result.  Ok or Err of a dict of option name -> error
+    """
+    batch, alone = plan_batched_set(settings)
+    batch_errors = {}
+    if batch:
+        result = vol_set_many(volume, batch)
+        if result.is_err():
+            record_batch_fallback(result.value)
+            batch_errors = _set_each(volume, batch)
+    errors = _set_each(volume, alone)
+    errors.update(batch_errors)
+    if errors:
+        return Err(errors)
+    return Ok()
+
+
+def _set_each(volume: str, settings: List[GlusterOption]) -> Dict[str, str]:
+    errors = {}
+    for setting in settings:
+        result = vol_set(volume, setting)
+        if result.is_err():
+            errors[setting.name] = str(result.value)
+    return errors
+
+
+# How gluster spells boolean option values
+OPTION_BOOLEANS = {
+    "on": True, "off": False,
+    "true": True, "false": False,
+    "yes": True, "no": False,
+    "enable": True, "disable": False,
+}
+# Sizes as gluster prints them, such as 32MB or 512Bytes
+OPTION_SIZE_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*(KB|MB|GB|TB|PB|Bytes)$",
+                            re.IGNORECASE)
+
+
+def normalize_option_value(value):
+    """
+    Put an option value in a form that compares equal to the other
+    spellings gluster accepts for it.  Only boolean words and sizes have
+    other spellings: Toggle.On, True, "on", "On" and "enable" are all "on",
+    "20MB", "20mb" and 20971520 are all 20971520.  Any other value, such as a
+    path or a cipher list, is compared exactly as given, so "1" and "on" or
+    "/Export" and "/export" are different.  Other enums are compared by
+    their value.
+    :param value: Toggle, other Enum, bool, int or String
+    :return: "on", "off", a number or the String
+    """
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, bool):
+        return "on" if value else "off"
+    if isinstance(value, (int, float)):
+        return value
+    value = str(value).strip()
+    # volume get marks values that were never set
+    if value.endswith("(DEFAULT)"):
+        value = value[:-len("(DEFAULT)")].strip()
+    lowered = value.lower()
+    if lowered in OPTION_BOOLEANS:
+        return "on" if OPTION_BOOLEANS[lowered] else "off"
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    size = OPTION_SIZE_RE.match(value)
+    if size is not None:
+        number, unit = size.groups()
+        unit = "Bytes" if unit.lower() == "bytes" else unit.upper()
+        return translate_to_bytes(number + unit)
+    return value
+
+
+def option_changes(current: Dict[str, str],
+                   settings: List[GlusterOption]) -> tuple:
+    """
+    Split settings into the ones that would change the volume and the ones
+    it already has
+    :param current: dict.  Option name -> value the volume has now
+    :param settings: list of GlusterOption.  The desired values
+    :return: tuple.  (list of GlusterOption to set, list of GlusterOption
+      already set)
+    """
+    changed = []
+    unchanged = []
+    for setting in settings:
+        value = current.get(setting.name)
+        if value is not None and normalize_option_value(value) == \
+                normalize_option_value(setting.value):
+            unchanged.append(setting)
+        else:
+            changed.append(setting)
+    return changed, unchanged
+
+
+def parse_volume_get_options(output_xml) -> Result:
+    """
+    Parse volume get <vol> all --xml output
+    :param output_xml: bytes, String or a file like object
+    :return: Result.  Dict of option name -> value or Err
+    """
+    options = {}
+    try:
+        for path, elem in iter_cli_xml(output_xml,
+                                       ["cliOutput/volGetopts/Opt"]):
+            options[intern_str(elem.findtext("Option"))] = \
+                elem.findtext("Value")
+    except GlusterError as e:
+        return Err(str(e))
+    return Ok(options)
+
+
+def volume_get_options(volume: str) -> Result:
+    """
+    Every option of a volume with the value in effect, including the
+    defaults volume info leaves out
+    :param volume: String.  Volume name
+    :return: Result.  Dict of option name -> value or Err
+    """
+    arg_list = ["volume", "get", volume, "all", "--xml"]
+    output = run_command("gluster", arg_list, True, False)
+    if output.is_err():
+        return Err(output.value)
+    return parse_volume_get_options(output.value)
+
+
+class OptionReport(object):
+    __slots__ = ("changed", "skipped")
+
+    def __init__(self, changed: List[GlusterOption],
+                 skipped: List[GlusterOption]):
+        """
+        What volume_reconcile_options did
+        changed: list of GlusterOption.  Options that were set
+        skipped: list of GlusterOption.  Options the volume already had
+        """
+        self.changed = changed
+        self.skipped = skipped
+
+    def __str__(self):
+        return "OptionReport changed: {} skipped: {}".format(
+            [s.name for s in self.changed], [s.name for s in self.skipped])
+
+
+def volume_reconcile_options(volume: str, settings: List[GlusterOption],
+                             current: Optional[Dict[str, str]] = None,
+                             dry_run: bool = False) -> Result:
+    """
+    Like volume_set_options but only sets the options whose value would
+    change.  The volume's options are read once: from volume info (the
+    store on a server node) and, only if some settings aren't in there,
+    from a single volume get for their defaults.
+    :param volume: String. Volume name to set the options on
+    :param settings: list of GlusterOption.  The desired values
+    :param current: dict.  Option name -> value the volume has now, for
+      example Volume.options.  Read from the volume if None.
+    :param dry_run: bool.  Work out what would change without setting it
+    :return: Result.  OptionReport or Err if the options can't be read or
+      setting any of them failed
+    """
+    if current is None:
+        vol_info = volume_info(volume)
+        if vol_info.is_err():
+            return Err(vol_info.value)
+        current = dict(vol_info.value[0].options)
+        if any(setting.name not in current for setting in settings):
+            # Options at their default aren't in volume info
+            defaults = volume_get_options(volume)
+            if defaults.is_ok():
+                for name, value in defaults.value.items():
+                    current.setdefault(name, value)
+    changed, unchanged = option_changes(current, settings)
+    if changed and not dry_run:
+        result = volume_set_options(volume, changed, batch=True)
+        if result.is_err():
+            return Err(result.value)
+    return Ok(OptionReport(changed=changed, skipped=unchanged))
+
+
 def volume_create_replicated(volume: str, replica_count: int,
                              transport: Transport, bricks: List[Brick],
                              force: bool) -> Result:
@@ -1052,6 +1820,23 @@ def volume_create_erasure(volume: str, disperse_count: int,
                          force)
 
 
+def _local_host() -> Result:
+    # glusterd knows this node by its UUID.  Only compare addresses on nodes
+    # without a store.
+    local_uuid = local_peer_uuid()
+    if local_uuid is not None:
+        return Ok(local_uuid)
+    ip_result = get_local_ip()
+    if ip_result.is_err():
+        return Err(ip_result.value)
+    return Ok(str(ip_result.value))
+
+
+def _local_volume_bricks(vol: Volume, local_host) -> List[Brick]:
+    table = BrickTable.from_bricks(vol.bricks, vol.name)
+    return [vol.bricks[row] for row in table.host_rows(local_host)]
+
+
 def get_local_bricks(volume: str) -> Result:
     """
         Return all bricks that are being served locally in the volume
@@ -1060,10 +1845,32 @@ def get_local_bricks(volume: str) -> Result:
     vol_info = volume_info(volume)
     if vol_info.is_err():
         return Err(vol_info.value)
-    local_ip = get_local_ip()
+    local_host = _local_host()
+    if local_host.is_err():
+        return Err(local_host.value)
     local_brick_list = []
     for volume in vol_info.value:
-        for brick in volume.bricks:
-            if brick.peer.hostname == local_ip:
-                local_brick_list.append(brick)
+        local_brick_list.extend(_local_volume_bricks(volume,
+                                                     local_host.value))
     return Ok(local_brick_list)
+
+
+def get_all_local_bricks() -> Result:
+    """
+    The bricks served locally in every volume, from a single volume info
+    all instead of one volume info per volume
+    :return: Result.  Dict of volume name -> list of Brick or Err.  Volumes
+      without local bricks are left out.
+    """
+    volumes = volume_info_all()
+    if volumes.is_err():
+        return Err(volumes.value)
+    local_host = _local_host()
+    if local_host.is_err():
+        return Err(local_host.value)
+    local_bricks = {}
+    for name, vol in volumes.value.items():
+        bricks = _local_volume_bricks(vol, local_host.value)
+        if bricks:
+            local_bricks[name] = bricks
+    return Ok(local_bricks)
@@ -80,6 +80,7 @@ setup(
     install_requires=install_require,
     extras_require={
         'testing': tests_require,
+        'numpy': ['numpy'],
     },
     tests_require=tests_require,
 )
@@ -0,0 +1,188 @@
+# Copyright 2017 Canonical Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Measure how much memory the parsed volume info and status objects take
+# per brick, next to a baseline of the same data held the way it was before
+# the classes had __slots__: attributes in a __dict__, a uuid.UUID per brick
+# and, for volume status, a Peer and peer id string per node.
+#
+# Run from the top of the tree:
+#   python -m unit_tests.bench_memory [brick count]
+
+import gc
+import sys
+import tracemalloc
+import uuid
+
+from gluster import peer, volume
+
+HOSTS = 30
+
+
+def host_uuid(host: int) -> str:
+    return str(uuid.UUID(int=host + 1))
+
+
+def volume_info_xml(brick_count: int) -> str:
+    bricks = []
+    for n in range(brick_count):
+        host = n % HOSTS
+        bricks.append(
+            "<brick uuid=\"{u}\">10.0.0.{h}:/srv/brick{b}<name>"
+            "10.0.0.{h}:/srv/brick{b}</name><hostUuid>{u}</hostUuid>"
+            "<isArbiter>0</isArbiter></brick>".format(
+                u=host_uuid(host), h=host, b=n // HOSTS))
+    return ("<cliOutput><opRet>0</opRet><opErrno>0</opErrno><opErrstr/>"
+            "<volInfo><volumes><volume><name>big</name>"
+            "<id>f96dcd18-3235-4dcc-85cf-77c5cdec0951</id>"
+            "<status>1</status><distCount>3</distCount>"
+            "<replicaCount>3</replicaCount>"
+            "<typeStr>Distributed-Replicate</typeStr>"
+            "<transport>0</transport><bricks>{}</bricks>"
+            "<options></options></volume><count>1</count></volumes>"
+            "</volInfo></cliOutput>".format("".join(bricks)))
+
+
+def volume_status_xml(brick_count: int) -> str:
+    nodes = []
+    for n in range(brick_count):
+        host = n % HOSTS
+        nodes.append(
+            "<node><hostname>10.0.0.{h}</hostname>"
+            "<path>/srv/brick{b}</path><peerid>{u}</peerid>"
+            "<status>1</status><port>49152</port><ports><tcp>{p}</tcp>"
+            "<rdma>N/A</rdma></ports><pid>{pid}</pid></node>".format(
+                h=host, b=n // HOSTS, u=host_uuid(host), p=49152 + n // HOSTS,
+                pid=1000 + n))
+    return ("<cliOutput><opRet>0</opRet><opErrno>0</opErrno><opErrstr/>"
+            "<volStatus><volumes><volume><volName>big</volName>{}"
+            "</volume></volumes></volStatus></cliOutput>".format(
+                "".join(nodes)))
+
+
+class DictPeer(object):
+    # Peer without __slots__
+    def __init__(self, uuid, hostname, status, hostnames):
+        self.uuid = uuid
+        self.hostname = hostname
+        self.status = status
+        self.hostnames = hostnames
+
+
+class DictBrick(object):
+    # Brick without __slots__
+    def __init__(self, uuid, peer, path, is_arbiter):
+        self.uuid = uuid
+        self.peer = peer
+        self.path = path
+        self.is_arbiter = is_arbiter
+
+
+class DictBrickStatus(object):
+    # BrickStatus without __slots__
+    def __init__(self, brick, tcp_port, rdma_port, online, pid):
+        self.brick = brick
+        self.tcp_port = tcp_port
+        self.rdma_port = rdma_port
+        self.online = online
+        self.pid = pid
+
+
+def fresh(text: str) -> str:
+    # A copy of text that isn't shared with the parsed objects, like the
+    # string each XML element used to leave behind
+    return text.encode().decode()
+
+
+def baseline_info(vol: volume.Volume) -> list:
+    # Peers came from the shared peer list but each brick parsed its own
+    # host UUID
+    return [DictBrick(uuid=uuid.UUID(str(b.uuid)), peer=b.peer,
+                      path=fresh(b.path), is_arbiter=b.is_arbiter)
+            for b in vol.bricks]
+
+
+def baseline_status(statuses: list) -> list:
+    # Every node got its own Peer and kept the peer id as a string
+    rows = []
+    for status in statuses:
+        peer_id = fresh(str(status.brick.uuid))
+        hostname = fresh(str(status.brick.peer.hostname))
+        node_peer = DictPeer(uuid=peer_id, hostname=hostname,
+                             status=peer.State.Connected,
+                             hostnames=[hostname])
+        brick = DictBrick(uuid=peer_id, peer=node_peer,
+                          path=fresh(status.brick.path), is_arbiter=False)
+        rows.append(DictBrickStatus(brick=brick, tcp_port=status.tcp_port,
+                                    rdma_port=status.rdma_port,
+                                    online=status.online, pid=status.pid))
+    return rows
+
+
+def retained(parse, xml: str) -> int:
+    """
+    Bytes still allocated once the input is gone and only the parsed objects
+    are left
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = parse(xml)
+    assert result.is_ok()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before
+
+
+def retained_baseline(rebuild, parsed) -> int:
+    """
+    Bytes held by the baseline copy of already parsed objects
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rows = rebuild(parsed)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rows
+    return after - before
+
+
+def main():
+    brick_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    peers = [peer.Peer(uuid=uuid.UUID(host_uuid(h)),
+                       hostname="10.0.0.{}".format(h),
+                       status=peer.State.PeerInCluster)
+             for h in range(HOSTS)]
+    info_xml = volume_info_xml(brick_count)
+    status_xml = volume_status_xml(brick_count)
+    info = retained(lambda xml: volume.parse_volume_info(xml, peers=peers),
+                    info_xml)
+    status = retained(volume.parse_volume_status, status_xml)
+    parsed = volume.parse_volume_info(info_xml, peers=peers).value[0]
+    info_before = retained_baseline(baseline_info, parsed)
+    status_before = retained_baseline(
+        baseline_status, volume.parse_volume_status(status_xml).value)
+    print("{} bricks, bytes/brick".format(brick_count))
+    print("               {:>8} {:>8}".format("before", "after"))
+    for name, before, after in (("volume info", info_before, info),
+                                ("volume status", status_before, status)):
+        print("{:14} {:8.1f} {:8.1f}".format(
+            name, before / brick_count, after / brick_count))
+
+
+if __name__ == "__main__":
+    main()
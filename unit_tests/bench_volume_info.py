@@ -0,0 +1,54 @@
+# Copyright 2017 Canonical Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Compare reading volume info from glusterd's store with the CLI path.
+#
+# The CLI path is stood in for by forking cat on the captured XML and
+# parsing it.  The real gluster CLI also has to talk to glusterd so this is
+# a lower bound on what the CLI costs.
+#
+# Run from the top of the tree:
+#   python -m unit_tests.bench_volume_info
+
+import timeit
+
+from gluster import volume
+from gluster.lib import run_command
+from unit_tests.test_volume import cluster_peers
+
+WORKDIR = "unit_tests/glusterd"
+VOL_INFO_XML = "unit_tests/vol_info.xml"
+
+
+def cli_path():
+    output = run_command("cat", [VOL_INFO_XML], False, False)
+    return volume.parse_volume_info(output.value, peers=cluster_peers)
+
+
+def store_path():
+    return volume.volume_info_from_store("chris", workdir=WORKDIR,
+                                         peers=cluster_peers)
+
+
+def main():
+    assert cli_path().is_ok()
+    assert store_path().is_ok()
+    number = 200
+    for name, fn in (("cli", cli_path), ("store", store_path)):
+        best = min(timeit.repeat(fn, number=number, repeat=5)) / number
+        print("{:6} {:10.1f} us/call".format(name, best * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Copyright 2017 Canonical Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Count glusterd transactions and time setting 30 options on a fake 3 node
+# cluster: one volume set per option, one batched volume set, and
+# reconciling when nothing has changed.
+#
+# Every volume set is a cluster wide transaction.  The originator locks,
+# stages, commits and unlocks on each of its peers in turn and every node
+# regenerates the volume's volfiles, which clients then refetch.  The fake
+# cluster sleeps for a round trip per peer per phase, the volfile rebuild
+# and the CLI starting up.  The numbers are a model, not a measurement of a
+# real glusterd.
+#
+# Run from the top of the tree:
+#   python -m unit_tests.bench_volume_set
+
+import time
+
+import mock
+from result import Ok
+
+from gluster import volume
+from gluster.lib import GlusterOption
+
+NODES = 3
+RTT = 0.001
+PHASES = 4
+VOLFILE_REBUILD = 0.005
+CLI_STARTUP = 0.003
+OPTIONS = 30
+
+
+class FakeCluster(object):
+    def __init__(self):
+        self.transactions = 0
+        self.options = {}
+
+    def run_command(self, command, arg_list, as_root, script_mode):
+        time.sleep(CLI_STARTUP)
+        if arg_list[:2] == ["volume", "set"]:
+            self.transactions += 1
+            time.sleep(PHASES * (NODES - 1) * RTT + VOLFILE_REBUILD)
+            pairs = arg_list[3:]
+            for name, value in zip(pairs[::2], pairs[1::2]):
+                self.options[name] = str(value)
+            return Ok(b"")
+        # Read only queries are answered by the local glusterd
+        time.sleep(RTT)
+        return Ok(b"")
+
+
+def settings():
+    return [GlusterOption("bench.option-{}".format(i), i)
+            for i in range(OPTIONS)]
+
+
+def run(name, fn):
+    cluster = FakeCluster()
+    with mock.patch('gluster.volume.run_command', new=cluster.run_command), \
+            mock.patch('gluster.volume._batch_set_supported', True):
+        start = time.monotonic()
+        result = fn(cluster)
+        elapsed = time.monotonic() - start
+    assert result.is_ok(), result.value
+    print("{:10} {:3} transactions {:8.1f} ms".format(
+        name, cluster.transactions, elapsed * 1e3))
+
+
+def main():
+    run("per-option", lambda cluster: volume.volume_set_options(
+        "bench", settings()))
+    run("batched", lambda cluster: volume.volume_set_options(
+        "bench", settings(), batch=True))
+    current = {s.name: str(s.value) for s in settings()}
+    run("reconcile", lambda cluster: volume.volume_reconcile_options(
+        "bench", settings(), current=current))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# Copyright 2017 Canonical Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import mock
+from result import Err, Ok
+import threading
+import time
+import unittest
+
+from gluster import aio, lib
+
+
+def fake_run_command(outputs, calls):
+    async def run_command_async(command, arg_list, as_root, script_mode):
+        calls.append(arg_list)
+        await asyncio.sleep(0)
+        return outputs[arg_list[1]]
+    return run_command_async
+
+
+class Test(unittest.TestCase):
+    def testRunCommandAsync(self):
+        result = aio.run(aio.run_command_async("echo", ["hello"], False,
+                                               False))
+        self.assertTrue(result.is_ok())
+        self.assertEqual(b"hello\n", result.value)
+
+        result = aio.run(aio.run_command_async("false", [], False, False))
+        self.assertTrue(result.is_err())
+
+    def testRunEventLoop(self):
+        async def current_loop():
+            return asyncio.get_event_loop()
+
+        previous = asyncio.new_event_loop()
+        asyncio.set_event_loop(previous)
+        try:
+            loop = aio.run(current_loop())
+            self.assertIsNot(previous, loop)
+            self.assertTrue(loop.is_closed())
+            self.assertIs(previous, asyncio.get_event_loop())
+            # Each run gets a loop that can reap its subprocesses
+            for _ in range(2):
+                result = aio.run(aio.run_command_async("echo", ["hi"], False,
+                                                       False))
+                self.assertEqual(b"hi\n", result.value)
+            self.assertIs(previous, asyncio.get_event_loop())
+        finally:
+            asyncio.set_event_loop(None)
+            previous.close()
+
+    @mock.patch('gluster.aio._run_command_async')
+    @mock.patch('gluster.aio.run_scheduled')
+    def testRunCommandAsyncScheduled(self, _run_scheduled,
+                                     _run_command_async):
+        _run_scheduled.return_value = Ok(b"success")
+        result = aio.run(aio.run_command_async(
+            "gluster", ["volume", "set", "test", "diagnostics.brick-log-level",
+                        "info"], False, False, timeout=5))
+        self.assertEqual(Ok(b"success"), result)
+        _run_scheduled.assert_called_once_with(
+            ["gluster", "volume", "set", "test",
+             "diagnostics.brick-log-level", "info"], False, 5)
+        self.assertFalse(_run_command_async.called)
+
+    @mock.patch('gluster.lib._single_flight', new_callable=lib.SingleFlight)
+    @mock.patch('gluster.aio._run_command_async')
+    def testRunCommandAsyncCoalesced(self, _run_command_async,
+                                     _single_flight):
+        args = ["volume", "info", "test", "--xml"]
+        calls = []
+
+        async def run_once(cmd, as_root, timeout):
+            calls.append(cmd)
+            await asyncio.sleep(0.1)
+            return Ok(b"<cliOutput/>")
+        _run_command_async.side_effect = run_once
+
+        async def both():
+            return await asyncio.gather(
+                aio.run_command_async("gluster", args, True, False),
+                aio.run_command_async("gluster", args, True, False))
+
+        results = aio.run(both())
+        self.assertEqual([Ok(b"<cliOutput/>")] * 2, results)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(1, _single_flight.followers)
+
+    @mock.patch('gluster.lib._single_flight', new_callable=lib.SingleFlight)
+    @mock.patch('gluster.lib._execute')
+    @mock.patch('gluster.aio._run_command_async')
+    def testRunCommandAsyncJoinsThread(self, _run_command_async, _execute,
+                                       _single_flight):
+        # A coroutine waits for the same query running in another thread
+        args = ["volume", "info", "test", "--xml"]
+        release = threading.Event()
+
+        def slow_execute(cmd, as_root, timeout):
+            release.wait(5)
+            return Ok(b"<cliOutput/>")
+        _execute.side_effect = slow_execute
+        thread = threading.Thread(target=lib.run_command,
+                                  args=("gluster", args, True, False))
+        thread.start()
+        while _single_flight.leaders < 1:
+            time.sleep(0.01)
+
+        async def query():
+            asyncio.get_event_loop().call_later(0.1, release.set)
+            return await aio.run_command_async("gluster", args, True, False)
+
+        self.assertEqual(Ok(b"<cliOutput/>"), aio.run(query()))
+        thread.join()
+        self.assertFalse(_run_command_async.called)
+        self.assertEqual(1, _execute.call_count)
+
+    def testRunCommandAsyncTimeout(self):
+        result = aio.run(aio.run_command_async("sleep", ["10"], False, False,
+                                               timeout=0.1))
+        self.assertIsInstance(result.value, aio.CommandTimeout)
+
+    def testRunCommandAsyncCancel(self):
+        async def cancel():
+            task = asyncio.ensure_future(
+                aio.run_command_async("sleep", ["10"], False, False))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+
+        start = time.monotonic()
+        self.assertTrue(aio.run(cancel()))
+        self.assertLess(time.monotonic() - start, 5)
+
+    def testGatherBounded(self):
+        running = [0]
+        peak = [0]
+
+        async def job(i):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+            return i
+
+        results = aio.run(aio.gather_bounded([job(i) for i in range(10)],
+                                             limit=3))
+        self.assertEqual(list(range(10)), results)
+        self.assertEqual(3, peak[0])
+
+    def testVolumeInfo(self):
+        with open('unit_tests/vol_info.xml', 'rb') as f:
+            vol_info = f.read()
+        with open('unit_tests/pool_list.xml', 'rb') as f:
+            pool_list = f.read()
+        calls = []
+        outputs = {"info": Ok(vol_info), "list": Ok(pool_list)}
+        with mock.patch('gluster.aio.run_command_async',
+                        new=fake_run_command(outputs, calls)), \
+                mock.patch('gluster.peer.resolve_to_ip') as _resolve_to_ip:
+            _resolve_to_ip.return_value = Ok("172.31.39.30")
+            result = aio.run(aio.volume_info("chris"))
+        self.assertTrue(result.is_ok())
+        self.assertEqual(2, len(calls))
+        bricks = result.value[0].bricks
+        self.assertEqual(12, len(bricks))
+        self.assertEqual("172.31.39.30", str(bricks[2].peer.hostname))
+
+    @mock.patch('gluster.aio.volume_info_all_from_store')
+    def testVolumeInfoAll(self, _from_store):
+        _from_store.return_value = Err("No store")
+        with open('unit_tests/vol_info_all.xml', 'rb') as f:
+            vol_info = f.read()
+        with open('unit_tests/pool_list.xml', 'rb') as f:
+            pool_list = f.read()
+        calls = []
+        outputs = {"info": Ok(vol_info), "list": Ok(pool_list)}
+        with mock.patch('gluster.aio.run_command_async',
+                        new=fake_run_command(outputs, calls)), \
+                mock.patch('gluster.peer.resolve_to_ip') as _resolve_to_ip:
+            _resolve_to_ip.return_value = Ok("172.31.39.30")
+            result = aio.run(aio.volume_info_all())
+        self.assertEqual(["chris", "logs", "scratch"], list(result.value))
+        self.assertIn(["volume", "info", "all", "--xml"], calls)
+        self.assertEqual(2, len(calls))
+
+    def testVolumeStatusSweep(self):
+        with open('unit_tests/vol_status.xml', 'rb') as f:
+            vol_status = f.read()
+        calls = []
+        outputs = {"status": Ok(vol_status)}
+        with mock.patch('gluster.aio.run_command_async',
+                        new=fake_run_command(outputs, calls)):
+            results = aio.run(aio.gather_bounded(
+                [aio.volume_status("vol{}".format(i)) for i in range(5)],
+                limit=2))
+        self.assertEqual(5, len(results))
+        self.assertTrue(all(r.is_ok() for r in results))
+        self.assertEqual(["vol", "status", "vol4", "--xml"], calls[-1])
+
+    def testVolSet(self):
+        calls = []
+        outputs = {"set": Ok(b"")}
+        with mock.patch('gluster.aio.run_command_async',
+                        new=fake_run_command(outputs, calls)):
+            result = aio.run(aio.volume_set_options("test", [
+                aio.GlusterOption(name=aio.GlusterOption.AuthAllow,
+                                  value="*"),
+                aio.GlusterOption(name=aio.GlusterOption.NfsDisable,
+                                  value="on")]))
+        self.assertTrue(result.is_ok())
+        self.assertEqual([["volume", "set", "test", "auth.allow", "*"],
+                          ["volume", "set", "test", "nfs.disable", "on"]],
+                         calls)
+
+    @mock.patch('gluster.volume._batch_set_supported', True)
+    def testVolumeSetOptionsBatched(self):
+        calls = []
+        outputs = {"set": Ok(b"")}
+        with mock.patch('gluster.aio.run_command_async',
+                        new=fake_run_command(outputs, calls)):
+            result = aio.run(aio.volume_set_options_batched("test", [
+                aio.GlusterOption(name=aio.GlusterOption.AuthAllow,
+                                  value="*"),
+                aio.GlusterOption(name=aio.GlusterOption.NfsDisable,
+                                  value="on")]))
+        self.assertTrue(result.is_ok())
+        self.assertEqual([["volume", "set", "test", "auth.allow", "*",
+                           "nfs.disable", "on"]], calls)
+
+        calls = []
+        outputs = {"set": Err("volume set: failed")}
+        with mock.patch('gluster.aio.run_command_async',
+                        new=fake_run_command(outputs, calls)):
+            result = aio.run(aio.volume_set_options_batched("test", [
+                aio.GlusterOption(name=aio.GlusterOption.AuthAllow,
+                                  value="*"),
+                aio.GlusterOption(name=aio.GlusterOption.NfsDisable,
+                                  value="on")]))
+        self.assertEqual(["auth.allow", "nfs.disable"],
+                         sorted(result.value))
+        self.assertEqual(3, len(calls))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+# Copyright 2017 Canonical Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from ipaddress import ip_address
+import mock
+import os
+from result import Err, Ok
+import shutil
+import tempfile
+import unittest
+import uuid
+
+from gluster import cache, peer, volume
+
+peers = [
+    peer.Peer(uuid=uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8"),
+              hostname="172.31.12.7", status=peer.State.PeerInCluster),
+    peer.Peer(uuid=uuid.UUID("cebf02bb-a304-4058-986e-375e2e1e5313"),
+              hostname=ip_address("172.31.39.30"), status=None),
+]
+
+
+def bump_version(workdir, version):
+    info = os.path.join(workdir, "vols", "chris", "info")
+    with open(info) as f:
+        lines = [line for line in f if not line.startswith("version=")]
+    lines.append("version={}\n".format(version))
+    with open(info, "w") as f:
+        f.writelines(lines)
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.workdir = os.path.join(self.tmp, "glusterd")
+        shutil.copytree("unit_tests/glusterd", self.workdir)
+        self.cache_dir = os.path.join(self.tmp, "cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def new_process(self):
+        # Each hook gets a fresh DiskCache pointing at the same files
+        return cache.DiskCache(cache_dir=self.cache_dir, workdir=self.workdir)
+
+    @mock.patch('gluster.peer.peer_list')
+    def testPeerList(self, _peer_list):
+        _peer_list.return_value = Ok(peers)
+        result = self.new_process().peer_list()
+        self.assertEqual(peers, result.value)
+        result = self.new_process().peer_list()
+        self.assertEqual(1, _peer_list.call_count)
+        self.assertEqual(peers, result.value)
+        self.assertEqual("172.31.12.7", result.value[0].hostname)
+        self.assertEqual(ip_address("172.31.39.30"), result.value[1].hostname)
+        self.assertEqual(peer.State.PeerInCluster, result.value[0].status)
+
+        # A peer file changing invalidates the entry
+        with open(os.path.join(self.workdir, "peers",
+                               "663bbc5b-c9b4-4a02-8b56-85e05e1b01c8"),
+                  "a") as f:
+            f.write("hostname2=server1\n")
+        self.new_process().peer_list()
+        self.assertEqual(2, _peer_list.call_count)
+
+    @mock.patch('gluster.volume.peer_list')
+    @mock.patch('gluster.volume.run_command')
+    def testVolumeInfo(self, _run_command, _peer_list):
+        with open('unit_tests/vol_info.xml', 'rb') as f:
+            _run_command.return_value = Ok(f.read())
+        _peer_list.return_value = Ok(peers)
+
+        first = self.new_process().volume_info("chris")
+        second = self.new_process().volume_info("chris")
+        self.assertEqual(1, _run_command.call_count)
+        vol = second.value[0]
+        self.assertEqual(first.value[0].vol_type, vol.vol_type)
+        self.assertEqual(volume.Transport.Tcp, vol.transport)
+        self.assertEqual(first.value[0].options, vol.options)
+        self.assertEqual(12, len(vol.bricks))
+        self.assertEqual(uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8"),
+                         vol.bricks[0].uuid)
+        self.assertEqual("/mnt/xvdb", vol.bricks[0].path)
+        # Bricks on the same host share a Peer
+        self.assertIs(vol.bricks[0].peer, vol.bricks[3].peer)
+
+        bump_version(self.workdir, 15)
+        self.new_process().volume_info("chris")
+        self.assertEqual(2, _run_command.call_count)
+
+    @mock.patch('gluster.volume.volume_info_from_store')
+    @mock.patch('gluster.volume.run_command')
+    def testNoStore(self, _run_command, _from_store):
+        _from_store.return_value = Err("No store")
+        _run_command.return_value = Err("failed")
+        disk_cache = cache.DiskCache(cache_dir=self.cache_dir,
+                                     workdir=os.path.join(self.tmp, "none"))
+        disk_cache.volume_info("chris")
+        disk_cache.volume_info("chris")
+        self.assertEqual(2, _run_command.call_count)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    @mock.patch('gluster.peer.peer_list')
+    def testCorruptCacheFile(self, _peer_list):
+        _peer_list.return_value = Ok(peers)
+        self.new_process().peer_list()
+        with open(os.path.join(self.cache_dir, "peers.json"), "w") as f:
+            f.write("{not json")
+        result = self.new_process().peer_list()
+        self.assertEqual(peers, result.value)
+        self.assertEqual(2, _peer_list.call_count)
+
+    @mock.patch('gluster.peer.peer_list')
+    def testInvalidate(self, _peer_list):
+        _peer_list.return_value = Ok(peers)
+        disk_cache = self.new_process()
+        disk_cache.peer_list()
+        disk_cache.invalidate()
+        disk_cache.peer_list()
+        self.assertEqual(2, _peer_list.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
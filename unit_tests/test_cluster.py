@@ -0,0 +1,196 @@
+# Copyright 2017 Canonical Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import asyncio
+import mock
+from result import Err, Ok
+import time
+import unittest
+import uuid
+
+from gluster import cluster, peer, volume
+
+host_a = uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8")
+host_c = uuid.UUID("cebf02bb-a304-4058-986e-375e2e1e5313")
+
+
+def read(name):
+    with open(name, 'rb') as f:
+        return f.read()
+
+
+def fake_cluster(outputs, calls, delay=0.0):
+    # A cluster where every gluster command takes delay seconds
+    async def run_command_async(command, arg_list, as_root, script_mode):
+        calls.append(arg_list)
+        await asyncio.sleep(delay)
+        return outputs[" ".join(arg_list[:3])]
+    return run_command_async
+
+
+def cluster_outputs():
+    return {
+        "peer status --xml": Ok(read('unit_tests/peer_status.xml')),
+        "pool list --xml": Ok(read('unit_tests/pool_list.xml')),
+        "volume info all": Ok(read('unit_tests/vol_info_all.xml')),
+        "vol status all": Ok(read('unit_tests/vol_status_all_detail.xml')),
+        "volume quota logs": Ok(read('unit_tests/quota_list.xml')),
+    }
+
+
+@mock.patch('gluster.peer.resolve_to_ip', new=lambda name: Ok("172.31.39.30"))
+@mock.patch('gluster.cluster.volume_info_all_from_store',
+            new=lambda: Err("No store"))
+@mock.patch('gluster.aio.peer_list_from_store', new=lambda: Err("No store"))
+class Test(unittest.TestCase):
+    def snapshot(self, outputs, calls, delay=0.0, **kwargs):
+        with mock.patch('gluster.aio.run_command_async',
+                        new=fake_cluster(outputs, calls, delay)):
+            return cluster.cluster_snapshot(**kwargs)
+
+    def testSnapshot(self):
+        calls = []
+        result = self.snapshot(cluster_outputs(), calls, detail=True)
+        self.assertTrue(result.is_ok())
+        snapshot = result.value
+        self.assertEqual({}, snapshot.errors)
+        self.assertEqual(3, len(snapshot.peers))
+        self.assertEqual(["chris", "logs", "scratch"],
+                         list(snapshot.volumes))
+        self.assertIn(["vol", "status", "all", "detail", "--xml"], calls)
+        # Only the volume with quotas enabled is asked for them
+        self.assertEqual([["volume", "quota", "logs", "list", "--xml"]],
+                         [c for c in calls if c[1] == "quota"])
+        self.assertEqual(["/", "/test2"],
+                         [q.path for q in snapshot.quotas["logs"]])
+
+        # Bricks point at the registry's peers
+        for vol in snapshot.volumes.values():
+            for brick in vol.bricks:
+                self.assertIs(snapshot.peers.get(brick.uuid), brick.peer)
+        self.assertEqual(peer.State.PeerInCluster,
+                         snapshot.peers.get(host_a).status)
+
+        # Status rows are joined to the volume's own bricks
+        chris = snapshot.volumes["chris"]
+        status = snapshot.brick_status("chris", chris.bricks[0])
+        self.assertIs(chris.bricks[0], status.brick)
+        self.assertEqual(49152, status.tcp_port)
+        self.assertEqual("/dev/xvdb", status.detail.device)
+        self.assertEqual(6, len(snapshot.status["chris"]))
+        # chris has more bricks than the status fixture reports
+        self.assertIsNone(snapshot.brick_status("chris", chris.bricks[11]))
+        logs = snapshot.volumes["logs"]
+        self.assertFalse(snapshot.brick_status("logs", logs.bricks[1]).online)
+        self.assertNotIn("scratch", snapshot.status)
+        self.assertEqual({}, snapshot.daemons)
+
+        for phase in ("peer_status", "peer_list", "volume_info",
+                      "volume_status", "quota_list logs", "query", "quotas",
+                      "join", "total"):
+            self.assertIn(phase, snapshot.timings)
+
+    def testConcurrent(self):
+        calls = []
+        start = time.monotonic()
+        result = self.snapshot(cluster_outputs(), calls, delay=0.2)
+        elapsed = time.monotonic() - start
+        self.assertTrue(result.is_ok())
+        self.assertEqual(5, len(calls))
+        # Four queries at once then the quota list, instead of five in a row
+        self.assertLess(elapsed, 0.2 * 4)
+
+    def testLimit(self):
+        calls = []
+        start = time.monotonic()
+        self.snapshot(cluster_outputs(), calls, delay=0.1, limit=1)
+        self.assertGreaterEqual(time.monotonic() - start, 0.1 * 5)
+
+    def testPartialFailure(self):
+        outputs = cluster_outputs()
+        outputs["vol status all"] = Err("Locking failed")
+        outputs["volume quota logs"] = Err("Quota not enabled")
+        snapshot = self.snapshot(outputs, []).value
+        self.assertEqual(["quota_list logs", "volume_status"],
+                         sorted(snapshot.errors))
+        self.assertEqual("Locking failed", snapshot.errors["volume_status"])
+        self.assertEqual({}, snapshot.status)
+        self.assertEqual({}, snapshot.quotas)
+        self.assertEqual(3, len(snapshot.volumes))
+
+        outputs["pool list --xml"] = Err("Connection failed")
+        self.assertTrue(self.snapshot(outputs, []).is_err())
+        outputs = cluster_outputs()
+        outputs["volume info all"] = Err("Connection failed")
+        self.assertTrue(self.snapshot(outputs, []).is_err())
+
+    def testDaemons(self):
+        outputs = cluster_outputs()
+        status = read('unit_tests/vol_status.xml')
+        outputs["vol status all"] = Ok(status)
+        snapshot = self.snapshot(outputs, []).value
+        self.assertEqual(12, len(snapshot.status["chris"]))
+        self.assertEqual(["NFS Server", "Self-heal Daemon"] * 3,
+                         [str(d.brick.peer.hostname)
+                          for d in snapshot.daemons["chris"]])
+
+
+class TestStore(unittest.TestCase):
+    @mock.patch('gluster.cluster.volume_info_all_from_store')
+    @mock.patch('gluster.aio.peer_list_from_store')
+    def testQuotasStartWithTheOtherQueries(self, _peer_list, _from_store):
+        peers = [peer.Peer(uuid=host_a, hostname="172.31.12.7", status=None),
+                 peer.Peer(uuid=host_c, hostname="172.31.39.30",
+                           status=None)]
+        _peer_list.return_value = Ok(peers)
+        volumes = volume.parse_volume_info_all(
+            read('unit_tests/vol_info_all.xml'), peers=peers).value
+        _from_store.return_value = Ok(volumes)
+        calls = []
+        outputs = cluster_outputs()
+        start = time.monotonic()
+        with mock.patch('gluster.aio.run_command_async',
+                        new=fake_cluster(outputs, calls, delay=0.2)):
+            snapshot = cluster.cluster_snapshot().value
+        # One round of queries: peer status, vol status and the quota list
+        self.assertLess(time.monotonic() - start, 0.2 * 2)
+        self.assertEqual(3, len(calls))
+        self.assertNotIn("volume_info", snapshot.timings)
+        self.assertIn("logs", snapshot.quotas)
+        self.assertIs(snapshot.peers.get(host_a),
+                      snapshot.volumes["chris"].bricks[0].peer)
+
+    @mock.patch('gluster.cluster.volume_info_all_from_store')
+    @mock.patch('gluster.aio.peer_list_from_store')
+    def testQuotaCapitalized(self, _peer_list, _from_store):
+        peers = [peer.Peer(uuid=host_a, hostname="172.31.12.7", status=None),
+                 peer.Peer(uuid=host_c, hostname="172.31.39.30",
+                           status=None)]
+        _peer_list.return_value = Ok(peers)
+        volumes = volume.parse_volume_info_all(
+            read('unit_tests/vol_info_all.xml'), peers=peers).value
+        # The store keeps the value as it was given
+        volumes["logs"].options["features.quota"] = "On"
+        _from_store.return_value = Ok(volumes)
+        calls = []
+        with mock.patch('gluster.aio.run_command_async',
+                        new=fake_cluster(cluster_outputs(), calls)):
+            snapshot = cluster.cluster_snapshot().value
+        self.assertEqual(["/", "/test2"],
+                         [q.path for q in snapshot.quotas["logs"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
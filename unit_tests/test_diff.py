@@ -0,0 +1,158 @@
+# Copyright 2017 Canonical Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import copy
+import unittest
+import uuid
+
+from gluster import diff, peer, volume
+from gluster.diff import Change, ChangeKind
+
+host_a = uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8")
+host_b = uuid.UUID("15af92ad-ae64-4aba-89db-73730f2ca6ec")
+host_c = uuid.UUID("cebf02bb-a304-4058-986e-375e2e1e5313")
+
+
+def cluster_peers():
+    return [
+        peer.Peer(uuid=host_a, hostname="172.31.12.7",
+                  status=peer.State.PeerInCluster),
+        peer.Peer(uuid=host_b, hostname="172.31.21.242",
+                  status=peer.State.PeerInCluster),
+        peer.Peer(uuid=host_c, hostname="172.31.39.30", status=None),
+    ]
+
+
+def volumes():
+    with open('unit_tests/vol_info_all.xml', 'rb') as f:
+        return volume.parse_volume_info_all(f.read(),
+                                            peers=cluster_peers()).value
+
+
+def statuses():
+    with open('unit_tests/vol_status.xml', 'rb') as f:
+        return volume.parse_volume_status(f.read()).value
+
+
+class Test(unittest.TestCase):
+    def testNoChanges(self):
+        self.assertEqual([], diff.diff_peers(cluster_peers(),
+                                             cluster_peers()))
+        self.assertEqual([], diff.diff_volumes(volumes(), volumes()))
+        self.assertEqual([], diff.diff_brick_status("chris", statuses(),
+                                                    statuses()))
+
+    def testPeers(self):
+        new = cluster_peers()[1:]
+        new[0] = peer.Peer(uuid=host_b, hostname="172.31.21.242",
+                           status=peer.State.Disconnected)
+        added = peer.Peer(uuid=uuid.uuid4(), hostname="172.31.1.1",
+                          status=peer.State.PeerInCluster)
+        new.append(added)
+        changes = diff.diff_peers(peer.PeerRegistry(cluster_peers(),
+                                                    resolve=False), new)
+        self.assertEqual(
+            [Change(ChangeKind.PeerStateChanged, None, host_b,
+                    peer.State.PeerInCluster, peer.State.Disconnected),
+             Change(ChangeKind.PeerAdded, None, added.uuid, None, added)],
+            changes[:2])
+        self.assertEqual(ChangeKind.PeerRemoved, changes[2].kind)
+        self.assertEqual(host_a, changes[2].key)
+        self.assertEqual(3, len(changes))
+
+    def testVolumes(self):
+        old = volumes()
+        new = volumes()
+        chris = new["chris"]
+        chris.bricks.pop(0)
+        removed = old["chris"].bricks[0]
+        added = volume.Brick(uuid=host_a, peer=removed.peer,
+                             path="/mnt/xvdz", is_arbiter=False)
+        chris.bricks.append(added)
+        chris.options["nfs.disable"] = "On"
+        chris.options["features.quota"] = "on"
+        del chris.options["diagnostics.stats-dump-interval"]
+        new["logs"].status = "2"
+        del new["scratch"]
+        new["fresh"] = copy.copy(old["scratch"])
+        new["fresh"].name = "fresh"
+
+        changes = diff.diff_volumes(old, list(new.values()))
+        by_kind = {}
+        for change in changes:
+            by_kind.setdefault(change.kind, []).append(change)
+        self.assertEqual(
+            [Change(ChangeKind.BrickAdded, "chris", (host_a, "/mnt/xvdz"),
+                    None, added)], by_kind[ChangeKind.BrickAdded])
+        self.assertEqual(
+            [Change(ChangeKind.BrickRemoved, "chris", (host_a, "/mnt/xvdb"),
+                    removed, None)], by_kind[ChangeKind.BrickRemoved])
+        self.assertEqual(
+            [Change(ChangeKind.OptionChanged, "chris", "nfs.disable", "Off",
+                    "On")], by_kind[ChangeKind.OptionChanged])
+        self.assertEqual(
+            [Change(ChangeKind.OptionAdded, "chris", "features.quota", None,
+                    "on")], by_kind[ChangeKind.OptionAdded])
+        self.assertEqual(
+            [Change(ChangeKind.OptionRemoved, "chris",
+                    "diagnostics.stats-dump-interval", "30", None)],
+            by_kind[ChangeKind.OptionRemoved])
+        self.assertEqual(
+            [Change(ChangeKind.VolumeStatusChanged, "logs", "logs", "1",
+                    "2")], by_kind[ChangeKind.VolumeStatusChanged])
+        self.assertEqual(["fresh"],
+                         [c.key for c in by_kind[ChangeKind.VolumeAdded]])
+        self.assertEqual(["scratch"],
+                         [c.key for c in by_kind[ChangeKind.VolumeRemoved]])
+        self.assertEqual({"chris", "logs", "fresh", "scratch"},
+                         diff.changed_volumes(changes))
+
+    def testBrickStatus(self):
+        old = statuses()
+        new = statuses()
+        new[0].online = False
+        # The self-heal daemon on host_a shares its path with the NFS server
+        new[17].online = False
+        old[5].online = False
+        changes = diff.diff_brick_status("chris", old, new[:-3] + new[-2:])
+        self.assertEqual([ChangeKind.BrickOffline, ChangeKind.BrickOnline,
+                          ChangeKind.BrickOffline],
+                         [c.kind for c in changes])
+        self.assertEqual((host_a, "/mnt/xvdb", "172.31.12.7"), changes[0].key)
+        self.assertIs(new[0], changes[0].new)
+        self.assertEqual((host_c, "/mnt/xvdh", "172.31.39.30"), changes[1].key)
+        self.assertEqual("Self-heal Daemon", changes[2].key[2])
+
+    def testSnapshots(self):
+        class Snapshot(object):
+            def __init__(self, peers, volumes, status):
+                self.peers = peers
+                self.volumes = volumes
+                self.status = status
+                self.daemons = {}
+
+        old = Snapshot(cluster_peers(), volumes(), {"chris": statuses()})
+        new = Snapshot(cluster_peers(), volumes(), {"chris": statuses()})
+        self.assertEqual([], diff.diff_snapshots(old, new))
+        new.status["chris"][3].online = False
+        del new.volumes["logs"].options["features.shard"]
+        changes = diff.diff_snapshots(old, new)
+        self.assertEqual([ChangeKind.OptionRemoved, ChangeKind.BrickOffline],
+                         [c.kind for c in changes])
+        self.assertEqual({"chris", "logs"}, diff.changed_volumes(changes))
+
+
+if __name__ == "__main__":
+    unittest.main()
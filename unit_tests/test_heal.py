@@ -12,22 +12,375 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+
 import mock
+import os
+from result import Err, Ok
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
 import unittest
 from unittest.mock import MagicMock
+import uuid
 
 from gluster import heal
 
 
+def make_brick(root, name, pending):
+    # A brick whose xattrop index has the base file plus pending gfids
+    path = os.path.join(root, name)
+    index = os.path.join(path, ".glusterfs", "indices", "xattrop")
+    os.makedirs(index)
+    open(os.path.join(index, "xattrop-4a8bb4bb-4f1c-4a3e-9b6a-0c1d2e3f4a5b"),
+         "w").close()
+    for i in range(pending):
+        os.link(os.path.join(index, "xattrop-4a8bb4bb-4f1c-4a3e-9b6a-"
+                                    "0c1d2e3f4a5b"),
+                os.path.join(index, "{:08x}-0000-0000-0000-000000000000"
+                                    "".format(i)))
+    return MagicMock(path=path)
+
+
 class Test(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
 
-    @mock.patch('os.listdir')
-    def testGetHealCount(self, _listdir):
-        _listdir.return_value = ['xattrop_one', 'healme', 'andme']
-        brick = MagicMock(path='/export/brick1/')
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testGetHealCount(self):
+        brick = make_brick(self.tmp, "brick1", 2)
         count = heal.get_self_heal_count(brick)
         self.assertEqual(2, count, "Expected 2 objects to need healing")
 
+    def testAtLeast(self):
+        brick = make_brick(self.tmp, "brick1", 50)
+        self.assertEqual(10, heal.get_self_heal_count(brick, at_least=10))
+        self.assertEqual(50, heal.get_self_heal_count(brick, at_least=100))
+        self.assertEqual(0, heal.get_self_heal_count(
+            make_brick(self.tmp, "brick2", 0), at_least=1))
+        self.assertEqual(0, heal.get_self_heal_count(brick, at_least=0))
+        self.assertEqual(0, heal.get_self_heal_count(brick, at_least=-1))
+
+    def testMemoryIsFlat(self):
+        brick = make_brick(self.tmp, "brick1", 20000)
+        tracemalloc.start()
+        try:
+            self.assertEqual(20000, heal.get_self_heal_count(brick))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        # A list of 20000 names alone would be over a megabyte
+        self.assertLess(peak, 64 * 1024)
+
+    def testCountBricks(self):
+        bricks = {
+            "chris": [make_brick(self.tmp, "a", 3),
+                      make_brick(self.tmp, "b", 5)],
+            "logs": [make_brick(self.tmp, "c", 1),
+                     MagicMock(path=os.path.join(self.tmp, "missing"))],
+        }
+        counts = heal.count_bricks(bricks, max_workers=2)
+        self.assertEqual({os.path.join(self.tmp, "a"): 3,
+                          os.path.join(self.tmp, "b"): 5},
+                         counts.bricks["chris"])
+        self.assertEqual({"chris": 8, "logs": 1}, counts.volumes())
+        self.assertEqual(9, counts.total())
+        self.assertEqual([os.path.join(self.tmp, "missing")],
+                         list(counts.errors["logs"]))
+
+        counts = heal.count_bricks(bricks, at_least=2)
+        self.assertEqual({"chris": 4, "logs": 1}, counts.volumes())
+        self.assertEqual(0, heal.count_bricks({}).total())
+
+    @mock.patch('gluster.heal.get_all_local_bricks')
+    def testGetLocalHealCounts(self, _get_all_local_bricks):
+        _get_all_local_bricks.return_value = Ok(
+            {"chris": [make_brick(self.tmp, "a", 4)]})
+        counts = heal.get_local_heal_counts().value
+        self.assertEqual(4, counts.volume_total("chris"))
+        self.assertEqual(0, counts.volume_total("logs"))
+
+        _get_all_local_bricks.return_value = Err("No volumes")
+        self.assertTrue(heal.get_local_heal_counts().is_err())
+
+    def index_path(self, name, gfid):
+        return os.path.join(self.tmp, name, ".glusterfs", "indices",
+                            "xattrop", gfid)
+
+    def testHealTracker(self):
+        a = make_brick(self.tmp, "a", 3)
+        b = make_brick(self.tmp, "b", 0)
+        with heal.HealTracker({"chris": [a, b]}) as tracker:
+            self.assertTrue(tracker.open().is_ok())
+            self.assertEqual(3, tracker.count("chris", a))
+            self.assertEqual(0, tracker.count("chris", b))
+
+            base = self.index_path(
+                "a", "xattrop-4a8bb4bb-4f1c-4a3e-9b6a-0c1d2e3f4a5b")
+            os.link(base, self.index_path("b", "aaaaaaaa"))
+            os.link(base, self.index_path("b", "bbbbbbbb"))
+            os.unlink(self.index_path(
+                "a", "00000000-0000-0000-0000-000000000000"))
+            # Not a pending heal
+            os.link(base, self.index_path("b", "xattrop-1"))
+            os.rename(self.index_path("b", "aaaaaaaa"),
+                      self.index_path("a", "aaaaaaaa"))
+            self.assertEqual(6, tracker.process_events(timeout=1))
+            self.assertEqual(3, tracker.count("chris", a))
+            self.assertEqual(1, tracker.count("chris", b))
+            self.assertEqual(4, tracker.counts().volume_total("chris"))
+            self.assertEqual(0, tracker.process_events())
+
+    def testHealTrackerOverflow(self):
+        a = make_brick(self.tmp, "a", 2)
+        with heal.HealTracker({"chris": [a]}) as tracker:
+            tracker.open()
+            tracker._counts[("chris", a.path)] = 100
+            tracker._handle(-1, heal.IN_Q_OVERFLOW, b"")
+            self.assertEqual(2, tracker.count("chris", a))
+            self.assertEqual(1, tracker.overflows)
+
+    def testHealTrackerIndexGone(self):
+        a = make_brick(self.tmp, "a", 2)
+        missing = MagicMock(path=os.path.join(self.tmp, "missing"))
+        with heal.HealTracker({"chris": [a, missing]}) as tracker:
+            tracker.open()
+            self.assertIsNone(tracker.count("chris", missing))
+            self.assertIn(missing.path, tracker.counts().errors["chris"])
+
+            shutil.rmtree(a.path)
+            tracker.process_events(timeout=1)
+            self.assertIsNone(tracker.count("chris", a))
+            self.assertIn(a.path, tracker.counts().errors["chris"])
+
+            # refresh watches the brick again once it's back
+            make_brick(self.tmp, "a", 1)
+            tracker.refresh()
+            self.assertEqual(1, tracker.count("chris", a))
+
+    def testHealTrackerRescanError(self):
+        a = make_brick(self.tmp, "a", 2)
+        with heal.HealTracker({"chris": [a]}) as tracker:
+            tracker.open()
+            with mock.patch('gluster.heal.get_self_heal_count',
+                            side_effect=OSError("Input/output error")):
+                tracker._handle(-1, heal.IN_Q_OVERFLOW, b"")
+            self.assertIsNone(tracker.count("chris", a))
+            self.assertIn(a.path, tracker.counts().errors["chris"])
+
+            # The brick is no longer watched so new entries are ignored
+            base = self.index_path(
+                "a", "xattrop-4a8bb4bb-4f1c-4a3e-9b6a-0c1d2e3f4a5b")
+            os.link(base, self.index_path("a", "aaaaaaaa"))
+            tracker.process_events(timeout=0.1)
+            self.assertIsNone(tracker.count("chris", a))
+
+            tracker.refresh()
+            self.assertEqual(3, tracker.count("chris", a))
+
+    @mock.patch('gluster.heal.get_all_local_bricks')
+    def testHealTrackerRefreshWhileHandling(self, _get_all_local_bricks):
+        a = make_brick(self.tmp, "a", 1)
+        b = make_brick(self.tmp, "b", 2)
+        _get_all_local_bricks.return_value = Ok({"chris": [a, b]})
+        get_self_heal_count = heal.get_self_heal_count
+
+        def count(brick):
+            # Another thread drops b while an overflow rescan is on a.  It
+            # has to wait for the rescan to finish.
+            if brick is a:
+                _get_all_local_bricks.return_value = Ok({"chris": [a]})
+                refresh = threading.Thread(target=tracker.refresh)
+                refresh.start()
+                refresh.join(0.2)
+                self.assertTrue(refresh.is_alive())
+                threads.append(refresh)
+            return get_self_heal_count(brick)
+
+        threads = []
+        with heal.HealTracker() as tracker:
+            tracker.open()
+            with mock.patch('gluster.heal.get_self_heal_count', new=count):
+                tracker._handle(-1, heal.IN_Q_OVERFLOW, b"")
+            threads[0].join()
+            self.assertEqual(1, tracker.count("chris", a))
+            self.assertIsNone(tracker.count("chris", b))
+
+    @mock.patch('gluster.inotify.READ_SIZE', 256)
+    def testHealTrackerProcessEventsBounded(self):
+        a = make_brick(self.tmp, "a", 0)
+        with heal.HealTracker({"chris": [a]}) as tracker:
+            tracker.open()
+            base = self.index_path(
+                "a", "xattrop-4a8bb4bb-4f1c-4a3e-9b6a-0c1d2e3f4a5b")
+            for i in range(20):
+                os.link(base, self.index_path("a", "{:08x}".format(i)))
+            # Each call reads at most READ_SIZE bytes of events
+            handled = tracker.process_events(timeout=1)
+            self.assertLess(handled, 20)
+            while handled < 20:
+                handled += tracker.process_events()
+            self.assertEqual(20, tracker.count("chris", a))
+
+    @mock.patch('gluster.heal.get_all_local_bricks')
+    def testHealTrackerLocalBricks(self, _get_all_local_bricks):
+        a = make_brick(self.tmp, "a", 1)
+        b = make_brick(self.tmp, "b", 2)
+        _get_all_local_bricks.return_value = Ok({"chris": [a]})
+        tracker = heal.HealTracker()
+        try:
+            self.assertTrue(tracker.open().is_ok())
+            self.assertEqual({"chris": 1}, tracker.counts().volumes())
+
+            _get_all_local_bricks.return_value = Ok({"logs": [b]})
+            tracker.refresh()
+            self.assertEqual({"logs": 2}, tracker.counts().volumes())
+
+            tracker.start(poll_interval=0.05)
+            os.unlink(self.index_path(
+                "b", "00000000-0000-0000-0000-000000000000"))
+            for _ in range(100):
+                if tracker.count("logs", b) == 1:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(1, tracker.count("logs", b))
+
+            _get_all_local_bricks.return_value = Err("No volumes")
+            self.assertTrue(tracker.refresh().is_err())
+        finally:
+            tracker.close()
+
+    def testParseHealInfo(self):
+        with open('unit_tests/heal_info.xml', 'r') as xml_output:
+            bricks = heal.parse_heal_info(xml_output.read()).value
+        self.assertEqual(3, len(bricks))
+        first, offline, third = bricks
+        self.assertEqual("172.31.12.7", first.host)
+        self.assertEqual("/mnt/xvdf", first.path)
+        self.assertEqual(uuid.UUID("15af92ad-ae64-4aba-89db-73730f2ca6ec"),
+                         first.host_uuid)
+        self.assertEqual("Connected", first.status)
+        self.assertEqual(3, first.total)
+        self.assertIsNone(first.pending)
+        self.assertEqual(["/dir/file1", "/dir/file2", None],
+                         [e.path for e in first.entries])
+        self.assertEqual([False, True, False],
+                         [e.split_brain for e in first.entries])
+        self.assertEqual(uuid.UUID("e0a1b2c3-d4e5-4f60-8a7b-9c0d1e2f3a4b"),
+                         first.entries[2].gfid)
+        self.assertEqual("172.31.12.7", first.entries[0].host)
+
+        self.assertIsNone(offline.host_uuid)
+        self.assertIsNone(offline.total)
+        self.assertEqual([], offline.entries)
+        self.assertTrue(third.entries[0].possibly_healing)
+        self.assertEqual("/dir/file1", third.entries[0].path)
+
+    def testParseHealInfoSplitBrain(self):
+        with open('unit_tests/heal_info.xml', 'rb') as xml_output:
+            entries = list(heal.stream_heal_entries(xml_output,
+                                                    split_brain=True))
+        self.assertEqual(4, len(entries))
+        self.assertTrue(all(e.split_brain for e in entries))
+
+    def testStreamHealInfo(self):
+        # Entries come before the brick they're on
+        with open('unit_tests/heal_info.xml', 'rb') as xml_output:
+            kinds = [type(record).__name__
+                     for record in heal.stream_heal_info(xml_output)]
+        self.assertEqual(["HealEntry", "HealEntry", "HealEntry",
+                          "BrickHealInfo", "BrickHealInfo", "HealEntry",
+                          "BrickHealInfo"], kinds)
+
+    def testParseHealInfoFailure(self):
+        output = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<cliOutput>
+  <opRet>-1</opRet>
+  <opErrno>2</opErrno>
+  <opErrstr>Volume chris does not exist</opErrstr>
+</cliOutput>"""
+        result = heal.parse_heal_info(output)
+        self.assertTrue(result.is_err())
+        self.assertIn("does not exist", result.value)
+
+    def testParseHealSummary(self):
+        with open('unit_tests/heal_info_summary.xml', 'r') as xml_output:
+            bricks = heal.parse_heal_summary(xml_output.read()).value
+        self.assertEqual(2, len(bricks))
+        self.assertEqual((3, 1, 1, 1), (bricks[0].total, bricks[0].pending,
+                                        bricks[0].split_brain,
+                                        bricks[0].possibly_healing))
+        self.assertEqual((None, None), (bricks[1].total, bricks[1].pending))
+
+    def testParseHealCount(self):
+        output = b"""Gathering count of entries to be healed on volume chris \
+has been successful
+
+Brick 172.31.12.7:/mnt/xvdf
+Number of entries: 12
+
+Brick 172.31.21.242:/mnt/xvdf
+Status: Transport endpoint is not connected
+Number of entries: -
+"""
+        bricks = heal.parse_heal_count(output).value
+        self.assertEqual(["172.31.12.7", "172.31.21.242"],
+                         [b.host for b in bricks])
+        self.assertEqual([12, None], [b.total for b in bricks])
+        self.assertEqual("Transport endpoint is not connected",
+                         bricks[1].status)
+        with open('unit_tests/heal_info_summary.xml', 'rb') as xml_output:
+            self.assertEqual(3, heal.parse_heal_count(
+                xml_output.read()).value[0].total)
+
+    @mock.patch('gluster.heal.run_command')
+    def testHealInfo(self, _run_command):
+        with open('unit_tests/heal_info.xml', 'r') as xml_output:
+            _run_command.return_value = Ok(xml_output.read())
+        bricks = heal.heal_info("chris", split_brain=True).value
+        _run_command.assert_called_with(
+            "gluster", ["volume", "heal", "chris", "info", "split-brain",
+                        "--xml"], True, False)
+        self.assertTrue(bricks[0].entries[0].split_brain)
+
+        _run_command.return_value = Err("failed")
+        self.assertTrue(heal.heal_info("chris").is_err())
+
+    @mock.patch('gluster.heal.run_command')
+    def testHealSummary(self, _run_command):
+        with open('unit_tests/heal_info_summary.xml', 'r') as xml_output:
+            summary = xml_output.read()
+        _run_command.return_value = Ok(summary)
+        self.assertEqual(1, heal.heal_summary("chris").value[0].pending)
+        _run_command.assert_called_once_with(
+            "gluster", ["volume", "heal", "chris", "info", "summary",
+                        "--xml"], True, False)
+
+        # Releases without info summary
+        _run_command.reset_mock()
+        _run_command.side_effect = [
+            Err("Usage: volume heal <VOLNAME>"),
+            Ok("Brick 172.31.12.7:/mnt/xvdf\nNumber of entries: 5\n")]
+        self.assertEqual(5, heal.heal_summary("chris").value[0].total)
+        _run_command.assert_called_with(
+            "gluster", ["volume", "heal", "chris", "statistics",
+                        "heal-count", "--xml"], True, False)
+
+    @mock.patch('gluster.heal.command_stream')
+    def testIterHealEntries(self, _command_stream):
+        xml_output = open('unit_tests/heal_info.xml', 'rb')
+        _command_stream.return_value = xml_output
+        entries = heal.iter_heal_entries("chris")
+        self.assertEqual("/dir/file1", next(entries).path)
+        entries.close()
+        self.assertTrue(xml_output.closed)
+        _command_stream.assert_called_with(
+            "gluster", ["volume", "heal", "chris", "info", "--xml"], True,
+            False)
+
 
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
@@ -12,21 +12,448 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import fcntl
 import mock
+import os
+import shutil
+import tempfile
+import threading
 import unittest
 from gluster import lib
 from ipaddress import ip_address
-from result import Ok
+from result import Err, Ok
+import socket
+import subprocess
+import time
+import uuid
+
+
+class TestBuildCommand(unittest.TestCase):
+    def test(self):
+        self.assertEqual(
+            ["sudo", "gluster", "--mode=script", "volume", "start", "test"],
+            lib.build_command("gluster", ["volume", "start", "test"], True,
+                              True))
+        self.assertEqual(["ip", "route"],
+                         lib.build_command("ip", ["route"], False, False))
+
+
+class TestIntern(unittest.TestCase):
+    def testInternUuid(self):
+        text = "663bbc5b-c9b4-4a02-8b56-85e05e1b01c8"
+        first = lib.intern_uuid(text)
+        self.assertEqual(uuid.UUID(text), first)
+        self.assertIs(first, lib.intern_uuid(" {}\n".format(text)))
+        self.assertIs(first, lib.intern_uuid(uuid.UUID(text)))
+        self.assertIsNone(lib.intern_uuid(None))
+        with self.assertRaises(ValueError):
+            lib.intern_uuid("N/A")
+
+    def testInternStr(self):
+        a = "".join(["/mnt/", "xvdb"])
+        b = "".join(["/mnt/", "xvdb"])
+        self.assertIs(lib.intern_str(a), lib.intern_str(b))
+        address = ip_address("172.31.12.7")
+        self.assertIs(address, lib.intern_str(address))
+
+
+class TestIterCliXml(unittest.TestCase):
+    records = ["cliOutput/volQuota/limit"]
+
+    def testRecords(self):
+        with open('unit_tests/quota_list.xml', 'rb') as f:
+            paths = [elem.findtext("path") for _, elem in
+                     lib.iter_cli_xml(f.read(), self.records)]
+        self.assertEqual(["/", "/test2"], paths)
+
+    def testPipe(self):
+        process = subprocess.Popen(["cat", "unit_tests/vol_status.xml"],
+                                   stdout=subprocess.PIPE)
+        try:
+            nodes = [elem.findtext("pid") for _, elem in lib.iter_cli_xml(
+                process.stdout, ["cliOutput/volStatus/volumes/volume/node"])]
+        finally:
+            process.stdout.close()
+            process.wait()
+        self.assertEqual(18, len(nodes))
+        self.assertEqual("23772", nodes[0])
+
+    def testWildcard(self):
+        with open('unit_tests/vol_status.xml', 'rb') as f:
+            tags = [elem.tag for _, elem in lib.iter_cli_xml(
+                f, ["cliOutput/volStatus/volumes/volume/*"])]
+        self.assertEqual(["volName", "nodeCount"], tags[:2])
+        self.assertEqual(["node"] * 18 + ["tasks"], tags[2:])
+
+    def testRecordsAreDiscarded(self):
+        with open('unit_tests/quota_list.xml', 'rb') as f:
+            elems = [elem for _, elem in lib.iter_cli_xml(f, self.records)]
+        self.assertEqual([0, 0], [len(elem) for elem in elems])
+
+    def testCommandFailed(self):
+        xml = ("<cliOutput><opRet>-1</opRet><opErrno>2</opErrno>"
+               "<opErrstr>Volume test does not exist</opErrstr></cliOutput>")
+        with self.assertRaisesRegex(lib.GlusterError, "does not exist"):
+            list(lib.iter_cli_xml(xml, self.records))
+
+    def testMalformed(self):
+        with self.assertRaises(lib.GlusterError):
+            list(lib.iter_cli_xml("<cliOutput><opRet>0</opRet>",
+                                  self.records))
+
+
+class TestCommandStream(unittest.TestCase):
+    def testReadToEnd(self):
+        with lib.command_stream("echo", ["hello"], False, False) as stdout:
+            self.assertEqual(b"hello\n", stdout.read())
+
+    def testFailure(self):
+        with self.assertRaisesRegex(lib.GlusterError, "went wrong"):
+            with lib.command_stream(
+                    "sh", ["-c", "echo went wrong >&2; exit 1"], False,
+                    False) as stdout:
+                stdout.read()
+
+    def testStopEarly(self):
+        start = time.monotonic()
+        with lib.command_stream("sh", ["-c", "echo first; sleep 10"], False,
+                                False) as stdout:
+            self.assertEqual(b"first\n", stdout.readline())
+        self.assertLess(time.monotonic() - start, 5)
+
+    def testTimeout(self):
+        with self.assertRaises(lib.CommandTimeout):
+            with lib.command_stream("sleep", ["10"], False, False,
+                                    timeout=0.1) as stdout:
+                stdout.read()
+
+    def testMutatingCommand(self):
+        with self.assertRaises(lib.GlusterError):
+            with lib.command_stream("gluster", ["volume", "start", "test"],
+                                    True, False):
+                pass
+
+
+class TestRunCommand(unittest.TestCase):
+    def tearDown(self):
+        lib.set_command_timeout(None)
+
+    def testOk(self):
+        result = lib.run_command("echo", ["hello"], False, False)
+        self.assertEqual(b"hello\n", result.value)
+        result = lib.run_command("sh", ["-c", "echo oops >&2; exit 1"],
+                                 False, False)
+        self.assertTrue(result.is_err())
+        self.assertEqual(b"oops\n", result.value)
+
+    def testTimeout(self):
+        start = time.monotonic()
+        # The background sleep is in the same process group and is killed too
+        result = lib.run_command("sh", ["-c", "sleep 10 & sleep 10"], False,
+                                 False, timeout=0.2)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertTrue(result.is_err())
+        self.assertIsInstance(result.value, lib.CommandTimeout)
+        self.assertGreaterEqual(result.value.elapsed, 0.2)
+        self.assertIn("timed out after", str(result.value))
+
+    def testDefaultTimeout(self):
+        lib.set_command_timeout(0.1)
+        result = lib.run_command("sleep", ["10"], False, False)
+        self.assertIsInstance(result.value, lib.CommandTimeout)
+
+    def testDeadline(self):
+        with lib.command_deadline(0.2):
+            result = lib.run_command("sleep", ["10"], False, False,
+                                     timeout=30)
+            self.assertIsInstance(result.value, lib.CommandTimeout)
+            # The budget is spent so nothing else gets started
+            result = lib.run_command("echo", [], False, False)
+            self.assertIsInstance(result.value, lib.CommandTimeout)
+            self.assertEqual(0.0, result.value.elapsed)
+        self.assertIsNone(lib.command_timeout())
+
+    def testDeadlinePerThread(self):
+        entered = threading.Event()
+        leave = threading.Event()
+        seen = []
+
+        def other():
+            with lib.command_deadline(60):
+                entered.set()
+                leave.wait(5)
+            seen.append(lib.command_timeout())
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        entered.wait(5)
+        # The other thread's deadline doesn't apply here
+        self.assertIsNone(lib.command_timeout())
+        with lib.command_deadline(0.5):
+            # Leaving the other block doesn't clear this one
+            leave.set()
+            thread.join(5)
+            self.assertLessEqual(lib.command_timeout(), 0.5)
+        self.assertEqual([None], seen)
+        self.assertIsNone(lib.command_timeout())
+
+
+class TestCommandScheduler(unittest.TestCase):
+    busy = Err(b"volume set: failed: Another transaction is in progress "
+               b"for test. Please try again after some time.")
+
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.scheduler = lib.CommandScheduler(
+            lock_path=os.path.join(self.lock_dir, "lock"), max_retries=3,
+            base_delay=0.001, max_delay=0.002)
+
+    def tearDown(self):
+        shutil.rmtree(self.lock_dir)
+
+    def testIsReadOnly(self):
+        read_only = [
+            ["pool", "list", "--xml"],
+            ["peer", "status", "--xml"],
+            ["volume", "info", "test", "--xml"],
+            ["vol", "status", "test", "--xml"],
+            ["volume", "quota", "test", "list", "--xml"],
+            ["volume", "bitrot", "test", "scrub", "status"],
+            ["volume", "heal", "test", "statistics"],
+            ["volume", "heal", "test", "info", "summary", "--xml"],
+            ["volume", "rebalance", "test", "status"],
+            ["volume", "remove-brick", "test", "replica", "2", "h1:/b1",
+             "h2:/b2", "status"],
+            ["volume", "geo-replication", "test", "h::slave", "status"],
+            ["volume", "geo-replication", "status"],
+        ]
+        mutating = [
+            ["volume", "set", "test", "auth.allow", "*"],
+            ["volume", "create", "test", "host:/brick"],
+            ["volume", "quota", "test", "limit-usage", "/info", "10"],
+            ["peer", "probe", "host"],
+            ["volume", "set", "test", "diagnostics.brick-log-level",
+             "info"],
+            ["volume", "set", "test", "nfs.export-dir", "/status"],
+            ["volume", "reset", "test", "status"],
+            ["volume", "heal", "test", "full"],
+            ["volume", "bitrot", "test", "scrub", "pause"],
+            ["volume", "remove-brick", "test", "h1:/b1", "commit"],
+            ["volume", "geo-replication", "test", "h::slave", "config",
+             "log-level", "status"],
+        ]
+        for args in read_only:
+            self.assertTrue(lib.is_read_only("gluster", args), args)
+        for args in mutating:
+            self.assertFalse(lib.is_read_only("gluster", args), args)
+        self.assertTrue(lib.is_read_only("ip", ["route", "add"]))
+
+    @mock.patch("gluster.lib._execute")
+    def testRetryOnContention(self, _execute):
+        _execute.side_effect = [self.busy, self.busy, Ok(b"success")]
+        result = self.scheduler.run(["gluster", "volume", "set"], True, None)
+        self.assertTrue(result.is_ok())
+        self.assertEqual(3, _execute.call_count)
+        self.assertEqual(2, self.scheduler.stats.retries)
+        self.assertEqual(1, self.scheduler.stats.serialized)
+
+    @mock.patch("gluster.lib._execute")
+    def testRetriesRunOut(self, _execute):
+        _execute.return_value = self.busy
+        result = self.scheduler.run(["gluster", "volume", "set"], True, None)
+        self.assertEqual(self.busy, result)
+        self.assertEqual(4, _execute.call_count)
+
+    @mock.patch("gluster.lib._execute")
+    def testNoRetryOnOtherErrors(self, _execute):
+        _execute.return_value = Err(b"volume set: failed: no such volume")
+        result = self.scheduler.run(["gluster", "volume", "set"], True, None)
+        self.assertTrue(result.is_err())
+        self.assertEqual(1, _execute.call_count)
+
+    @mock.patch("gluster.lib._execute")
+    def testLockHeldElsewhere(self, _execute):
+        _execute.return_value = Ok(b"")
+        with open(self.scheduler.lock_path, "a") as held:
+            fcntl.flock(held, fcntl.LOCK_EX)
+            result = self.scheduler.run(["gluster", "volume", "set"], True,
+                                        0.2)
+        self.assertIsInstance(result.value, lib.CommandTimeout)
+        _execute.assert_not_called()
+        self.assertGreaterEqual(self.scheduler.stats.lock_wait_time, 0.2)
+
+    @mock.patch("gluster.lib._scheduler")
+    @mock.patch("gluster.lib._execute")
+    def testReadOnlyBypass(self, _execute, _scheduler):
+        _execute.return_value = Ok(b"")
+        lib.run_command("gluster", ["volume", "info", "test", "--xml"],
+                        True, False)
+        _scheduler.run.assert_not_called()
+        lib.run_command("gluster", ["volume", "start", "test"], True, True)
+        _scheduler.run.assert_called_once_with(
+            ["sudo", "gluster", "--mode=script", "volume", "start", "test"],
+            True, None)
+
+
+class TestSingleFlight(unittest.TestCase):
+    @mock.patch("gluster.lib._single_flight", new_callable=lib.SingleFlight)
+    @mock.patch("gluster.lib._execute")
+    def testCoalesce(self, _execute, _single_flight):
+        release = threading.Event()
+
+        def slow_execute(cmd, as_root, timeout):
+            release.wait(5)
+            return Ok(b"<cliOutput/>")
+        _execute.side_effect = slow_execute
+
+        results = []
+
+        def query():
+            results.append(lib.run_command(
+                "gluster", ["volume", "info", "test", "--xml"], True, False))
+        threads = [threading.Thread(target=query) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while _single_flight.followers < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, _execute.call_count)
+        self.assertEqual(1, _single_flight.leaders)
+        self.assertEqual(5, len(results))
+        for result in results:
+            self.assertEqual(b"<cliOutput/>", result.value)
+
+        # Once the flight has landed the next call runs again
+        lib.run_command("gluster", ["volume", "info", "test", "--xml"], True,
+                        False)
+        self.assertEqual(2, _execute.call_count)
+
+    @mock.patch("gluster.lib._single_flight")
+    @mock.patch("gluster.lib._scheduler")
+    def testMutatingNotCoalesced(self, _scheduler, _single_flight):
+        lib.run_command("gluster", ["volume", "stop", "test"], True, True)
+        _single_flight.do.assert_not_called()
+
+
+class TestReadCache(unittest.TestCase):
+    vol_info = ["volume", "info", "test", "--xml"]
+    vol_status = ["vol", "status", "other", "--xml"]
+    pool_list = ["pool", "list", "--xml"]
+
+    def setUp(self):
+        lib.enable_read_cache(ttl=60, max_entries=8)
+        self.stats = lib.read_cache_stats()
+        self.stats.__init__()
+
+    def tearDown(self):
+        lib.disable_read_cache()
+
+    def testCacheScope(self):
+        self.assertEqual(("volume", "test"), lib.cache_scope(self.vol_info))
+        self.assertEqual(("volume", None),
+                         lib.cache_scope(["volume", "list", "--xml"]))
+        self.assertEqual(("volume", None),
+                         lib.cache_scope(["volume", "info", "all", "--xml"]))
+        self.assertEqual(("peer", None), lib.cache_scope(self.pool_list))
+        self.assertEqual(("peer", None),
+                         lib.cache_scope(["peer", "probe", "host"]))
+
+    @mock.patch("gluster.lib._scheduler")
+    @mock.patch("gluster.lib._execute")
+    def testHitsAndInvalidation(self, _execute, _scheduler):
+        _execute.return_value = Ok(b"<cliOutput/>")
+        _scheduler.run.return_value = Ok(b"")
+        for args in (self.vol_info, self.vol_status, self.pool_list):
+            lib.run_command("gluster", args, True, False)
+            lib.run_command("gluster", args, True, False)
+        self.assertEqual(3, _execute.call_count)
+        self.assertEqual(3, self.stats.hits)
+        self.assertEqual(3, self.stats.misses)
+
+        # Setting an option on test only drops test's entries
+        lib.run_command("gluster", ["volume", "set", "test", "a", "b"], True,
+                        True)
+        lib.run_command("gluster", self.vol_info, True, False)
+        lib.run_command("gluster", self.vol_status, True, False)
+        lib.run_command("gluster", self.pool_list, True, False)
+        self.assertEqual(4, _execute.call_count)
+
+        # Probing a peer only drops the peer entries
+        lib.run_command("gluster", ["peer", "probe", "host"], True, False)
+        lib.run_command("gluster", self.vol_info, True, False)
+        lib.run_command("gluster", self.pool_list, True, False)
+        self.assertEqual(5, _execute.call_count)
+        self.assertEqual(2, self.stats.invalidations)
+
+    @mock.patch("gluster.lib._execute")
+    def testErrorsNotCached(self, _execute):
+        _execute.return_value = Err(b"failed")
+        lib.run_command("gluster", self.vol_info, True, False)
+        lib.run_command("gluster", self.vol_info, True, False)
+        self.assertEqual(2, _execute.call_count)
+
+    @mock.patch("gluster.lib._execute")
+    def testExpiryAndBound(self, _execute):
+        _execute.return_value = Ok(b"<cliOutput/>")
+        lib.enable_read_cache(ttl=0, max_entries=8)
+        lib.run_command("gluster", self.vol_info, True, False)
+        lib.run_command("gluster", self.vol_info, True, False)
+        self.assertEqual(2, _execute.call_count)
+
+        lib.enable_read_cache(ttl=60, max_entries=1)
+        lib.run_command("gluster", self.vol_info, True, False)
+        lib.run_command("gluster", self.pool_list, True, False)
+        lib.run_command("gluster", self.vol_info, True, False)
+        self.assertEqual(5, _execute.call_count)
+        self.assertEqual(2, self.stats.evictions)
+
+    @mock.patch("gluster.lib._execute")
+    def testReadRacingInvalidation(self, _execute):
+        # A volume set finishing while the read runs makes its output stale
+        def read(cmd, as_root, timeout):
+            lib.invalidate_read_cache("test")
+            return Ok(b"<cliOutput/>")
+        _execute.side_effect = read
+        lib.run_command("gluster", self.vol_info, True, False)
+        self.assertIsNone(lib.read_cache_lookup(
+            lib.build_command("gluster", self.vol_info, True, False)))
+
+        _execute.side_effect = None
+        _execute.return_value = Ok(b"<cliOutput/>")
+        lib.run_command("gluster", self.vol_info, True, False)
+        lib.run_command("gluster", self.vol_info, True, False)
+        self.assertEqual(2, _execute.call_count)
+
+        generation = lib.read_cache_generation()
+        lib.invalidate_read_cache()
+        cmd = lib.build_command("gluster", self.pool_list, True, False)
+        lib.read_cache_update("gluster", self.pool_list, cmd,
+                              Ok(b"<cliOutput/>"), generation)
+        self.assertIsNone(lib.read_cache_lookup(cmd))
+
+    @mock.patch("gluster.lib._execute")
+    def testDisabledByDefault(self, _execute):
+        lib.disable_read_cache()
+        _execute.return_value = Ok(b"<cliOutput/>")
+        lib.run_command("gluster", self.vol_info, True, False)
+        lib.run_command("gluster", self.vol_info, True, False)
+        self.assertEqual(2, _execute.call_count)
 
 
 class TestResolveToIp(unittest.TestCase):
-    @mock.patch("gluster.lib.run_command")
-    @mock.patch("gluster.lib.ip_address")
-    def test(self, _ip_address, _run_command):
-        _run_command.return_value = Ok("172.217.3.206\n")
-        _ip_address.return_value = ip_address("172.217.3.206")
+    def setUp(self):
+        lib._resolver.clear()
+
+    @mock.patch("gluster.lib.socket.getaddrinfo")
+    def test(self, _getaddrinfo):
+        _getaddrinfo.return_value = [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, '',
+             ("172.217.3.206", 0))]
         result = lib.resolve_to_ip("google.com")
-        _ip_address.assert_called_with("172.217.3.206")
+        _getaddrinfo.assert_called_with("google.com", None, socket.AF_INET)
         self.assertTrue(result.is_ok())
         self.assertTrue(result.value == ip_address("172.217.3.206"))
 
@@ -38,7 +465,79 @@ class TestResolveToIp(unittest.TestCase):
         self.assertTrue(result.value == ip_address("192.168.1.2"))
 
 
+class TestResolver(unittest.TestCase):
+    @staticmethod
+    def getaddrinfo_side_effect(host, port, family=0):
+        if host == "missing.example.com":
+            raise socket.gaierror(-2, "Name or service not known")
+        addr = {"a.example.com": "10.0.0.1",
+                "b.example.com": "10.0.0.2"}[host]
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (addr, 0))]
+
+    @mock.patch("gluster.lib.socket.getaddrinfo")
+    def testCache(self, _getaddrinfo):
+        _getaddrinfo.side_effect = self.getaddrinfo_side_effect
+        resolver = lib.Resolver()
+        for _ in range(5):
+            result = resolver.resolve("a.example.com")
+            self.assertEqual(ip_address("10.0.0.1"), result.value)
+        self.assertEqual(1, _getaddrinfo.call_count)
+        self.assertEqual(4, resolver.stats.hits)
+        self.assertEqual(1, resolver.stats.misses)
+        self.assertEqual(0.8, resolver.stats.hit_rate())
+
+    @mock.patch("gluster.lib.socket.getaddrinfo")
+    def testNegativeCache(self, _getaddrinfo):
+        _getaddrinfo.side_effect = self.getaddrinfo_side_effect
+        resolver = lib.Resolver()
+        self.assertTrue(resolver.resolve("missing.example.com").is_err())
+        self.assertTrue(resolver.resolve("missing.example.com").is_err())
+        # AF_INET and then the unspecified family fallback.  Only once.
+        self.assertEqual(2, _getaddrinfo.call_count)
+        self.assertEqual(1, resolver.stats.negative_hits)
+
+    @mock.patch("gluster.lib.socket.getaddrinfo")
+    def testExpiryAndBound(self, _getaddrinfo):
+        _getaddrinfo.side_effect = self.getaddrinfo_side_effect
+        resolver = lib.Resolver(ttl=0)
+        resolver.resolve("a.example.com")
+        resolver.resolve("a.example.com")
+        self.assertEqual(2, resolver.stats.misses)
+
+        resolver = lib.Resolver(max_entries=1)
+        resolver.resolve("a.example.com")
+        resolver.resolve("b.example.com")
+        resolver.resolve("a.example.com")
+        self.assertEqual(3, resolver.stats.misses)
+
+    @mock.patch("gluster.lib.socket.getaddrinfo")
+    def testResolveMany(self, _getaddrinfo):
+        _getaddrinfo.side_effect = self.getaddrinfo_side_effect
+        resolver = lib.Resolver()
+        resolver.resolve("a.example.com")
+        results = resolver.resolve_many(
+            ["a.example.com", "b.example.com", "b.example.com",
+             "missing.example.com"], max_workers=2)
+        self.assertEqual(3, len(results))
+        self.assertEqual(ip_address("10.0.0.2"),
+                         results["b.example.com"].value)
+        self.assertTrue(results["missing.example.com"].is_err())
+        self.assertEqual(1, resolver.stats.hits)
+        self.assertEqual(3, resolver.stats.misses)
+
+
 class TestGetLocalIp(unittest.TestCase):
+    route_table = (
+        "Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\t"
+        "Mask\t\tMTU\tWindow\tIRTT\n"
+        "eth1\t00000000\t0101A8C0\t0003\t0\t0\t100\t00000000\t0\t0\t0\n"
+        "eth0\t00000000\t0100000A\t0003\t0\t0\t50\t00000000\t0\t0\t0\n"
+        "eth1\t0001A8C0\t00000000\t0001\t0\t0\t100\t00FFFFFF\t0\t0\t0\n")
+
+    def setUp(self):
+        lib._local_ip_cache["routes"] = None
+        lib._local_ip_cache["ip"] = None
+
     @staticmethod
     def run_command_side_effect(*args):
         print("args: {}".format(args))
@@ -48,12 +547,45 @@ class TestGetLocalIp(unittest.TestCase):
         elif args[1][1] == "get":
             return Ok("192.168.1.1 dev eth1  src 192.168.1.6 \n    cache \n")
 
+    @mock.patch("gluster.lib._read_route_table")
     @mock.patch("gluster.lib.run_command")
-    def testGetLocalIp(self, _run_command):
+    def testGetLocalIp(self, _run_command, _read_route_table):
+        # No kernel routing table so fall back to ip route
+        _read_route_table.return_value = None
         _run_command.side_effect = self.run_command_side_effect
         result = lib.get_local_ip()
         self.assertTrue(result.is_ok())
         self.assertTrue(result.value == ip_address("192.168.1.6"))
+        _run_command.assert_called_with("ip", ["route", "get", "192.168.1.1"],
+                                        False, False)
+
+    def testDefaultGateway(self):
+        if lib.struct.pack("=L", 1) != lib.struct.pack("<L", 1):
+            self.skipTest("route table fixture is little endian")
+        self.assertEqual("10.0.0.1", lib._default_gateway(self.route_table))
+        self.assertIsNone(lib._default_gateway(
+            self.route_table.splitlines()[0]))
+
+    @mock.patch("gluster.lib._source_address")
+    @mock.patch("gluster.lib._read_route_table")
+    @mock.patch("gluster.lib.run_command")
+    def testGetLocalIpFromKernel(self, _run_command, _read_route_table,
+                                 _source_address):
+        _read_route_table.return_value = self.route_table
+        _source_address.return_value = ip_address("10.0.0.5")
+        for _ in range(3):
+            result = lib.get_local_ip()
+            self.assertEqual(ip_address("10.0.0.5"), result.value)
+        _run_command.assert_not_called()
+        self.assertEqual(1, _source_address.call_count)
+
+        # A routing table change invalidates the cached address
+        _read_route_table.return_value = self.route_table.replace(
+            "\t50\t", "\t500\t")
+        _source_address.return_value = ip_address("192.168.1.6")
+        result = lib.get_local_ip()
+        self.assertEqual(ip_address("192.168.1.6"), result.value)
+        self.assertEqual(2, _source_address.call_count)
 
 
 class TestGetLocalHostName(unittest.TestCase):
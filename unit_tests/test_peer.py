@@ -15,7 +15,7 @@
 from gluster import peer
 from ipaddress import ip_address
 import mock
-from result import Ok
+from result import Err, Ok
 import uuid
 import unittest
 
@@ -83,10 +83,12 @@ class Test(unittest.TestCase):
         result = peer.get_peer(hostname=ip_address('172.31.21.242'))
         self.assertIs(result, existing_peers[1])
 
+    @mock.patch('gluster.peer.peer_list_from_store')
     @mock.patch('gluster.peer.parse_peer_list')
     @mock.patch('gluster.peer.run_command')
-    def testPeerList(self, _run_command, _parse_peer_list):
+    def testPeerList(self, _run_command, _parse_peer_list, _from_store):
         # Ignore parse_peer_list.  We test that above
+        _from_store.return_value = Err("No store")
         _parse_peer_list.return_value = Ok("")
         _run_command.return_value = Ok("")
         peer.peer_list()
@@ -116,6 +118,95 @@ class Test(unittest.TestCase):
                                         True,
                                         False)
 
+    @mock.patch('gluster.peer.get_local_ip')
+    @mock.patch('gluster.peer.run_command')
+    def testPeerListFromStore(self, _run_command, _get_local_ip):
+        _get_local_ip.return_value = Ok(ip_address("172.31.39.30"))
+        with open('unit_tests/pool_list.xml', 'r') as xml_output:
+            with mock.patch('gluster.peer.resolve_to_ip') as _resolve_to_ip:
+                _resolve_to_ip.return_value = Ok(ip_address("172.31.39.30"))
+                cli_peers = peer.parse_peer_list(xml_output.read()).value
+        result = peer.peer_list_from_store("unit_tests/glusterd")
+        self.assertTrue(result.is_ok())
+        _run_command.assert_not_called()
+        store_peers = sorted(result.value, key=lambda p: str(p.uuid))
+        cli_peers = sorted(cli_peers, key=lambda p: str(p.uuid))
+        self.assertEqual(len(cli_peers), len(store_peers))
+        for cli_peer, store_peer in zip(cli_peers, store_peers):
+            self.assertEqual(cli_peer.uuid, store_peer.uuid)
+            self.assertEqual(cli_peer.hostname, store_peer.hostname)
+            self.assertEqual(cli_peer.status, store_peer.status)
+
+        self.assertTrue(
+            peer.peer_list_from_store("unit_tests/missing").is_err())
+
+    def testLocalPeerUuid(self):
+        self.assertEqual(uuid.UUID("cebf02bb-a304-4058-986e-375e2e1e5313"),
+                         peer.local_peer_uuid("unit_tests/glusterd"))
+        self.assertIsNone(peer.local_peer_uuid("unit_tests/missing"))
+
+    @mock.patch('gluster.peer.peer_list')
+    @mock.patch('gluster.peer.run_command')
+    def testPeerProbeExisting(self, _run_command, _peer_list):
+        _peer_list.return_value = Ok([
+            peer.Peer(
+                uuid=uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8"),
+                hostname="172.31.12.7", status=peer.State.PeerInCluster,
+                hostnames=["172.31.12.7", "10.0.0.7"])])
+        self.assertEqual(0, peer.peer_probe(hostname="10.0.0.7").value)
+        _run_command.assert_not_called()
+
+    def testPeerHash(self):
+        peer_uuid = uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8")
+        a = peer.Peer(uuid=peer_uuid, hostname="172.31.12.7", status=None)
+        b = peer.Peer(uuid=peer_uuid, hostname="server1", status=None)
+        self.assertEqual(1, len({a, b}))
+        self.assertNotEqual(a, "172.31.12.7")
+
+    @mock.patch('gluster.peer.resolve_many_to_ip')
+    def testPeerRegistry(self, _resolve_many_to_ip):
+        _resolve_many_to_ip.return_value = {
+            "server2": Ok(ip_address("172.31.21.242"))}
+        peer_1 = peer.Peer(
+            uuid=uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8"),
+            hostname="172.31.12.7", status=peer.State.PeerInCluster,
+            hostnames=["172.31.12.7", "10.0.0.7"])
+        peer_2 = peer.Peer(
+            uuid=uuid.UUID("15af92ad-ae64-4aba-89db-73730f2ca6ec"),
+            hostname="server2", status=peer.State.PeerInCluster)
+        registry = peer.PeerRegistry([peer_1, peer_2])
+        _resolve_many_to_ip.assert_called_once_with(["server2"])
+        self.assertEqual(2, len(registry))
+        self.assertIs(peer_1, registry.get(peer_1.uuid))
+        self.assertIs(peer_1, registry.get("10.0.0.7"))
+        self.assertIs(peer_1, registry.get(ip_address("172.31.12.7")))
+        self.assertIs(peer_2, registry.get("server2"))
+        self.assertIs(peer_2, registry.get("172.31.21.242"))
+        self.assertIn(peer_2, registry)
+        self.assertNotIn("172.31.39.30", registry)
+        self.assertIsNone(registry.get(None))
+
+        # peer_1 moves to a new address, peer_2 leaves and peer_3 joins
+        peer_1_moved = peer.Peer(
+            uuid=peer_1.uuid, hostname="172.31.12.8",
+            status=peer.State.PeerInCluster)
+        peer_3 = peer.Peer(
+            uuid=uuid.UUID("cebf02bb-a304-4058-986e-375e2e1e5313"),
+            hostname="172.31.39.30", status=None)
+        old = set(registry)
+        added, removed = registry.refresh([peer_1_moved, peer_3])
+        self.assertEqual({peer_3}, added)
+        self.assertEqual({peer_2}, removed)
+        self.assertIs(peer_1_moved, registry.get("172.31.12.8"))
+        self.assertIsNone(registry.get("10.0.0.7"))
+        self.assertIsNone(registry.get("server2"))
+        self.assertEqual({peer_2}, old - set(registry))
+        self.assertEqual({peer_3}, registry - old)
+        self.assertEqual({peer_1}, registry & old)
+        self.assertEqual({peer_2, peer_3}, registry ^ old)
+        self.assertEqual(3, len(registry | old))
+        self.assertEqual({peer_1.uuid, peer_3.uuid}, registry.uuids())
+
     @mock.patch('gluster.peer.run_command')
     def testPeerRemove(self, _run_command):
         _run_command.return_value = Ok("")
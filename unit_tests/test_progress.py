@@ -0,0 +1,224 @@
+# Copyright 2017 Canonical Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import mock
+import unittest
+from unittest.mock import MagicMock
+import uuid
+
+from gluster import peer, progress, volume
+from gluster.heal import HealCounts
+
+local_uuid = uuid.UUID("15af92ad-ae64-4aba-89db-73730f2ca6ec")
+cluster_peers = [
+    peer.Peer(
+        uuid=uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8"),
+        hostname="172.31.12.7", status=peer.State.PeerInCluster),
+    peer.Peer(uuid=local_uuid, hostname="172.31.21.242",
+              status=peer.State.PeerInCluster),
+    peer.Peer(
+        uuid=uuid.UUID("cebf02bb-a304-4058-986e-375e2e1e5313"),
+        hostname="172.31.39.30", status=None),
+]
+
+
+def load_volume():
+    # chris: 12 bricks in replica 3, one brick of each set on local_uuid
+    with open('unit_tests/vol_info.xml', 'r') as xml_output:
+        vol = volume.parse_volume_info(xml_output.read(),
+                                       peers=cluster_peers).value[0]
+    local = [b for b in vol.bricks if b.uuid == local_uuid]
+    return vol, local
+
+
+class FakeClock(object):
+    # Stands in for the time module so samples are a known interval apart
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class Test(unittest.TestCase):
+    def testRing(self):
+        series = progress.HealSeries(capacity=3, smoothing=0.5)
+        self.assertIsNone(series.progress())
+        self.assertIsNone(series.window_rate())
+        series.add(0.0, 100)
+        self.assertIsNone(series.progress().rate)
+        series.add(10.0, 80)
+        self.assertEqual(2.0, series.rate)
+        series.add(20.0, 40)
+        # Half of the newest rate of 4 and half of the previous 2
+        self.assertEqual(3.0, series.rate)
+        series.add(30.0, 10)
+        self.assertEqual([(10.0, 80), (20.0, 40), (30.0, 10)], list(series))
+        self.assertEqual(3, len(series))
+        self.assertEqual(3.5, series.window_rate())
+        self.assertEqual((30.0, 10), series.last())
+        self.assertEqual(10, series.progress().count)
+        self.assertAlmostEqual(10 / 3.0, series.progress().eta)
+
+    def testEta(self):
+        series = progress.HealSeries()
+        series.add(0.0, 5)
+        series.add(1.0, 10)
+        # Growing backlog
+        self.assertEqual(-5.0, series.rate)
+        self.assertIsNone(series.progress().eta)
+        series = progress.HealSeries()
+        series.add(0.0, 0)
+        self.assertEqual(0.0, series.progress().eta)
+
+    def testCombine(self):
+        combined = progress.combine([
+            progress.HealProgress(10, 2.0, 5.0),
+            progress.HealProgress(30, 1.0, 30.0),
+            progress.HealProgress(0, None, 0.0)])
+        self.assertEqual(40, combined.count)
+        self.assertEqual(3.0, combined.rate)
+        self.assertEqual(30.0, combined.eta)
+        self.assertIsNone(progress.combine([
+            progress.HealProgress(10, 2.0, 5.0),
+            progress.HealProgress(5, None, None)]).eta)
+
+    def testReplicaSets(self):
+        vol, local = load_volume()
+        self.assertEqual("3", vol.replica_count)
+        sets = progress.replica_sets(vol)
+        self.assertEqual([vol.bricks[i:i + 3] for i in range(0, 12, 3)],
+                         sets)
+        self.assertEqual([[b] for b in local],
+                         [[b for b in s if b.uuid == local_uuid]
+                          for s in sets])
+
+    @mock.patch('gluster.progress.time', new_callable=FakeClock)
+    def testSampler(self, _time):
+        vol, local = load_volume()
+        paths = [b.path for b in local]
+        counts = [dict(zip(paths, (100, 50, 20))),
+                  dict(zip(paths, (80, 30, 20)))]
+        # The last local brick isn't sampled
+        sampler = progress.HealSampler(
+            {"chris": local[:3]},
+            source=lambda: HealCounts({"chris": counts.pop(0)}, {}),
+            smoothing=1.0)
+        sampler.sample()
+        _time.sleep(10)
+        sampler.sample()
+
+        self.assertEqual(2.0, sampler.brick("chris", local[0]).rate)
+        self.assertEqual(40.0, sampler.brick("chris", local[0]).eta)
+        self.assertIsNone(sampler.brick("chris", local[3]))
+        first, second, third, fourth = sampler.replica_sets(vol)
+        self.assertEqual(80, first.count)
+        self.assertEqual(2.0, first.rate)
+        self.assertEqual(40.0, first.eta)
+        self.assertEqual(15.0, second.eta)
+        # Nothing healing on the third set so no ETA
+        self.assertEqual(20, third.count)
+        self.assertIsNone(third.eta)
+        self.assertIsNone(fourth)
+        self.assertEqual(130, sampler.volume("chris").count)
+        self.assertIsNone(sampler.volume("logs"))
+        self.assertEqual(130, sampler.total().count)
+
+    @mock.patch('gluster.progress.time', new_callable=FakeClock)
+    def testWait(self, _time):
+        brick = MagicMock(path="/a")
+        counts = iter([30, 20, 10, 0, 0])
+        sampler = progress.HealSampler(
+            {"chris": [brick]},
+            source=lambda: HealCounts({"chris": {"/a": next(counts)}}, {}))
+        result = sampler.wait(timeout=60, interval=5)
+        self.assertTrue(result.is_ok())
+        self.assertEqual(0, result.value.count)
+        self.assertEqual(115.0, _time.now)
+        self.assertEqual(4, len(sampler.series[("chris", "/a")]))
+
+        sampler = progress.HealSampler(
+            {"chris": [brick]},
+            source=lambda: HealCounts({"chris": {"/a": 0}}, {}))
+        self.assertTrue(sampler.wait(timeout=60, volume="chris").is_ok())
+        self.assertTrue(sampler.wait(timeout=60,
+                                     volume="logs").is_err())
+
+    @mock.patch('gluster.progress.time', new_callable=FakeClock)
+    def testWaitDeadline(self, _time):
+        counts = iter(range(1000, 0, -1))
+        sampler = progress.HealSampler(
+            {"chris": [MagicMock(path="/a")]},
+            source=lambda: HealCounts({"chris": {"/a": next(counts)}}, {}))
+        result = sampler.wait(timeout=30, interval=10)
+        self.assertTrue(result.is_err())
+        self.assertIn("not done after 30 seconds", result.value)
+        self.assertEqual(130.0, _time.now)
+
+        # Healing 1 entry every 10 seconds can't finish 996 in 30 seconds
+        start = _time.now
+        result = sampler.wait(timeout=30, interval=10, volume="chris",
+                              give_up_early=True)
+        self.assertIn("won't be done within 30 seconds", result.value)
+        self.assertEqual(start, _time.now)
+
+    @mock.patch('gluster.progress.time', new_callable=FakeClock)
+    def testWaitErrors(self, _time):
+        # Nothing could be counted so the heal isn't known to be done
+        sampler = progress.HealSampler(
+            {"chris": [MagicMock(path="/a")]},
+            source=lambda: HealCounts({}, {"chris": {"/a": "No such file"}}))
+        result = sampler.wait(timeout=30, interval=10)
+        self.assertTrue(result.is_err())
+        self.assertIn("No such file", result.value)
+        self.assertIsNone(sampler.total())
+
+        # /b stops being countable after 100 pending and 0 on /a isn't done
+        failed = HealCounts({"chris": {"/a": 0}},
+                            {"chris": {"/b": "Input/output error"}})
+        counts = [HealCounts({"chris": {"/a": 5, "/b": 100}}, {}), failed,
+                  failed, HealCounts({"chris": {"/a": 0, "/b": 0}}, {})]
+        brick_b = MagicMock(path="/b")
+        sampler = progress.HealSampler(
+            {"chris": [MagicMock(path="/a"), brick_b]},
+            source=lambda: counts.pop(0))
+        sampler.sample()
+        sampler.sample()
+        self.assertIsNone(sampler.brick("chris", brick_b))
+        self.assertEqual(0, sampler.volume("chris").count)
+        start = _time.now
+        result = sampler.wait(timeout=30, interval=10, volume="chris")
+        self.assertTrue(result.is_ok())
+        self.assertEqual(0, result.value.count)
+        # Kept waiting while /b couldn't be counted
+        self.assertEqual(start + 10, _time.now)
+
+    @mock.patch('gluster.progress.count_bricks')
+    def testDefaultSource(self, _count_bricks):
+        bricks = {"chris": [MagicMock(path="/a")]}
+        _count_bricks.return_value = HealCounts({"chris": {"/a": 3}},
+                                                {"logs": {"/b": "gone"}})
+        sampler = progress.HealSampler(bricks)
+        self.assertEqual(3, sampler.sample().total())
+        _count_bricks.assert_called_with(bricks)
+        self.assertEqual([("chris", "/a")], list(sampler.series))
+
+
+if __name__ == "__main__":
+    # import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,65 @@
+# Copyright 2017 Canonical Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from gluster import store
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.workdir = os.path.join(self.tmp, "glusterd")
+        shutil.copytree("unit_tests/glusterd", self.workdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testReadStoreFile(self):
+        info = store.read_volume_info("chris", self.workdir)
+        self.assertEqual("14", info["version"])
+        self.assertEqual("172.31.12.7:-mnt-xvdb", info["brick-0"])
+        self.assertEqual("On", info["performance.readdir-ahead"])
+        self.assertIsNone(store.read_volume_info("missing", self.workdir))
+
+    def testVolumeNames(self):
+        os.makedirs(os.path.join(self.workdir, "vols", "half-created"))
+        self.assertEqual(["chris"], store.volume_names(self.workdir))
+        self.assertIsNone(store.volume_names(os.path.join(self.tmp, "none")))
+
+    def testVolumeSnapshots(self):
+        self.assertEqual([], store.volume_snapshots("chris", self.workdir))
+        snap_vol = os.path.join(self.workdir, "snaps", "snap1",
+                                "1a2b3c4d5e6f")
+        os.makedirs(snap_vol)
+        with open(os.path.join(snap_vol, "info"), "w") as f:
+            f.write("type=2\nparent_volname=chris\n")
+        self.assertEqual(["snap1"],
+                         store.volume_snapshots("chris", self.workdir))
+        self.assertEqual([], store.volume_snapshots("other", self.workdir))
+
+    def testMarkers(self):
+        self.assertEqual("14", store.volume_version("chris", self.workdir))
+        self.assertIsNone(store.volume_version("missing", self.workdir))
+        peers = store.peers_marker(self.workdir)
+        self.assertEqual(3, len(peers))
+        os.unlink(os.path.join(self.workdir, "glusterd.info"))
+        self.assertIsNone(store.peers_marker(self.workdir))
+
+
+if __name__ == "__main__":
+    unittest.main()
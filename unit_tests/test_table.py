@@ -0,0 +1,108 @@
+# Copyright 2017 Canonical Ltd
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import mock
+import unittest
+import uuid
+
+from gluster import table, volume
+
+host_a = uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8")
+
+
+def status_table(online=True):
+    with open('unit_tests/vol_status.xml', 'rb') as f:
+        output = f.read()
+    if not online:
+        # Take down the first brick
+        output = output.replace(b"<status>1</status>", b"<status>0</status>",
+                                1)
+    return volume.parse_volume_status_table(output).value
+
+
+class Test(unittest.TestCase):
+    def testStatusTable(self):
+        brick_table = status_table()
+        # 12 bricks plus an NFS server and self-heal daemon per host
+        self.assertEqual(18, len(brick_table))
+        self.assertEqual(["chris"], brick_table.volumes)
+        self.assertEqual([], brick_table.offline())
+        self.assertEqual("/mnt/xvdb", brick_table.paths[0])
+        self.assertEqual("172.31.12.7", brick_table.hostname(0))
+        self.assertEqual(49152, brick_table.columns["port"][0])
+        self.assertEqual(table.UNKNOWN, brick_table.columns["arbiter"][0])
+
+        per_host = brick_table.bricks_per_host()
+        self.assertEqual(4, per_host["172.31.12.7"])
+        self.assertEqual(3, per_host["NFS Server"])
+        self.assertEqual(3, per_host["Self-heal Daemon"])
+        ports = brick_table.ports_by_host()
+        self.assertEqual([49152, 49153, 49154, 49155], ports["172.31.12.7"])
+        # The self-heal daemon doesn't listen
+        self.assertEqual([2049], ports["NFS Server"])
+        self.assertNotIn("Self-heal Daemon", ports)
+
+        # By UUID the host's daemons are included, by name they aren't
+        self.assertEqual([0, 3, 6, 9, 16, 17], brick_table.host_rows(host_a))
+        self.assertEqual([0, 3, 6, 9], brick_table.host_rows("172.31.12.7"))
+        self.assertEqual([], brick_table.host_rows("172.31.1.1"))
+
+    def testOffline(self):
+        brick_table = status_table(online=False)
+        self.assertEqual([0], brick_table.offline())
+        self.assertEqual({"172.31.12.7": [0]},
+                         brick_table.group_by_host(brick_table.offline()))
+        chris = brick_table.volume_index("chris")
+        self.assertEqual([0], brick_table.select(online=0, volume=chris))
+        self.assertEqual([], brick_table.select(online=0, port=49153))
+
+    @mock.patch('gluster.table.numpy', None)
+    def testWithoutNumpy(self):
+        brick_table = status_table(online=False)
+        self.assertEqual([0], brick_table.offline())
+        self.assertEqual(4, brick_table.bricks_per_host()["172.31.12.7"])
+        self.assertEqual([0, 3, 6, 9, 16, 17], brick_table.host_rows(host_a))
+        self.assertIs(brick_table.columns["pid"], brick_table.column("pid"))
+
+    def testInfoTable(self):
+        with open('unit_tests/vol_info.xml', 'rb') as f:
+            brick_table = volume.parse_volume_info_table(f.read()).value
+        self.assertEqual(12, len(brick_table))
+        self.assertEqual(["chris"], brick_table.volumes)
+        self.assertEqual(4, brick_table.bricks_per_host()["172.31.12.7"])
+        self.assertEqual([0, 3, 6, 9], brick_table.host_rows(host_a))
+        # Volume info doesn't know ports or whether bricks are running
+        self.assertEqual(table.UNKNOWN, brick_table.columns["port"][0])
+        self.assertEqual(0, brick_table.columns["arbiter"][0])
+        self.assertEqual([], brick_table.offline())
+
+    def testFromBrickStatus(self):
+        with open('unit_tests/vol_status.xml', 'rb') as f:
+            statuses = volume.parse_volume_status(f.read()).value
+        brick_table = table.BrickTable.from_brick_status(statuses, "chris")
+        parsed = status_table()
+        self.assertEqual(list(parsed.columns["port"]),
+                         list(brick_table.columns["port"]))
+        self.assertEqual(list(parsed.columns["pid"]),
+                         list(brick_table.columns["pid"]))
+        self.assertEqual(parsed.paths, brick_table.paths)
+
+    def testParseError(self):
+        self.assertTrue(
+            volume.parse_volume_status_table(b"<cliOutput>").is_err())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,9 +13,16 @@
 # limitations under the License.
 
 from gluster import peer, volume
-# from ipaddress import ip_address
+from gluster.lib import GlusterError, GlusterOption, SplitBrainPolicy, \
+    Toggle
+from ipaddress import ip_address
 import mock
-from result import Ok
+import os
+from result import Err, Ok
+import shutil
+import subprocess
+import tempfile
+import tracemalloc
 import uuid
 import unittest
 
@@ -29,6 +36,19 @@ peer_3 = peer.Peer(
     uuid=uuid.UUID("57dd0230-50d9-452a-be8b-8f9dd9fe0264"),
     hostname="172.20.21.233", status=None)
 
+# The peers of the cluster in vol_info.xml and unit_tests/glusterd
+cluster_peers = [
+    peer.Peer(
+        uuid=uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8"),
+        hostname="172.31.12.7", status=peer.State.PeerInCluster),
+    peer.Peer(
+        uuid=uuid.UUID("15af92ad-ae64-4aba-89db-73730f2ca6ec"),
+        hostname="172.31.21.242", status=peer.State.PeerInCluster),
+    peer.Peer(
+        uuid=uuid.UUID("cebf02bb-a304-4058-986e-375e2e1e5313"),
+        hostname="172.31.39.30", status=None),
+]
+
 brick_list = [
     volume.Brick(
         uuid=uuid.UUID("12d4bd98-e102-4174-b99a-ef76f849474e"),
@@ -47,9 +67,75 @@ brick_list = [
 ]
 
 
+# Unpatched, for tests that mock it out
+volume_info_from_store = volume.volume_info_from_store
+
+
+class GeneratedStatus(object):
+    """
+    A file like object producing vol status --xml output for node_count
+    bricks without ever holding all of it
+    """
+    node = ("<node><hostname>172.31.{a}.{b}</hostname>"
+            "<path>/mnt/brick{n}</path>"
+            "<peerid>663bbc5b-c9b4-4a02-8b56-85e05e1b01c8</peerid>"
+            "<status>1</status><port>49152</port><ports><tcp>49152</tcp>"
+            "<rdma>N/A</rdma></ports><pid>{n}</pid></node>\n")
+
+    def __init__(self, node_count):
+        self.chunks = self._generate(node_count)
+
+    def _generate(self, node_count):
+        yield ("<?xml version=\"1.0\" encoding=\"UTF-8\"?><cliOutput>"
+               "<opRet>0</opRet><opErrno>0</opErrno><opErrstr/><volStatus>"
+               "<volumes><volume><volName>big</volName>").encode()
+        for n in range(node_count):
+            # Bricks are spread over a fixed number of servers
+            yield self.node.format(a=n % 3, b=n % 30, n=n).encode()
+        yield b"<tasks/></volume></volumes></volStatus></cliOutput>"
+
+    def read(self, size=-1):
+        return next(self.chunks, b"")
+
+
 class Test(unittest.TestCase):
-    def testGetLocalBricks(self):
-        pass
+    @mock.patch('gluster.volume.get_local_ip')
+    @mock.patch('gluster.volume.local_peer_uuid')
+    @mock.patch('gluster.volume.volume_info')
+    def testGetLocalBricks(self, _volume_info, _local_peer_uuid,
+                           _get_local_ip):
+        vol = volume.volume_info_from_store(
+            "chris", workdir="unit_tests/glusterd", peers=cluster_peers)
+        _volume_info.return_value = vol
+        _local_peer_uuid.return_value = cluster_peers[2].uuid
+        bricks = volume.get_local_bricks("chris").value
+        self.assertEqual(["/mnt/xvdb", "/mnt/xvdh", "/mnt/xvdg", "/mnt/xvdf"],
+                         [b.path for b in bricks])
+        self.assertTrue(all(b.peer is cluster_peers[2] for b in bricks))
+        _get_local_ip.assert_not_called()
+
+        # Without a store the address is compared instead
+        _local_peer_uuid.return_value = None
+        _get_local_ip.return_value = Ok(ip_address("172.31.12.7"))
+        bricks = volume.get_local_bricks("chris").value
+        self.assertEqual(4, len(bricks))
+        self.assertTrue(all(b.peer is cluster_peers[0] for b in bricks))
+
+    @mock.patch('gluster.volume.local_peer_uuid')
+    @mock.patch('gluster.volume.volume_info_all')
+    def testGetAllLocalBricks(self, _volume_info_all, _local_peer_uuid):
+        with open('unit_tests/vol_info_all.xml', 'rb') as xml_output:
+            _volume_info_all.return_value = volume.parse_volume_info_all(
+                xml_output.read(), peers=cluster_peers)
+        _local_peer_uuid.return_value = cluster_peers[2].uuid
+        bricks = volume.get_all_local_bricks().value
+        # scratch has no bricks at all
+        self.assertEqual(["chris", "logs"], list(bricks))
+        self.assertEqual(4, len(bricks["chris"]))
+        self.assertEqual(["/mnt/logs"], [b.path for b in bricks["logs"]])
+
+        _volume_info_all.return_value = Err("failed")
+        self.assertTrue(volume.get_all_local_bricks().is_err())
 
     def testOkToRemove(self):
         pass
@@ -253,8 +339,77 @@ class Test(unittest.TestCase):
                                         ["volume", "set", "test", "auth.allow",
                                          "*"], True, True)
 
-    def testVolumeSetOptions(self):
-        pass
+    @mock.patch('gluster.volume._batch_set_supported', True)
+    @mock.patch('gluster.volume.run_command')
+    def testVolumeSetOptions(self, _run_command):
+        settings = [
+            GlusterOption(GlusterOption.AuthAllow, "*"),
+            GlusterOption(GlusterOption.NfsDisable, Toggle.On),
+            GlusterOption("group", "virt"),
+        ]
+        _run_command.return_value = Ok(b"")
+        self.assertTrue(volume.volume_set_options("test", settings).is_ok())
+        self.assertEqual(3, _run_command.call_count)
+
+        _run_command.reset_mock()
+        self.assertTrue(volume.volume_set_options("test", settings,
+                                                  batch=True).is_ok())
+        # group is expanded by the CLI so it's set on its own
+        self.assertEqual(
+            [["volume", "set", "test", "auth.allow", "*", "nfs.disable",
+              Toggle.On],
+             ["volume", "set", "test", "group", "virt"]],
+            [c[0][1] for c in _run_command.call_args_list])
+
+    @mock.patch('gluster.volume._batch_set_supported', True)
+    @mock.patch('gluster.volume.run_command')
+    def testVolumeSetOptionsBatchFallback(self, _run_command):
+        settings = [
+            GlusterOption(GlusterOption.AuthAllow, "*"),
+            GlusterOption(GlusterOption.NetworkFrameTimeout, -1),
+            GlusterOption(GlusterOption.NfsDisable, Toggle.On),
+        ]
+
+        def run_command(command, arg_list, as_root, script_mode):
+            if -1 in arg_list:
+                return Err("volume set: failed: '-1' is not valid")
+            return Ok(b"")
+        _run_command.side_effect = run_command
+        result = volume.volume_set_options_batched("test", settings)
+        # The rejected batch is retried one option at a time
+        self.assertEqual(
+            {"network.frame-timeout": "volume set: failed: '-1' is not "
+                                      "valid"}, result.value)
+        self.assertEqual(4, _run_command.call_count)
+        self.assertTrue(volume._batch_set_supported)
+        self.assertIn("network.frame-timeout: volume set: failed",
+                      volume.volume_set_options("test", settings,
+                                                batch=True).value)
+
+        # A batch that failed for a reason that isn't its syntax leaves
+        # batching on even though every option then sets fine on its own
+        _run_command.reset_mock()
+        _run_command.side_effect = lambda command, arg_list, *args: \
+            Err("Error : Request timed out") if len(arg_list) > 5 \
+            else Ok(b"")
+        settings[1] = GlusterOption(GlusterOption.NetworkFrameTimeout, 60)
+        self.assertTrue(
+            volume.volume_set_options_batched("test", settings).is_ok())
+        self.assertTrue(volume._batch_set_supported)
+
+        # A CLI that only takes one option per set is only tried once
+        _run_command.reset_mock()
+        _run_command.side_effect = lambda command, arg_list, *args: \
+            Err("Usage: volume set <VOLNAME> <KEY> <VALUE>") \
+            if len(arg_list) > 5 else Ok(b"")
+        settings[1] = GlusterOption(GlusterOption.NetworkFrameTimeout, 60)
+        self.assertTrue(
+            volume.volume_set_options_batched("test", settings).is_ok())
+        self.assertFalse(volume._batch_set_supported)
+        _run_command.reset_mock()
+        self.assertTrue(
+            volume.volume_set_options_batched("test", settings).is_ok())
+        self.assertEqual(3, _run_command.call_count)
 
     @mock.patch('gluster.volume.run_command')
     def testVolumeStart(self, _run_command):
@@ -281,15 +436,415 @@ class Test(unittest.TestCase):
         _run_command.assert_called_with("gluster", ["vol", "status", "test",
                                                     "--xml"], True, False)
 
-    def testParseVolumeInfo(self):
+    @mock.patch('gluster.volume.resolve_to_ip')
+    @mock.patch('gluster.volume.peer_list')
+    def testParseVolumeInfo(self, _peer_list, _resolve_to_ip):
+        peers = [
+            peer.Peer(
+                uuid=uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8"),
+                hostname="172.31.12.7", status=peer.State.PeerInCluster),
+            peer.Peer(
+                uuid=uuid.UUID("15af92ad-ae64-4aba-89db-73730f2ca6ec"),
+                hostname="172.31.21.242", status=peer.State.PeerInCluster),
+            peer.Peer(
+                uuid=uuid.UUID("cebf02bb-a304-4058-986e-375e2e1e5313"),
+                hostname="172.31.39.30", status=None),
+        ]
+        _peer_list.return_value = Ok(peers)
         with open('unit_tests/vol_info.xml', 'r') as xml_output:
             lines = xml_output.readlines()
             results = volume.parse_volume_info("".join(lines))
             self.assertTrue(results.is_ok())
-            # for vol in results.value:
-            # print("parse volume info: {}".format(vol))
-            # for brick in vol.bricks:
-            # print("brick: {}".format(brick))
+            # One pool listing no matter how many bricks the volume has
+            _peer_list.assert_called_once_with()
+            _resolve_to_ip.assert_not_called()
+            bricks = results.value[0].bricks
+            self.assertEqual(12, len(bricks))
+            self.assertIs(peers[0], bricks[0].peer)
+            self.assertIs(peers[2], bricks[11].peer)
+            self.assertEqual("/mnt/xvdf", bricks[11].path)
+            self.assertFalse(bricks[0].is_arbiter)
+
+    @mock.patch('gluster.volume.peer_list')
+    def testParseVolumeInfoWithPeers(self, _peer_list):
+        with open('unit_tests/vol_info.xml', 'r') as xml_output:
+            results = volume.parse_volume_info(xml_output.read(),
+                                               peers=[peer_1])
+            self.assertTrue(results.is_ok())
+            _peer_list.assert_not_called()
+
+    def testParseVolumeStatusSharing(self):
+        with open('unit_tests/vol_status.xml', 'rb') as f:
+            statuses = volume.parse_volume_status(f.read()).value
+        self.assertIs(statuses[0].brick.peer, statuses[3].brick.peer)
+        self.assertIs(statuses[0].brick.uuid, statuses[3].brick.uuid)
+        self.assertEqual(uuid.UUID("663bbc5b-c9b4-4a02-8b56-85e05e1b01c8"),
+                         statuses[0].brick.uuid)
+        # The same path on different hosts is one string
+        self.assertIs(statuses[0].brick.path, statuses[1].brick.path)
+        for obj in (statuses[0], statuses[0].brick, statuses[0].brick.peer):
+            self.assertFalse(hasattr(obj, "__dict__"))
+
+    def testStreamVolumeStatusFromPipe(self):
+        process = subprocess.Popen(["cat", "unit_tests/vol_status.xml"],
+                                   stdout=subprocess.PIPE)
+        try:
+            stream = volume.stream_volume_status(process.stdout)
+            first = next(stream)
+            self.assertEqual("/mnt/xvdb", first.brick.path)
+            self.assertEqual(23772, first.pid)
+            self.assertEqual(49152, first.tcp_port)
+            self.assertIsNone(first.rdma_port)
+            self.assertTrue(first.online)
+            self.assertEqual(17, len(list(stream)))
+        finally:
+            process.stdout.close()
+            process.wait()
+
+    @mock.patch('gluster.volume.command_stream')
+    def testIterBrickStatusStopsEarly(self, _command_stream):
+        process = subprocess.Popen(["cat", "unit_tests/vol_status.xml"],
+                                   stdout=subprocess.PIPE)
+        _command_stream.return_value.__enter__.return_value = process.stdout
+        try:
+            statuses = volume.iter_brick_status("chris")
+            self.assertEqual("/mnt/xvdb", next(statuses).brick.path)
+            statuses.close()
+        finally:
+            process.stdout.close()
+            process.wait()
+        _command_stream.assert_called_once_with(
+            "gluster", ["vol", "status", "chris", "--xml"], True, False)
+        # Closing the iterator leaves the command's context
+        self.assertTrue(_command_stream.return_value.__exit__.called)
+
+    @mock.patch('gluster.volume.volume_info_from_store')
+    @mock.patch('gluster.volume.command_stream')
+    def testIterBricks(self, _command_stream, _from_store):
+        _from_store.return_value = Err("No store")
+        with open('unit_tests/vol_info.xml', 'rb') as f:
+            _command_stream.return_value.__enter__.return_value = f
+            with mock.patch('gluster.volume.peer_list') as _peer_list:
+                _peer_list.return_value = Ok(cluster_peers)
+                paths = [b.path for b in volume.iter_bricks("chris")]
+        self.assertEqual(12, len(paths))
+        self.assertEqual("/mnt/xvdf", paths[-1])
+
+        _from_store.return_value = volume_info_from_store(
+            "chris", workdir="unit_tests/glusterd", peers=cluster_peers)
+        _command_stream.reset_mock()
+        bricks = volume.iter_bricks("chris")
+        self.assertIs(cluster_peers[0], next(bricks).peer)
+        _command_stream.assert_not_called()
+
+    @mock.patch('gluster.volume.command_stream')
+    def testIterQuotas(self, _command_stream):
+        with open('unit_tests/quota_list.xml', 'rb') as f:
+            _command_stream.return_value.__enter__.return_value = f
+            quotas = list(volume.iter_quotas("test"))
+        self.assertEqual(["/", "/test2"], [q.path for q in quotas])
+        _command_stream.assert_called_once_with(
+            "gluster", ["volume", "quota", "test", "list", "--xml"], True,
+            False)
+
+    def testStreamVolumeStatusMemory(self):
+        def peak(node_count):
+            tracemalloc.start()
+            try:
+                count = sum(1 for _ in volume.stream_volume_status(
+                    GeneratedStatus(node_count)))
+                return count, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small_count, small_peak = peak(500)
+        large_count, large_peak = peak(10000)
+        self.assertEqual(500, small_count)
+        self.assertEqual(10000, large_count)
+        # Twenty times the bricks shouldn't need much more memory
+        self.assertLess(large_peak, small_peak * 2)
+
+    def testParseVolumeInfoFailed(self):
+        xml = ("<cliOutput><opRet>-1</opRet><opErrno>2</opErrno>"
+               "<opErrstr>Volume test does not exist</opErrstr></cliOutput>")
+        result = volume.parse_volume_info(xml, peers=[])
+        self.assertEqual("Volume test does not exist", result.value)
+        self.assertTrue(volume.parse_volume_status("<cliOutput>").is_err())
+
+    def testVolumeInfoFromStore(self):
+        with open('unit_tests/vol_info.xml', 'r') as xml_output:
+            cli = volume.parse_volume_info(xml_output.read(),
+                                           peers=cluster_peers).value[0]
+        result = volume.volume_info_from_store(
+            "chris", workdir="unit_tests/glusterd", peers=cluster_peers)
+        self.assertTrue(result.is_ok())
+        vol = result.value[0]
+        self.assertEqual("chris", vol.name)
+        for field in ("vol_type", "vol_id", "status", "snapshot_count",
+                      "dist_count", "stripe_count", "replica_count",
+                      "arbiter_count", "disperse_count", "redundancy_count",
+                      "transport", "options"):
+            self.assertEqual(getattr(cli, field), getattr(vol, field), field)
+        self.assertEqual(len(cli.bricks), len(vol.bricks))
+        for cli_brick, brick in zip(cli.bricks, vol.bricks):
+            self.assertEqual(cli_brick.uuid, brick.uuid)
+            self.assertIs(cli_brick.peer, brick.peer)
+            self.assertEqual(cli_brick.path, brick.path)
+            self.assertEqual(cli_brick.is_arbiter, brick.is_arbiter)
+
+    def testVolumeInfoFromStoreIncomplete(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            workdir = os.path.join(tmp, "glusterd")
+            shutil.copytree("unit_tests/glusterd", workdir)
+            os.unlink(os.path.join(workdir, "vols", "chris", "bricks",
+                                   "172.31.12.7:-mnt-xvdb"))
+            result = volume.volume_info_from_store("chris", workdir=workdir,
+                                                   peers=cluster_peers)
+            self.assertTrue(result.is_err())
+        finally:
+            shutil.rmtree(tmp)
+        result = volume.volume_info_from_store("chris",
+                                               workdir="unit_tests/glusterd",
+                                               peers=cluster_peers[:2])
+        self.assertTrue(result.is_err())
+
+    @mock.patch('gluster.volume.run_command')
+    def testVolumeQuotasEnabledFromStore(self, _run_command):
+        from_store = volume.volume_info_from_store
+        tmp = tempfile.mkdtemp()
+        try:
+            workdir = os.path.join(tmp, "glusterd")
+            shutil.copytree("unit_tests/glusterd", workdir)
+            info = os.path.join(workdir, "vols", "chris", "info")
+            with mock.patch('gluster.volume.volume_info_from_store',
+                            new=lambda name: from_store(
+                                name, workdir=workdir, peers=cluster_peers)):
+                self.assertFalse(volume.volume_quotas_enabled("chris"))
+                for value, enabled in (("On", True), ("off", False),
+                                       ("enable", True)):
+                    with open(info, "a") as f:
+                        f.write("features.quota={}\n".format(value))
+                    self.assertEqual(enabled,
+                                     volume.volume_quotas_enabled("chris"))
+                with open(info, "a") as f:
+                    f.write("features.quota=maybe\n")
+                self.assertRaises(GlusterError,
+                                  volume.volume_quotas_enabled, "chris")
+        finally:
+            shutil.rmtree(tmp)
+        _run_command.assert_not_called()
+
+    @mock.patch('gluster.volume.volume_info_from_store')
+    @mock.patch('gluster.volume.run_command')
+    def testVolumeInfoFallsBackToCli(self, _run_command, _from_store):
+        _from_store.return_value = Err("No store")
+        _run_command.return_value = Err("failed")
+        self.assertTrue(volume.volume_info("chris").is_err())
+        _run_command.assert_called_with(
+            "gluster", ["volume", "info", "chris", "--xml"], True, False)
+
+    @mock.patch('gluster.volume.run_command')
+    def testVolumeListFromStore(self, _run_command):
+        self.assertEqual(["chris"], volume.volume_list_from_store(
+            "unit_tests/glusterd").value)
+        self.assertTrue(volume.volume_list_from_store(
+            "unit_tests/missing").is_err())
+        _run_command.assert_not_called()
+
+    def testParseVolumeInfoAll(self):
+        with open('unit_tests/vol_info_all.xml', 'rb') as xml_output:
+            result = volume.parse_volume_info_all(xml_output.read(),
+                                                  peers=cluster_peers)
+        self.assertTrue(result.is_ok())
+        volumes = result.value
+        self.assertEqual(["chris", "logs", "scratch"], list(volumes))
+        # Bricks and options don't leak from one volume into the next
+        self.assertEqual(12, len(volumes["chris"].bricks))
+        self.assertEqual(11, len(volumes["chris"].options))
+        self.assertNotIn("features.shard", volumes["chris"].options)
+        logs = volumes["logs"]
+        self.assertEqual(["/mnt/logs"] * 3, [b.path for b in logs.bricks])
+        self.assertEqual({"transport.address-family": "inet",
+                          "features.shard": "on",
+                          "features.quota": "on"}, logs.options)
+        self.assertEqual(volume.VolumeType.Replicate, logs.vol_type)
+        self.assertTrue(logs.bricks[2].is_arbiter)
+        self.assertEqual([], volumes["scratch"].bricks)
+        self.assertEqual({}, volumes["scratch"].options)
+        # Every volume resolves against the same peers
+        self.assertIs(volumes["chris"].bricks[0].peer, logs.bricks[0].peer)
+
+    @mock.patch('gluster.volume.peer_list')
+    @mock.patch('gluster.volume.volume_list_from_store')
+    @mock.patch('gluster.volume.run_command')
+    def testVolumeInfoAllFromCli(self, _run_command, _list_from_store,
+                                 _peer_list):
+        _list_from_store.return_value = Err("No store")
+        _peer_list.return_value = Ok(cluster_peers)
+        with open('unit_tests/vol_info_all.xml', 'rb') as xml_output:
+            _run_command.return_value = Ok(xml_output.read())
+        result = volume.volume_info_all()
+        self.assertEqual(["chris", "logs", "scratch"], list(result.value))
+        _run_command.assert_called_once_with(
+            "gluster", ["volume", "info", "all", "--xml"], True, False)
+        # Peers are listed once for all the volumes
+        self.assertEqual(1, _peer_list.call_count)
+
+    @mock.patch('gluster.volume.peer_list')
+    @mock.patch('gluster.volume.volume_info_from_store')
+    @mock.patch('gluster.volume.volume_list_from_store')
+    @mock.patch('gluster.volume.run_command')
+    def testVolumeInfoAllFromStore(self, _run_command, _list_from_store,
+                                   _from_store, _peer_list):
+        _list_from_store.return_value = Ok(["chris"])
+        _from_store.side_effect = lambda name, peers: volume_info_from_store(
+            name, workdir="unit_tests/glusterd", peers=peers)
+        _peer_list.return_value = Ok(cluster_peers)
+        result = volume.volume_info_all()
+        self.assertEqual(["chris"], list(result.value))
+        self.assertEqual(12, len(result.value["chris"].bricks))
+        _run_command.assert_not_called()
+
+        # Any volume the store can't describe means asking the CLI
+        _list_from_store.return_value = Ok(["chris", "logs"])
+        _run_command.return_value = Err("failed")
+        self.assertTrue(volume.volume_info_all().is_err())
+        _run_command.assert_called_once_with(
+            "gluster", ["volume", "info", "all", "--xml"], True, False)
+
+    @mock.patch('gluster.volume.run_command')
+    def testVolumeStatusAll(self, _run_command):
+        with open('unit_tests/vol_status_all_detail.xml', 'rb') as f:
+            _run_command.return_value = Ok(f.read())
+        result = volume.volume_status_all(detail=True)
+        _run_command.assert_called_once_with(
+            "gluster", ["vol", "status", "all", "detail", "--xml"], True,
+            False)
+        statuses = result.value
+        self.assertEqual(["chris", "logs"], list(statuses))
+        self.assertEqual(6, len(statuses["chris"]))
+        self.assertEqual(["/mnt/logs"] * 3,
+                         [s.brick.path for s in statuses["logs"]])
+        offline = [s for s in statuses["logs"] if not s.online]
+        self.assertEqual(1, len(offline))
+        self.assertIsNone(offline[0].tcp_port)
+        # Bricks on a host share one Peer across volumes
+        self.assertIs(statuses["chris"][0].brick.peer,
+                      statuses["logs"][0].brick.peer)
+
+        detail = statuses["chris"][0].detail
+        self.assertEqual(10724835328, detail.size_total)
+        self.assertEqual(10690686976, detail.size_free)
+        self.assertEqual(5242368, detail.inodes_total)
+        self.assertEqual("/dev/xvdb", detail.device)
+        self.assertEqual(4096, detail.block_size)
+        self.assertEqual("xfs", detail.fs_name)
+
+        volume.volume_status_all()
+        _run_command.assert_called_with(
+            "gluster", ["vol", "status", "all", "--xml"], True, False)
+
+    def testVolumeStatusWithoutDetail(self):
+        with open('unit_tests/vol_status.xml', 'rb') as f:
+            result = volume.parse_volume_status_all(f.read())
+        self.assertEqual(["chris"], list(result.value))
+        self.assertIsNone(result.value["chris"][0].detail)
+
+    def testNormalizeOptionValue(self):
+        normalize = volume.normalize_option_value
+        self.assertEqual(normalize(Toggle.On), normalize("on"))
+        self.assertEqual(normalize("True"), normalize("On"))
+        self.assertEqual(normalize(Toggle.Off), normalize("off (DEFAULT)"))
+        self.assertNotEqual(normalize(Toggle.Off), normalize("on"))
+        self.assertEqual(normalize(20971520), normalize("20MB"))
+        self.assertEqual(normalize("3600"), normalize(3600))
+        self.assertEqual(normalize(SplitBrainPolicy.from_str("size")),
+                         normalize("size"))
+        self.assertEqual("inet", normalize("inet"))
+        # Only boolean words and sizes have other spellings
+        self.assertNotEqual(normalize("1"), normalize("on"))
+        self.assertNotEqual(normalize(True), normalize(1))
+        self.assertNotEqual(normalize("/Export"), normalize("/export"))
+        self.assertEqual("HIGH:!SSLv2", normalize("HIGH:!SSLv2"))
+        self.assertEqual(normalize("32mb"), normalize("32MB"))
+        self.assertEqual(512, normalize("512Bytes"))
+        self.assertEqual(normalize("disable"), normalize(False))
+
+    def testOptionChanges(self):
+        current = {"nfs.disable": "Off", "performance.cache-size": "32MB",
+                   "performance.readdir-ahead": "On"}
+        settings = [
+            GlusterOption(GlusterOption.NfsDisable, Toggle.Off),
+            GlusterOption(GlusterOption.PerformanceCacheSize, 33554432),
+            GlusterOption(GlusterOption.PerformanceReadDirAhead, Toggle.Off),
+            GlusterOption(GlusterOption.NetworkFrameTimeout, 60),
+        ]
+        changed, unchanged = volume.option_changes(current, settings)
+        self.assertEqual(settings[2:], changed)
+        self.assertEqual(settings[:2], unchanged)
+
+    @mock.patch('gluster.volume._batch_set_supported', True)
+    @mock.patch('gluster.volume.volume_info')
+    @mock.patch('gluster.volume.run_command')
+    def testReconcileOptions(self, _run_command, _volume_info):
+        with open('unit_tests/vol_info.xml', 'r') as xml_output:
+            _volume_info.return_value = volume.parse_volume_info(
+                xml_output.read(), peers=cluster_peers)
+        with open('unit_tests/vol_get.xml', 'rb') as f:
+            vol_get = f.read()
+
+        def run_command(command, arg_list, as_root, script_mode):
+            if arg_list[1] == "get":
+                return Ok(vol_get)
+            return Ok(b"")
+        _run_command.side_effect = run_command
+
+        # Everything in volume info already has the value
+        settings = [
+            GlusterOption(GlusterOption.FavoriteChildPolicy,
+                          SplitBrainPolicy.from_str("size")),
+            GlusterOption(GlusterOption.PerformanceReadDirAheadCacheLimit,
+                          "20MB"),
+            GlusterOption(GlusterOption.PerformanceReadDirAhead, Toggle.On),
+            GlusterOption(GlusterOption.DiagnosticsStatsDumpInterval, 30),
+            GlusterOption(GlusterOption.NfsDisable, Toggle.Off),
+        ]
+        report = volume.volume_reconcile_options("chris", settings).value
+        self.assertEqual([], report.changed)
+        self.assertEqual(settings, report.skipped)
+        _run_command.assert_not_called()
+
+        # Defaults come from a single volume get, only real changes are set
+        settings += [
+            GlusterOption(GlusterOption.FeaturesReadOnly, Toggle.Off),
+            GlusterOption(GlusterOption.NetworkFrameTimeout, 60),
+            GlusterOption(GlusterOption.PerformanceCacheSize, 33554432),
+            GlusterOption(GlusterOption.DiagnosticsLatencyMeasurement,
+                          Toggle.Off),
+        ]
+        report = volume.volume_reconcile_options("chris", settings).value
+        self.assertEqual([GlusterOption.NetworkFrameTimeout,
+                          GlusterOption.DiagnosticsLatencyMeasurement],
+                         [s.name for s in report.changed])
+        self.assertEqual(7, len(report.skipped))
+        # Both changes go in one volume set
+        self.assertEqual(
+            [["volume", "get", "chris", "all", "--xml"],
+             ["volume", "set", "chris", "network.frame-timeout", 60,
+              "diagnostics.latency-measurement", Toggle.Off]],
+            [c[0][1] for c in _run_command.call_args_list])
+
+        _run_command.reset_mock()
+        report = volume.volume_reconcile_options(
+            "chris", settings, current={}, dry_run=True).value
+        self.assertEqual(settings, report.changed)
+        _run_command.assert_not_called()
+
+        _run_command.side_effect = None
+        _run_command.return_value = Err("volume set: failed")
+        self.assertTrue(volume.volume_reconcile_options(
+            "chris", settings, current={}).is_err())
 
 
 if __name__ == "__main__":